@@ -0,0 +1,60 @@
+# throughput and peak RSS of src/batch_quote.py on a generated job file
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BATCH_QUOTE = os.path.join(REPO_ROOT, "src", "batch_quote.py")
+
+
+def write_jobs(path, rows):
+    """Write a CSV of random jobs, leaving some price columns blank so defaults kick in"""
+    rng = random.Random(42)
+    with open(path, "w") as f:
+        f.write("job_id,print_weight,estimated_print_time,filament_cost_per_kg,electricity_cost_per_kwh,printer_power_rating\n")
+        for i in range(rows):
+            filament_cost = "" if i % 4 == 0 else f"{rng.uniform(15, 60):.2f}"
+            f.write(f"{i},{rng.uniform(1, 1500):.1f},{rng.uniform(0.1, 72):.2f},{filament_cost},12.0,{rng.choice((120, 300, 350))}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batch quoting CLI.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        jobs_path = os.path.join(tmp, "jobs.csv")
+        settings_path = os.path.join(tmp, "settings.csv")
+        with open(settings_path, "w") as f:
+            f.write("default_filament_cost,default_electricity_cost,default_printer_power,appearance_mode,color_theme,pdf_export_directory\n")
+            f.write("25.00,12.0,300.0,Dark,Blue,\n")
+
+        print(f"Generating {args.rows:,} jobs...")
+        write_jobs(jobs_path, args.rows)
+        input_mb = os.path.getsize(jobs_path) / 1e6
+
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, BATCH_QUOTE, jobs_path, "-o", os.path.join(tmp, "quoted.csv"),
+             "--settings", settings_path, "--chunk-size", str(args.chunk_size)],
+            check=True,
+        )
+        elapsed = time.perf_counter() - start
+
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    peak_rss_mb = peak_rss / 1e6 if sys.platform == "darwin" else peak_rss / 1e3
+
+    print(f"input: {input_mb:.0f} MB, {args.rows:,} rows")
+    print(f"elapsed: {elapsed:.1f} s ({args.rows / elapsed:,.0f} rows/s, {input_mb / elapsed:.1f} MB/s)")
+    print(f"peak RSS of batch_quote.py: {peak_rss_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
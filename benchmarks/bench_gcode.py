@@ -0,0 +1,55 @@
+# G-code analysis throughput: slicer metadata lookup vs integrating the moves
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from gcode import analyze_gcode  # noqa: E402
+
+
+def write_gcode(path, megabytes, with_metadata):
+    """Write a synthetic print of roughly megabytes MB, optionally with a PrusaSlicer summary at the end"""
+    rng = random.Random(7)
+    target = megabytes * 1_000_000
+    written = 0
+    e = 0.0
+    with open(path, "w") as f:
+        f.write("G90\nM82\nG92 E0\nG1 Z0.2 F3000\n")
+        while written < target:
+            lines = []
+            for _ in range(10_000):
+                e += rng.uniform(0.01, 0.2)
+                lines.append(f"G1 X{rng.uniform(0, 220):.3f} Y{rng.uniform(0, 220):.3f} E{e:.5f} F{rng.choice((1800, 2400, 3000))}\n")
+                if rng.random() < 0.05:
+                    lines.append("; perimeter\n")
+            chunk = "".join(lines)
+            f.write(chunk)
+            written += len(chunk)
+        if with_metadata:
+            f.write("; filament used [g] = 123.45\n; estimated printing time (normal mode) = 1d 2h 3m 4s\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark G-code weight/time extraction.")
+    parser.add_argument("--megabytes", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for with_metadata in (True, False):
+            path = os.path.join(tmp, "print.gcode")
+            write_gcode(path, args.megabytes, with_metadata)
+            size = os.path.getsize(path)
+            start = time.perf_counter()
+            result = analyze_gcode(path)
+            elapsed = time.perf_counter() - start
+            print(f"{result['source']}: {size / 1e6:.0f} MB in {elapsed:.2f} s ({size / 1e6 / elapsed:.0f} MB/s), "
+                  f"{result['weight_g']:.1f} g, {result['print_time_h']:.2f} h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# job history at scale: batched inserts, quarter spend reports and deep paging over millions of rows
+import argparse
+import datetime
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from cost_engine import calculate_single_cost  # noqa: E402
+from history import HistoryStore, page_cursor, quarter_range  # noqa: E402
+
+PRINTERS = ("MK4-01", "MK4-02", "X1C-01", "X1C-02", "Ender-07")
+MATERIALS = ("PLA", "PETG", "ABS", "TPU")
+
+
+def make_jobs(count, start, seconds, rng):
+    """count jobs spread evenly over seconds from start, in time order"""
+    jobs = []
+    for i in range(count):
+        weight, hours = rng.uniform(1, 1500), rng.uniform(0.1, 72)
+        filament, electricity, total = calculate_single_cost(25.0, weight, hours, 12.0, 300.0)
+        jobs.append({
+            "created_at": start + seconds * i / count, "printer": rng.choice(PRINTERS), "material": rng.choice(MATERIALS),
+            "print_weight": weight, "estimated_print_time": hours, "filament_cost_per_kg": 25.0,
+            "electricity_cost_per_kwh": 12.0, "printer_power_rating": 300.0,
+            "filament_cost": filament, "electricity_cost": electricity, "total_cost": total,
+        })
+    return jobs
+
+
+def timed(fn, repeat=20):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite job history.")
+    parser.add_argument("--jobs", type=int, default=2_000_000)
+    parser.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    year_start = time.mktime(datetime.date.today().replace(month=1, day=1).timetuple())
+    with tempfile.TemporaryDirectory() as tmp:
+        store = HistoryStore(os.path.join(tmp, "history.sqlite3"))
+        inserted, insert_time = 0, 0.0
+        per_batch_seconds = 365 * 86400 * args.batch / args.jobs
+        while inserted < args.jobs:
+            count = min(args.batch, args.jobs - inserted)
+            jobs = make_jobs(count, year_start + per_batch_seconds * inserted / args.batch, per_batch_seconds, rng)
+            start = time.perf_counter()
+            store.record_jobs(jobs)
+            insert_time += time.perf_counter() - start
+            inserted += count
+        print(f"inserted {inserted} jobs in batches of {args.batch}: {insert_time:.1f} s ({inserted / insert_time:.0f} jobs/s), "
+              f"{os.path.getsize(store.path) / 1e6:.0f} MB")
+
+        quarter = quarter_range()
+        rows, elapsed = timed(lambda: store.spend("printer", *quarter))
+        print(f"spend per printer this quarter ({quarter[0]} to {quarter[1]}): {elapsed * 1000:.2f} ms, {len(rows)} rows")
+        mid_month = (datetime.date.today().replace(day=10), datetime.date.today().replace(day=10) + datetime.timedelta(days=75))
+        rows, elapsed = timed(lambda: store.spend("material", *mid_month))
+        print(f"spend per material {mid_month[0]} to {mid_month[1]}: {elapsed * 1000:.2f} ms, {len(rows)} rows")
+        _, elapsed = timed(lambda: store.page())
+        print(f"newest page: {elapsed * 1000:.2f} ms")
+        # a cursor 90% of the way back through history
+        deep = store.page(before=(year_start + 365 * 86400 * 0.1, 0), limit=1)[0]
+        _, elapsed = timed(lambda: store.page(before=page_cursor(deep)))
+        print(f"page from {time.strftime('%Y-%m-%d', time.localtime(deep['created_at']))}: {elapsed * 1000:.2f} ms")
+        _, elapsed = timed(lambda: store.page(before=page_cursor(deep), printer="X1C-01"))
+        print(f"same page for one printer: {elapsed * 1000:.2f} ms")
+        _, elapsed = timed(lambda: store.newer_page(page_cursor(deep), material="PETG"))
+        print(f"newer page for one material: {elapsed * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# instrumentation overhead per call on a trivial function, with metrics off and on
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run in a fresh interpreter per mode, so neither run sees the other's timers
+MEASURE = """
+import sys, timeit
+sys.path.insert(0, "src")
+import instrumentation
+
+instrumentation.configure(sys.argv[2] if len(sys.argv) > 2 else None)
+
+def work():
+    return 1
+
+@instrumentation.timed("work")
+def timed_work():
+    return 1
+
+def block_work():
+    with instrumentation.timer("work_block"):
+        return 1
+
+def counted_work():
+    instrumentation.count("work_calls")
+    return 1
+
+calls = int(sys.argv[1])
+for fn in (work, timed_work, block_work, counted_work):
+    print(min(timeit.repeat(fn, number=calls, repeat=7)) / calls * 1e9, end=" ")
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the per-call cost of instrumentation.")
+    parser.add_argument("--calls", type=int, default=500_000)
+    args = parser.parse_args()
+
+    for label, metrics in (("metrics off", []), ("metrics on", [os.devnull])):
+        output = subprocess.run([sys.executable, "-c", MEASURE, str(args.calls)] + metrics, cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        plain, timed, block, counted = (float(value) for value in output.split())
+        print(f"{label}: @timed +{timed - plain:.0f} ns, timer() +{block - plain:.0f} ns, "
+              f"count() +{counted - plain:.0f} ns per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# mesh volume/weight throughput on a generated multi-million-triangle binary STL
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from mesh import STL_TRIANGLE, analyze_mesh  # noqa: E402
+
+
+def write_sphere_stl(path, triangles, radius=50.0):
+    """Write a closed UV sphere with about this many triangles"""
+    n = max(int(math.sqrt(triangles / 2)), 3)
+    theta = np.linspace(0, np.pi, n + 1)
+    phi = np.linspace(0, 2 * np.pi, n + 1)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    points = np.stack([radius * np.sin(t) * np.cos(p), radius * np.sin(t) * np.sin(p), radius * np.cos(t)], -1)
+    a, b, c, d = points[:-1, :-1], points[1:, :-1], points[1:, 1:], points[:-1, 1:]
+    corners = np.concatenate([np.stack([a, b, c], 2).reshape(-1, 3, 3), np.stack([a, c, d], 2).reshape(-1, 3, 3)])
+    records = np.zeros(len(corners), dtype=STL_TRIANGLE)
+    records["vertices"] = corners
+    with open(path, "wb") as f:
+        f.write(b"PlasticTax benchmark sphere".ljust(80))
+        f.write(len(records).to_bytes(4, "little"))
+        f.write(records.tobytes())
+    return len(records), 4 / 3 * math.pi * radius ** 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark STL volume and weight estimation.")
+    parser.add_argument("--triangles", type=int, default=2_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sphere.stl")
+        count, exact_mm3 = write_sphere_stl(path, args.triangles)
+        times = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = analyze_mesh(path, density=1.24)
+            times.append(time.perf_counter() - start)
+        best = min(times)
+        print(f"{count} triangles ({os.path.getsize(path) / 1e6:.0f} MB) in {best:.3f} s "
+              f"({count / best / 1e6:.1f} M triangles/s), volume {result['volume_cm3']:.2f} cm^3 "
+              f"(sphere: {exact_mm3 / 1000:.2f}), {result['weight_g']:.1f} g")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# re-costing a whole fleet's queue with phase-based printer power profiles
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from cost_engine import calculate_costs  # noqa: E402
+from printers import PROFILE_FIELDS, PrinterRegistry, effective_watts, phase_tariff_cost  # noqa: E402
+from tariffs import Tariff  # noqa: E402
+
+TARIFF = {
+    "rate": 28.0,
+    "weekday": [{"start": "00:30", "end": "05:30", "rate": 9.5}, {"start": "16:00", "end": "19:00", "rate": 42.0}],
+    "weekend": [{"start": "23:00", "end": "08:00", "rate": 9.5}],
+}
+
+
+def write_fleet(path, printers, rng):
+    """printers.csv with a spread of bed sizes, enclosures and idle habits"""
+    with open(path, "w") as f:
+        f.write(",".join(("name",) + PROFILE_FIELDS) + "\n")
+        for i in range(printers):
+            f.write(f"P{i:02d},{rng.uniform(3, 20):.1f},{rng.uniform(200, 1000):.0f},{rng.uniform(60, 300):.0f},"
+                    f"{rng.uniform(0, 60):.0f},{rng.uniform(5, 50):.0f}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fleet re-costing with printer power profiles.")
+    parser.add_argument("--printers", type=int, default=40)
+    parser.add_argument("--jobs", type=int, default=1_000_000)
+    parser.add_argument("--loop-sample", type=int, default=100_000, help="jobs re-costed one at a time for comparison")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        registry = PrinterRegistry(os.path.join(tmp, "printers.csv"))
+        write_fleet(registry.path, args.printers, rng)
+
+        begin = time.perf_counter()
+        names = registry.names()
+        print(f"loaded {len(names)} profiles: {(time.perf_counter() - begin) * 1000:.2f} ms")
+
+        queue = [names[i] for i in rng.integers(0, len(names), args.jobs)]
+        weight, hours = rng.uniform(1, 1500, args.jobs), rng.uniform(0.1, 72, args.jobs)
+
+        begin = time.perf_counter()
+        phases, _ = registry.phases(queue, 0.0)
+        watts = effective_watts(hours, phases)
+        _, electricity, total = calculate_costs(filament_cost_per_kg=25.0, print_weight=weight, estimated_print_time=hours,
+                                                electricity_cost_per_kwh=12.0, printer_power_rating=watts)
+        vectorized = time.perf_counter() - begin
+        print(f"re-costed a queue of {args.jobs} jobs: {vectorized * 1000:.0f} ms ({args.jobs / vectorized:,.0f} jobs/s)")
+
+        sample = min(args.loop_sample, args.jobs)
+        profiles = {name: registry.get(name) for name in names}
+        begin = time.perf_counter()
+        looped = [12.0 / 100 * float(profiles[name].energy_kwh(h)) for name, h in zip(queue[:sample], hours[:sample])]
+        loop = (time.perf_counter() - begin) / sample
+        print(f"one job at a time: {loop * 1e6:.1f} us/job, about {loop * args.jobs:.1f} s for the queue "
+              f"({loop * args.jobs / vectorized:.0f}x slower); max difference ${np.abs(electricity[:sample] - looped).max():.2e}")
+
+        tariff = Tariff("bench", TARIFF)
+        starts = time.time() + rng.uniform(0, 14 * 86400, args.jobs)
+        begin = time.perf_counter()
+        phase_tariff_cost(tariff, starts, hours, phases)
+        print(f"same queue on a time-of-use tariff, every phase at its own time: {(time.perf_counter() - begin) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+# load test for the HTTP quote service: many keep-alive clients hammering localhost
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(REPO_ROOT, "src", "quote_server.py")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_request(path, payload):
+    body = json.dumps(payload).encode()
+    return (f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    body = await reader.readexactly(length)
+    return status, body
+
+
+async def client(host, port, requests, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(request)
+            status, _ = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def wait_until_up(host, port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+async def run(args):
+    rng = random.Random(7)
+
+    def job():
+        return {"print_weight": round(rng.uniform(1, 1500), 1), "estimated_print_time": round(rng.uniform(0.1, 72), 2),
+                "filament_cost_per_kg": 25.0, "electricity_cost_per_kwh": 12.0, "printer_power_rating": 300.0}
+
+    if args.batch:
+        requests = [make_request("/quote/batch", {"jobs": [job() for _ in range(args.batch)]}) for _ in range(50)]
+    else:
+        requests = [make_request("/quote", job()) for _ in range(500)]
+        # a few invalid jobs, so the error path is exercised too
+        requests.insert(7, make_request("/quote", {"print_weight": "heavy"}))
+
+    per_client = args.requests // args.concurrency
+    latencies, statuses = [], {}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        client(args.host, args.port, [requests[(c + i) % len(requests)] for i in range(per_client)], latencies, statuses)
+        for c in range(args.concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    total = len(latencies)
+    jobs = total * (args.batch or 1)
+    print(f"{total} requests ({jobs} jobs) over {args.concurrency} connections in {elapsed:.2f} s: "
+          f"{total / elapsed:.0f} requests/s, {jobs / elapsed:.0f} jobs/s")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.2f} ms, p99 {latencies[int(total * 0.99) - 1] * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms; statuses {dict(sorted(statuses.items()))}")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the PlasticTax quote service on localhost.")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=0, help="jobs per /quote/batch request (default: single /quote requests)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="test an already running server instead of starting one")
+    parser.add_argument("--min-rps", type=float, help="exit non-zero if throughput falls below this")
+    args = parser.parse_args()
+
+    server = None
+    if args.port is None:
+        args.port = free_port()
+        server = subprocess.Popen([sys.executable, SERVER, "--host", args.host, "--port", str(args.port)],
+                                  cwd=REPO_ROOT, stderr=subprocess.DEVNULL)
+    try:
+        asyncio.run(wait_until_up(args.host, args.port))
+        rps = asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.min_rps is not None and rps < args.min_rps:
+        print(f"REGRESSION: {rps:.0f} requests/s < {args.min_rps:.0f}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+# rendering time for 1,000 PDF reports: one combined file vs one file per job
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from cost_engine import calculate_single_cost  # noqa: E402
+from reports import write_combined_report, write_job_reports  # noqa: E402
+
+
+def make_jobs(count):
+    rng = random.Random(7)
+    jobs = []
+    for i in range(count):
+        job = {
+            "name": f"order-{i:05d}",
+            "filament_cost_per_kg": round(rng.uniform(15, 60), 2),
+            "print_weight": round(rng.uniform(1, 1500), 1),
+            "estimated_print_time": round(rng.uniform(0.1, 72), 2),
+            "electricity_cost_per_kwh": 12.0,
+            "printer_power_rating": rng.choice((120.0, 300.0, 350.0)),
+        }
+        job["filament_cost"], job["electricity_cost"], job["total_cost"] = calculate_single_cost(
+            job["filament_cost_per_kg"], job["print_weight"], job["estimated_print_time"],
+            job["electricity_cost_per_kwh"], job["printer_power_rating"])
+        jobs.append(job)
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch PDF reporting.")
+    parser.add_argument("--jobs", type=int, default=1000)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    jobs = make_jobs(args.jobs)
+    with tempfile.TemporaryDirectory() as tmp:
+        combined = os.path.join(tmp, "combined.pdf")
+        start = time.perf_counter()
+        write_combined_report(jobs, combined)
+        elapsed = time.perf_counter() - start
+        print(f"combined: {len(jobs)} jobs in {elapsed:.2f} s, {os.path.getsize(combined) / 1e6:.2f} MB")
+
+        for processes in sorted({1, args.processes}):
+            directory = os.path.join(tmp, f"per-job-{processes}")
+            os.makedirs(directory)
+            start = time.perf_counter()
+            paths = write_job_reports(jobs, directory, processes=processes)
+            elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(path) for path in paths)
+            print(f"per-job, {processes} process(es): {len(paths)} files in {elapsed:.2f} s "
+                  f"({len(paths) / elapsed:.0f} reports/s), {size / 1e6:.2f} MB total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# risk mode: a million Monte Carlo samples of a quote in one NumPy batch against sampling one at a time
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from printers import PrinterProfile  # noqa: E402
+from risk import DEFAULT_SAMPLES, simulate, spread  # noqa: E402
+
+# a 120 g, 6 hour print on a profiled printer, every input give or take a bit
+DISTRIBUTIONS = {
+    "print_weight": spread(120.0, 10),
+    "estimated_print_time": spread(6.0, 15),
+    "filament_cost_per_kg": spread(25.0, 10),
+    "electricity_cost_per_kwh": spread(12.0, 20),
+}
+PRINTER = PrinterProfile("bench", 6, 240, 95, 10, 8)
+
+
+def loop_percentiles(samples, seed):
+    """The obvious way: draw and cost one sample at a time, then sort"""
+    rng = random.Random(seed)
+    warmup_minutes, warmup_watts, steady_watts, idle_minutes, idle_watts = PRINTER[1:]
+    totals = []
+    for _ in range(samples):
+        weight, hours, price, rate = (rng.triangular(low, high, mode) for _, low, mode, high in DISTRIBUTIONS.values())
+        watt_hours = warmup_minutes / 60 * warmup_watts + hours * steady_watts + idle_minutes / 60 * idle_watts
+        totals.append(price * weight / 1000 + rate / 100 * watt_hours / 1000)
+    totals.sort()
+    return [totals[int(p / 100 * (samples - 1))] for p in (50, 90, 99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Monte Carlo risk analysis of a quote.")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--loop-sample", type=int, default=100_000, help="samples drawn one at a time for comparison")
+    parser.add_argument("--max-ms", type=float, help="exit non-zero if the median run is slower than this")
+    args = parser.parse_args()
+
+    times = []
+    for run in range(args.runs):
+        begin = time.perf_counter()
+        result = simulate(DISTRIBUTIONS, phases=PRINTER.phases, samples=args.samples, seed=run)
+        times.append(time.perf_counter() - begin)
+    median = statistics.median(times)
+    percentiles = ", ".join(f"{name.upper()} ${value:.4f}" for name, value in result["percentiles"].items())
+    print(f"{args.samples:,} samples, median of {args.runs}: {median * 1000:.0f} ms ({percentiles})")
+    print("tornado: " + ", ".join(f"{bar['field']} ${bar['swing']:.4f}" for bar in result["tornado"]))
+
+    sample = min(args.loop_sample, args.samples)
+    begin = time.perf_counter()
+    looped = loop_percentiles(sample, 0)
+    loop = (time.perf_counter() - begin) / sample
+    print(f"one sample at a time: {loop * 1e6:.2f} us/sample, about {loop * args.samples:.1f} s for {args.samples:,} "
+          f"({loop * args.samples / median:.0f}x slower); its P50/P90/P99 "
+          + ", ".join(f"${value:.4f}" for value in looped))
+
+    if args.max_ms is not None and median * 1000 > args.max_ms:
+        print(f"slower than {args.max_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
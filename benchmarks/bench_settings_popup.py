@@ -0,0 +1,66 @@
+# popup open time and RSS across repeated opens of the background-image popup
+# needs a display; on a headless machine run it under xvfb-run
+import argparse
+import os
+import resource
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+os.chdir(REPO_ROOT)
+
+import customtkinter as ctk  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from assets import BACKGROUND_IMAGES, get_background_image  # noqa: E402
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux), falling back to the peak elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def open_popup(root, cached):
+    popup = ctk.CTkToplevel(root)
+    popup.geometry("500x550")
+    if cached:
+        bg_image = get_background_image("dark")
+    else:
+        bg_image = ctk.CTkImage(Image.open(BACKGROUND_IMAGES["dark"]), size=(600, 600))
+    ctk.CTkLabel(popup, image=bg_image, text="").place(x=0, y=0, relwidth=1, relheight=1)
+    popup.update()
+    return popup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark opening the settings popup background.")
+    parser.add_argument("--opens", type=int, default=50)
+    parser.add_argument("--uncached", action="store_true", help="decode the image on every open, like before the asset cache")
+    args = parser.parse_args()
+
+    root = ctk.CTk()
+    root.update()
+    timings = []
+    rss = []
+    for _ in range(args.opens):
+        start = time.perf_counter()
+        popup = open_popup(root, cached=not args.uncached)
+        timings.append(time.perf_counter() - start)
+        popup.destroy()
+        root.update()
+        rss.append(current_rss_mb())
+    root.destroy()
+
+    print(f"mode: {'uncached' if args.uncached else 'cached'}, {args.opens} opens")
+    print(f"first open: {timings[0] * 1000:.1f} ms, median of the rest: {sorted(timings[1:])[len(timings[1:]) // 2] * 1000:.1f} ms")
+    print(f"RSS after first open: {rss[0]:.1f} MB, after last open: {rss[-1]:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
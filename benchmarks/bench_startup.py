@@ -0,0 +1,67 @@
+# time-to-first-frame of the GUI, launched headless under Xvfb when there is no display
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN = os.path.join(REPO_ROOT, "src", "main.py")
+
+FIRST_FRAME_LINE = re.compile(r"time to first frame\s+([\d.]+) ms")
+
+
+def launch_command():
+    """Command that starts the app and quits after its first frame, wrapped in xvfb-run if needed"""
+    command = [sys.executable, MAIN, "--exit-after-first-frame", "--profile-startup"]
+    if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        xvfb_run = shutil.which("xvfb-run")
+        if xvfb_run is None:
+            sys.exit("No DISPLAY and no xvfb-run found; install Xvfb to run this benchmark headless.")
+        command = [xvfb_run, "-a"] + command
+    return command
+
+
+def measure_launch(command):
+    """Return (wall seconds, in-app time to first frame in seconds, profiler output) for one launch"""
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, timeout=120)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"App exited with {result.returncode}:\n{result.stderr}")
+    match = FIRST_FRAME_LINE.search(result.stderr)
+    if match is None:
+        sys.exit(f"No startup profile in the app's output:\n{result.stderr}")
+    return wall, float(match.group(1)) / 1000, result.stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PlasticTax time-to-first-frame.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, help="exit non-zero if the median time to first frame exceeds this")
+    args = parser.parse_args()
+
+    command = launch_command()
+    # the first launch warms the OS file cache and the on-disk image cache
+    _, _, profile = measure_launch(command)
+    walls, first_frames = [], []
+    for _ in range(args.runs):
+        wall, first_frame, profile = measure_launch(command)
+        walls.append(wall)
+        first_frames.append(first_frame)
+
+    median_first_frame_ms = statistics.median(first_frames) * 1000
+    print(profile.strip())
+    print(f"{args.runs} launches: median time to first frame {median_first_frame_ms:.1f} ms "
+          f"(min {min(first_frames) * 1000:.1f} ms), median process wall time {statistics.median(walls) * 1000:.1f} ms")
+
+    if args.max_ms is not None and median_first_frame_ms > args.max_ms:
+        print(f"REGRESSION: {median_first_frame_ms:.1f} ms > {args.max_ms:.1f} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# time-of-use costing: cumulative-table lookups for a whole queue against a minute-by-minute loop
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from tariffs import Tariff  # noqa: E402
+
+# a typical two-season tariff with a cheap night band and an evening peak
+SPEC = {
+    "rate": 28.0,
+    "weekday": [{"start": "00:30", "end": "05:30", "rate": 9.5}, {"start": "16:00", "end": "19:00", "rate": 42.0}],
+    "weekend": [{"start": "23:00", "end": "08:00", "rate": 9.5}],
+    "seasons": [{"name": "summer", "months": [6, 7, 8], "rate": 24.0,
+                 "weekday": [{"start": "01:00", "end": "06:00", "rate": 7.0}]}],
+}
+
+
+def loop_cost(tariff, start, hours, power_w):
+    """The obvious way: walk the print a minute at a time, looking up each minute's rate"""
+    total, now, end = 0.0, start, start + hours * 3600
+    while now < end:
+        step_end = min((now // 60 + 1) * 60, end)
+        local = time.localtime(now)
+        profile = tariff.profiles[tariff.profile_index[local.tm_mon - 1, int(local.tm_wday >= 5)]]
+        total += profile[local.tm_hour * 60 + local.tm_min] * (step_end - now) / 60
+        now = step_end
+    return total * power_w / 1000 / 60 / 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark time-of-use tariff costing.")
+    parser.add_argument("--jobs", type=int, default=100_000)
+    parser.add_argument("--loop-sample", type=int, default=200, help="jobs costed with the minute loop for comparison")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    year_start = time.mktime((time.localtime().tm_year, 1, 1, 0, 0, 0, 0, 0, -1))
+    starts = year_start + rng.uniform(0, 365 * 86400, args.jobs)
+    hours = rng.uniform(0.1, 72, args.jobs)
+    power = rng.uniform(80, 600, args.jobs)
+
+    tariff = Tariff("bench", SPEC)
+    begin = time.perf_counter()
+    tariff.table(starts.min(), (starts + hours * 3600).max())
+    build = time.perf_counter() - begin
+    print(f"cumulative table for a year of minutes: {build * 1000:.1f} ms")
+
+    begin = time.perf_counter()
+    costs = tariff.energy_cost(starts, hours, power)
+    vectorized = time.perf_counter() - begin
+    print(f"{args.jobs} scheduled jobs: {vectorized * 1000:.1f} ms ({args.jobs / vectorized:,.0f} jobs/s)")
+
+    sample = min(args.loop_sample, args.jobs)
+    begin = time.perf_counter()
+    expected = [loop_cost(tariff, *job) for job in zip(starts[:sample], hours[:sample], power[:sample])]
+    loop = (time.perf_counter() - begin) / sample
+    print(f"minute-by-minute loop: {loop * 1000:.1f} ms/job, about {loop * args.jobs:.0f} s for all {args.jobs} "
+          f"({loop * args.jobs / vectorized:,.0f}x slower); max difference ${np.abs(costs[:sample] - expected).max():.2e}")
+
+    begin = time.perf_counter()
+    best, cost = tariff.cheapest_start(9.5, 300.0, starts[0], starts[0] + 48 * 3600)
+    search = time.perf_counter() - begin
+    print(f"cheapest start for a 9.5 h print in a 48 h window (every minute): {search * 1000:.2f} ms, "
+          f"{time.strftime('%a %H:%M', time.localtime(best))} for ${cost:.2f}")
+
+
+if __name__ == "__main__":
+    main()
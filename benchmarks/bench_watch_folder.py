@@ -0,0 +1,75 @@
+# watch-folder daemon: how fast a burst of G-code files dropped by slicers gets quoted
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+
+from metrics_cache import MetricsCache  # noqa: E402
+from watch_folder import DEFAULT_WORKERS, FolderWatcher, ReportWriter, WatchLedger  # noqa: E402
+
+SETTINGS = "default_filament_cost,default_electricity_cost,default_printer_power,default_material\n25.00,12.0,300.0,PLA\n"
+
+
+def gcode_text(kilobytes, index):
+    """A small sliced print: moves, then a PrusaSlicer-style summary at the end"""
+    moves = "".join(f"G1 X{i % 220}.{i % 7} Y{i % 190}.5 E{i * 0.03:.4f}\n" for i in range(kilobytes * 40))
+    return moves + f"; filament used [g] = {10 + index % 90}.5\n; estimated printing time (normal mode) = {1 + index % 9}h 12m\n"
+
+
+def run_burst(folder, files, kilobytes, polling, workers, debounce):
+    """Start a watcher, drop files into the folder as fast as possible and time until all are quoted"""
+    watcher = FolderWatcher(folder, os.path.join(folder, "..", "settings.csv"),
+                            WatchLedger(os.path.join(folder, "..", f"ledger-{polling}.sqlite3")),
+                            ReportWriter(os.path.join(folder, "..", f"quotes-{polling}.csv")),
+                            workers=workers, debounce=debounce, polling=polling, status_seconds=0,
+                            cache=MetricsCache(os.path.join(folder, "..", f"cache-{polling}.sqlite3")),
+                            status_stream=io.StringIO())
+    ready = threading.Event()
+    thread = threading.Thread(target=watcher.run, kwargs={"ready": ready.set})
+    thread.start()
+    ready.wait()
+
+    texts = [gcode_text(kilobytes, i) for i in range(files)]
+    begin = time.perf_counter()
+    for i, text in enumerate(texts):
+        with open(os.path.join(folder, f"plate_{i:04d}.gcode"), "w") as f:
+            f.write(text)
+    written = time.perf_counter() - begin
+    while watcher.status()["costed"] + watcher.status()["failed"] < files:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - begin
+    watcher.stop()
+    thread.join()
+    return watcher.status(), written, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the watch-folder daemon on a burst of files.")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--kilobytes", type=int, default=100, help="rough size of each G-code file")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--debounce", type=float, default=0.5)
+    args = parser.parse_args()
+
+    for polling in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "settings.csv"), "w") as f:
+                f.write(SETTINGS)
+            folder = os.path.join(tmp, "drop")
+            os.mkdir(folder)
+            status, written, elapsed = run_burst(folder, args.files, args.kilobytes, polling, args.workers, args.debounce)
+            quoting = elapsed - args.debounce
+            print(f"{status['source']}: {args.files} files written in {written:.2f} s, all quoted after {elapsed:.2f} s "
+                  f"(~{args.files / quoting:,.0f} files/s after the {args.debounce:g} s debounce); "
+                  f"{status['failed']} failed, queue depth max {status['max_queue_depth']}, "
+                  f"lag mean {status['lag_mean']:.2f} s, max {status['lag_max']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
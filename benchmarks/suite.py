@@ -0,0 +1,302 @@
+# benchmark suite with JSON baselines: cost, settings, PDF and startup, gated on regressions
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+
+# how much worse than the baseline a throughput or latency may get before compare fails, in percent
+DEFAULT_THRESHOLD = 10.0
+
+# a metric's kind says which way is worse; sizes are reported but never gate
+THROUGHPUT, LATENCY, SIZE = "throughput", "latency", "size"
+
+JOB = {"filament_cost_per_kg": 25.0, "print_weight": 120.0, "estimated_print_time": 6.5,
+       "electricity_cost_per_kwh": 12.0, "printer_power_rating": 300.0,
+       "filament_cost": 3.0, "electricity_cost": 0.234, "total_cost": 3.234}
+
+
+class SkipCase(Exception):
+    """A case that can't run on this machine (no display server, missing library)"""
+
+
+def metric(name, value, unit, kind):
+    return {"name": name, "value": value, "unit": unit, "kind": kind}
+
+
+def median_seconds(fn, repeats):
+    """Median wall time of repeats calls of fn"""
+    times = []
+    for _ in range(repeats):
+        begin = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+
+def bench_cost(quick):
+    """calculate_cost's formula one job at a time, and a batch through the vectorized engine"""
+    import numpy as np
+
+    from cost_engine import calculate_costs, calculate_single_cost
+
+    calls = 20_000 if quick else 200_000
+    inputs = ("25.00", "120", "6.5", "12.0", "300")
+
+    def single():
+        for _ in range(calls):
+            calculate_single_cost(*inputs)
+
+    jobs = 100_000 if quick else 1_000_000
+    rng = np.random.default_rng(7)
+    columns = {"filament_cost_per_kg": 25.0, "print_weight": rng.uniform(1, 1500, jobs),
+               "estimated_print_time": rng.uniform(0.1, 72, jobs), "electricity_cost_per_kwh": rng.uniform(5, 40, jobs),
+               "printer_power_rating": 300.0}
+    single_seconds = median_seconds(single, 5)
+    batch_seconds = median_seconds(lambda: calculate_costs(**columns), 5)
+    return [metric("cost.single", calls / single_seconds, "jobs/s", THROUGHPUT),
+            metric("cost.batch", jobs / batch_seconds, "jobs/s", THROUGHPUT)]
+
+
+def bench_settings(quick):
+    """read_default_value from the cached store, and close_and_save_settings followed by reading every value back"""
+    import main
+
+    main.create_default_settings()
+    reads = 20_000 if quick else 100_000
+
+    def read():
+        for _ in range(reads):
+            main.read_default_value("filament_cost")
+
+    class Popup:
+        def destroy(self):
+            pass
+
+    # the confirmation popup needs a display and would only time Tk; count it instead
+    confirmations = []
+    show_error_popup = main.show_error_popup
+    main.show_error_popup = lambda title, message: confirmations.append(title)
+    round_trips = 50 if quick else 300
+    try:
+        def round_trip():
+            for i in range(round_trips):
+                cost = f"{20 + i % 10}.5"
+                main.close_and_save_settings(Popup(), cost, "12.0", "300.0", "Dark", "Blue", "", "PLA", main.FLAT_RATE)
+                if main.read_default_value("filament_cost") != cost:
+                    raise RuntimeError(f"saved {cost} but read back {main.read_default_value('filament_cost')}")
+                for key in main.DEFAULT_VALUE_KEYS:
+                    main.read_default_value(key)
+
+        read_seconds = median_seconds(read, 5)
+        round_trip_seconds = median_seconds(round_trip, 3)
+    finally:
+        main.show_error_popup = show_error_popup
+    if confirmations.count("Settings Saved") != round_trips * 3:
+        raise RuntimeError(f"settings were not saved: {set(confirmations)}")
+    return [metric("settings.read", reads / read_seconds, "reads/s", THROUGHPUT),
+            metric("settings.round_trip", round_trip_seconds / round_trips * 1000, "ms", LATENCY)]
+
+
+def bench_pdf(quick):
+    """The report generate_pdf hands to the task runner: render time and file size"""
+    try:
+        import fpdf  # noqa: F401
+    except ImportError:
+        raise SkipCase("fpdf is not installed") from None
+    from reports import write_job_report
+
+    renders = 10 if quick else 50
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        write_job_report(JOB, path)
+        seconds = median_seconds(lambda: write_job_report(JOB, path), renders)
+        size = os.path.getsize(path)
+    return [metric("pdf.render", seconds * 1000, "ms", LATENCY),
+            metric("pdf.size", size, "bytes", SIZE)]
+
+
+def bench_startup(quick):
+    """Time to first frame of a real launch, under xvfb-run when there is no display"""
+    from bench_startup import FIRST_FRAME_LINE, MAIN
+
+    command = [sys.executable, MAIN, "--exit-after-first-frame", "--profile-startup"]
+    if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        xvfb_run = shutil.which("xvfb-run")
+        if xvfb_run is None:
+            raise SkipCase("no DISPLAY and no xvfb-run")
+        command = [xvfb_run, "-a"] + command
+
+    first_frames = []
+    # the first launch warms the OS file cache and the on-disk image cache
+    for launch in range((3 if quick else 10) + 1):
+        result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, timeout=120)
+        match = FIRST_FRAME_LINE.search(result.stderr)
+        if result.returncode != 0 or match is None:
+            raise RuntimeError(f"app exited with {result.returncode}:\n{result.stderr}")
+        if launch:
+            first_frames.append(float(match.group(1)))
+    return [metric("startup.first_frame", statistics.median(first_frames), "ms", LATENCY)]
+
+
+CASES = {"cost": bench_cost, "settings": bench_settings, "pdf": bench_pdf, "startup": bench_startup}
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "machine": platform.machine(),
+            "cpus": os.cpu_count(), "commit": commit}
+
+
+def run_suite(names, quick=False):
+    """Run the named cases; returns the results document that run --save writes"""
+    sys.path.insert(0, os.path.join(REPO_ROOT, "src"))
+    sys.path.insert(0, BENCHMARKS)
+    os.chdir(REPO_ROOT)
+
+    metrics, skipped, failed = {}, {}, {}
+    for name in names:
+        begin = time.perf_counter()
+        try:
+            results = CASES[name](quick)
+        except SkipCase as e:
+            skipped[name] = str(e)
+            print(f"{name}: skipped ({e})")
+            continue
+        except Exception as e:  # report every case even if one breaks
+            failed[name] = f"{type(e).__name__}: {e}"
+            print(f"{name}: FAILED ({failed[name]})")
+            continue
+        for result in results:
+            metrics[result.pop("name")] = result
+        print(f"{name}: {time.perf_counter() - begin:.1f} s")
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "quick": quick,
+            "machine": machine_info(), "metrics": metrics, "skipped": skipped, "failed": failed}
+
+
+def format_value(value, unit):
+    if unit in ("jobs/s", "reads/s"):
+        return f"{value:,.0f} {unit}"
+    if unit == "bytes":
+        return f"{value:,.0f} B"
+    return f"{value:.3f} {unit}"
+
+
+def print_metrics(document):
+    for name, result in document["metrics"].items():
+        print(f"  {name:<22}{format_value(result['value'], result['unit']):>22}")
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Rows of (name, baseline, current, change %, status) plus whether anything regressed.
+
+    Throughput may drop, and latency rise, by up to threshold percent; sizes are
+    only reported. Metrics missing from either side are listed but don't fail.
+    """
+    rows, regressed = [], False
+    for name in sorted(set(baseline["metrics"]) | set(current["metrics"])):
+        old, new = baseline["metrics"].get(name), current["metrics"].get(name)
+        if old is None or new is None:
+            rows.append((name, old, new, None, "new" if old is None else "missing"))
+            continue
+        change = (new["value"] - old["value"]) / old["value"] * 100 if old["value"] else 0.0
+        worse = -change if new["kind"] == THROUGHPUT else change
+        if new["kind"] == SIZE:
+            status = "info"
+        elif worse > threshold:
+            status, regressed = "REGRESSED", True
+        elif worse < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, old, new, change, status))
+    return rows, regressed
+
+
+def comparison_warnings(baseline, current):
+    """Reasons the numbers may not be comparable at all"""
+    warnings = []
+    if baseline.get("quick") != current.get("quick"):
+        warnings.append("one run used --quick and the other didn't")
+    for key in ("platform", "machine", "cpus", "python"):
+        if baseline["machine"].get(key) != current["machine"].get(key):
+            warnings.append(f"{key} differs: {baseline['machine'].get(key)} vs {current['machine'].get(key)}")
+    return warnings
+
+
+def print_comparison(rows, threshold, warnings=()):
+    for warning in warnings:
+        print(f"warning: {warning}")
+    print(f"compared with the baseline (threshold {threshold:g}%):")
+    for name, old, new, change, status in rows:
+        old_text = format_value(old["value"], old["unit"]) if old else "-"
+        new_text = format_value(new["value"], new["unit"]) if new else "-"
+        change_text = f"{change:+.1f}%" if change is not None else ""
+        print(f"  {name:<22}{old_text:>22}{new_text:>22}{change_text:>9}  {status}")
+
+
+def load(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PlasticTax benchmark suite and compare it with a baseline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("cases", nargs="*", help=f"cases to run: {', '.join(CASES)} (default: all)")
+    run.add_argument("--quick", action="store_true", help="fewer repeats, for a smoke test")
+    run.add_argument("--save", metavar="FILE", help="write the results as JSON (e.g. a new baseline)")
+    run.add_argument("--compare", metavar="BASELINE", help="compare with a saved baseline and fail on regressions")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression in percent")
+    check = commands.add_parser("compare", help="compare two saved results")
+    check.add_argument("baseline")
+    check.add_argument("current")
+    check.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression in percent")
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        baseline, current = load(args.baseline), load(args.current)
+        rows, regressed = compare(baseline, current, args.threshold)
+        print_comparison(rows, args.threshold, comparison_warnings(baseline, current))
+        return 1 if regressed else 0
+
+    # the suite runs from the repo root; keep relative paths relative to where it was started
+    save = os.path.abspath(args.save) if args.save else None
+    unknown = [name for name in args.cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown case(s) {', '.join(unknown)}; choose from {', '.join(CASES)}")
+    baseline = load(args.compare) if args.compare else None
+    with tempfile.TemporaryDirectory() as home:
+        # never touch the real settings file, history or image cache
+        os.environ["HOME"] = os.environ["LOCALAPPDATA"] = home
+        document = run_suite(args.cases or list(CASES), args.quick)
+    print_metrics(document)
+    if save:
+        with open(save, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"saved to {save}")
+    if document["failed"]:
+        return 2
+    if baseline is not None:
+        rows, regressed = compare(baseline, document, args.threshold)
+        print_comparison(rows, args.threshold, comparison_warnings(baseline, document))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# decoded and resized image assets, cached in memory and on disk
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+import customtkinter as ctk
+from PIL import Image
+
+from instrumentation import count, timed
+from settings import get_default_settings_path
+
+BACKGROUND_IMAGES = {
+    "dark": "src/img/hexagons.png",
+    "light": "src/img/light_hexagons.png",
+}
+LOGO_IMAGE = "src/img/PlasticTax Logo.png"
+
+# CTkImage objects are cheap to share between windows, so a handful covers every screen
+MAX_CACHED_IMAGES = 8
+
+_ctk_images = OrderedDict()
+_source_hashes = {}
+
+
+def get_image_cache_dir():
+    """Directory holding the pre-resized PNGs, next to the settings file"""
+    cache_dir = os.path.join(os.path.dirname(get_default_settings_path()), "cache", "images")
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+def source_hash(path):
+    """SHA-256 of an image file, memoized for as long as its mtime and size stay the same"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    digest = _source_hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha.update(block)
+        digest = _source_hashes[key] = sha.hexdigest()
+    return digest
+
+
+@timed("image_load")
+def get_resized_image(path, size):
+    """Return path resized to size with LANCZOS, reusing the copy cached on disk when there is one"""
+    width, height = size
+    cached_path = os.path.join(get_image_cache_dir(), f"{source_hash(path)}_{width}x{height}.png")
+    try:
+        with Image.open(cached_path) as cached:
+            cached.load()
+            count("image_disk_cache_hits")
+            return cached.copy()
+    except (FileNotFoundError, OSError):
+        pass
+    count("image_decodes")
+
+    with Image.open(path) as source:
+        resized = source.resize((width, height), Image.Resampling.LANCZOS)
+
+    # write to a temp file and rename so a second app instance never reads a partial PNG
+    fd, temp_path = tempfile.mkstemp(suffix=".png", dir=os.path.dirname(cached_path))
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            resized.save(temp_file, format="PNG")
+        os.replace(temp_path, cached_path)
+    except OSError as e:
+        print(f"Could not cache resized image {path}: {e}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+    return resized
+
+
+def get_ctk_image(path, size, appearance_mode, scaling=1.0):
+    """Return a shared CTkImage for (path, size, appearance mode), built at most once per LRU slot.
+
+    size is in logical pixels; the image is resized to size times scaling (the
+    window's DPI and widget scaling), so CustomTkinter shows it without
+    stretching a smaller copy on a HiDPI screen.
+    """
+    key = (path, tuple(size), appearance_mode, scaling)
+    image = _ctk_images.get(key)
+    if image is not None:
+        _ctk_images.move_to_end(key)
+        return image
+
+    pixels = tuple(round(length * scaling) for length in size)
+    image = ctk.CTkImage(get_resized_image(path, pixels), size=tuple(size))
+    _ctk_images[key] = image
+    if len(_ctk_images) > MAX_CACHED_IMAGES:
+        _ctk_images.popitem(last=False)
+    return image
+
+
+def get_background_image(appearance_mode, size=(600, 600), scaling=1.0):
+    """Hexagon background for the given CustomTkinter appearance mode, at the window's scaling"""
+    path = BACKGROUND_IMAGES["dark" if appearance_mode == "dark" else "light"]
+    return get_ctk_image(path, size, appearance_mode, scaling)
+
+
+def get_window_scaling(window):
+    """CustomTkinter's scaling for a window: its monitor's DPI scaling times the widget scaling"""
+    try:
+        return ctk.ScalingTracker.get_widget_scaling(window)
+    except (AttributeError, KeyError):
+        return 1.0
+
+
+def clear_image_cache():
+    """Drop every in-memory image; the on-disk copies are kept"""
+    _ctk_images.clear()
@@ -0,0 +1,450 @@
+# command-line batch quoting: stream CSV/JSONL jobs through the cost engine
+import argparse
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+from cost_engine import calculate_costs
+from printers import constant_power_phases, effective_watts, get_printer_registry, phase_energy_kwh, phase_tariff_cost
+from settings import get_material_density, get_settings_store
+
+# job columns, passed to calculate_costs by name
+INPUT_FIELDS = ("print_weight", "estimated_print_time", "filament_cost_per_kg", "electricity_cost_per_kwh", "printer_power_rating")
+OUTPUT_FIELDS = ("filament_cost", "electricity_cost", "total_cost")
+
+# job columns that fall back to a settings.csv default when a row leaves them out
+SETTINGS_DEFAULTS = {
+    "filament_cost_per_kg": "default_filament_cost",
+    "electricity_cost_per_kwh": "default_electricity_cost",
+    "printer_power_rating": "default_printer_power",
+}
+
+# optional column naming a G-code, STL or 3MF file; a row's blank print_weight and
+# estimated_print_time are read from it (through the metrics cache)
+SOURCE_FILE_FIELD = "source_file"
+
+# optional column with when a job starts (Unix seconds or local ISO date/time); with a
+# time-of-use tariff, those rows pay the tariff's rates over their own print window
+START_TIME_FIELD = "start_time"
+
+# optional columns naming the printer (a printers.csv profile, when it has one) and material
+PRINTER_FIELD = "printer"
+MATERIAL_FIELD = "material"
+
+DEFAULT_CHUNK_SIZE = 50000
+
+
+class RowError(Exception):
+    """A single input row that could not be costed"""
+
+    def __init__(self, line_number, message):
+        super().__init__(f"line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def load_defaults(settings_path=None):
+    """Read the per-field fallbacks from settings.csv, skipping blank or non-numeric values"""
+    settings = get_settings_store(settings_path).values()
+    return {field: settings[key] for field, key in SETTINGS_DEFAULTS.items() if settings[key] is not None}
+
+
+def detect_format(path, fallback="csv"):
+    """Guess csv or jsonl from a file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension == ".csv":
+        return "csv"
+    return fallback
+
+
+def read_csv_rows(stream):
+    """Yield the CSV header, then (line_number, row list or RowError) for every data row"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    yield header
+    width = len(header)
+    for row in reader:
+        if len(row) == width:
+            yield reader.line_num, row
+        elif row:
+            yield reader.line_num, RowError(reader.line_num, f"expected {width} fields, got {len(row)}")
+
+
+def read_jsonl_rows(stream):
+    """Yield (line_number, record dict or RowError) for every JSONL record"""
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_number, RowError(line_number, f"invalid JSON ({e.msg})")
+            continue
+        if not isinstance(record, dict):
+            yield line_number, RowError(line_number, "expected a JSON object")
+        else:
+            yield line_number, record
+
+
+def parse_value(line_number, field, raw, defaults):
+    """Turn one raw cell into a float, falling back to the settings default when it is blank"""
+    if raw is None or raw == "":
+        if field not in defaults:
+            raise RowError(line_number, f"missing value for {field}")
+        return defaults[field]
+    if isinstance(raw, bool):
+        raise RowError(line_number, f"invalid number for {field}: {raw!r}")
+    try:
+        value = float(raw)
+    except (TypeError, ValueError, OverflowError):
+        raise RowError(line_number, f"invalid number for {field}: {raw!r}") from None
+    # nan and inf would end up as NaN/Infinity in the output and poison the history rollups
+    if not np.isfinite(value):
+        raise RowError(line_number, f"{field} must be finite: {raw!r}")
+    if value < 0:
+        raise RowError(line_number, f"{field} must not be negative: {raw!r}")
+    return value
+
+
+def parse_columns(line_numbers, columns, defaults):
+    """Convert raw input columns into float64 arrays.
+
+    columns maps each of INPUT_FIELDS to a list of raw cells (None when absent).
+    Each column is converted in one go; only if that fails, or a value is not a
+    finite, non-negative number, is the chunk walked row by row to find the bad rows. Returns (keep, arrays, errors), where keep is a
+    boolean mask of the rows that parsed and arrays only hold those rows.
+    """
+    try:
+        arrays = []
+        for field in INPUT_FIELDS:
+            column = columns[field]
+            if field in defaults:
+                default = defaults[field]
+                column = [default if raw is None or raw == "" else raw for raw in column]
+            elif None in column:
+                raise ValueError(field)
+            # numpy would quietly turn None into nan and booleans into 0/1
+            array = np.array(column, dtype=np.float64)
+            if array.ndim != 1 or bool in set(map(type, column)):
+                raise ValueError(field)
+            # nan, inf and negative costs are rejected row by row below
+            if not (np.isfinite(array).all() and (array >= 0).all()):
+                raise ValueError(field)
+            arrays.append(array)
+        return np.ones(len(line_numbers), dtype=bool), arrays, []
+    except (TypeError, ValueError, OverflowError):
+        pass
+
+    keep = np.ones(len(line_numbers), dtype=bool)
+    arrays = [np.empty(len(line_numbers), dtype=np.float64) for _ in INPUT_FIELDS]
+    errors = []
+    for i, line_number in enumerate(line_numbers):
+        try:
+            for array, field in zip(arrays, INPUT_FIELDS):
+                array[i] = parse_value(line_number, field, columns[field][i], defaults)
+        except RowError as e:
+            keep[i] = False
+            errors.append(e)
+    return keep, [array[keep] for array in arrays], errors
+
+
+def fill_from_source_files(line_numbers, columns, source_files, density=None):
+    """Fill blank print_weight/estimated_print_time cells in place from each row's source file.
+
+    Files are parsed at most once per content thanks to the metrics cache, so
+    re-quoting the same files at new prices only redoes the arithmetic. Returns a
+    RowError for every row whose file could not be read.
+    """
+    from metrics_cache import extract_job_metrics
+
+    errors = []
+    weights, times = columns["print_weight"], columns["estimated_print_time"]
+    for i, (line_number, source_file) in enumerate(zip(line_numbers, source_files)):
+        if not source_file or (weights[i] not in (None, "") and times[i] not in (None, "")):
+            continue
+        try:
+            metrics = extract_job_metrics(source_file, density=density)
+        except (OSError, ValueError) as e:
+            errors.append(RowError(line_number, f"could not read {source_file}: {e}"))
+            continue
+        if weights[i] in (None, ""):
+            weights[i] = metrics["weight_g"]
+        if times[i] in (None, "") and metrics["print_time_h"] is not None:
+            times[i] = metrics["print_time_h"]
+    return errors
+
+
+def parse_start_times(line_numbers, cells):
+    """Unix start times for a chunk's start_time cells (nan where blank), plus a list of RowErrors"""
+    from tariffs import parse_start_time
+
+    starts = np.full(len(cells), np.nan)
+    errors = []
+    for i, (line_number, cell) in enumerate(zip(line_numbers, cells)):
+        if cell is None or cell == "":
+            continue
+        try:
+            starts[i] = parse_start_time(cell)
+        except (TypeError, ValueError):
+            errors.append(RowError(line_number, f"invalid {START_TIME_FIELD}: {cell!r}"))
+    return starts, errors
+
+
+def apply_printer_profiles(printers, names, arrays):
+    """Power phases for a chunk's rows; rows on a profiled printer get its average wattage in arrays"""
+    phases, profiled = printers.phases(names, arrays[4])
+    if profiled.any():
+        arrays[4][profiled] = effective_watts(arrays[1][profiled], phases[profiled])
+    return phases
+
+
+def apply_tariff(tariff, starts, arrays, filament, electricity, phases=None):
+    """Re-cost electricity on a tariff for the rows with a start time; returns (electricity, total).
+
+    Each row's power phases (constant power when not given) are priced at the
+    rates in force while they run, and the rows' electricity_cost_per_kwh in
+    arrays becomes the average rate they paid.
+    """
+    scheduled = ~np.isnan(starts)
+    if not scheduled.any():
+        return electricity, filament + electricity
+    phases = constant_power_phases(arrays[4]) if phases is None else phases
+    hours, job_phases = arrays[1][scheduled], phases[scheduled]
+    electricity[scheduled] = tariff_costs = phase_tariff_cost(tariff, starts[scheduled], hours, job_phases)
+    energy_kwh = phase_energy_kwh(hours, job_phases)
+    arrays[3][scheduled] = np.divide(tariff_costs * 100, energy_kwh, out=arrays[3][scheduled], where=energy_kwh > 0)
+    return electricity, filament + electricity
+
+
+def format_costs(filament, electricity, total, decimals=None):
+    """Turn the cost arrays into per-row [filament, electricity, total] lists"""
+    costs = np.column_stack((filament, electricity, total))
+    if decimals is not None:
+        costs = costs.round(decimals)
+    return costs.tolist()
+
+
+def quote_stream(input_stream, output_stream, input_format="csv", output_format=None, defaults=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, decimals=None, error_stream=None, material_density=None,
+                 history=None, material="", tariff=None, printers=None):
+    """Cost every job in input_stream and write the costed rows to output_stream.
+
+    Rows are read, costed and written chunk_size at a time so memory stays flat no
+    matter how large the input is. Malformed rows are reported one per line to
+    error_stream and skipped. Rows with a source_file take their missing weight
+    and time from it, with models weighed at material_density. Rows whose printer
+    has a profile in the printers registry use its power phases. With a tariff,
+    rows with a start_time pay its rates over their print window. With a history
+    store, every chunk's costed jobs are also recorded in one transaction, under
+    their own printer/material columns or else material. Returns
+    (rows_written, rows_failed).
+    """
+    output_format = output_format or input_format
+    defaults = load_defaults() if defaults is None else defaults
+    error_stream = error_stream or sys.stderr
+
+    if input_format == "csv":
+        rows = read_csv_rows(input_stream)
+        header = next(rows, None)
+        if header is None:
+            return 0, 0
+        optional_fields = (SOURCE_FILE_FIELD, START_TIME_FIELD, PRINTER_FIELD, MATERIAL_FIELD)
+        positions = {field: header.index(field) for field in INPUT_FIELDS + optional_fields if field in header}
+    else:
+        rows = read_jsonl_rows(input_stream)
+        header = list(INPUT_FIELDS)
+        positions = {}
+
+    # csv output keeps the input columns and appends the costs
+    kept_fields = [field for field in header if field not in OUTPUT_FIELDS]
+    kept_positions = [i for i, field in enumerate(header) if field not in OUTPUT_FIELDS]
+    writer = None
+    written = failed = 0
+    line_numbers = []
+    records = []
+    read_errors = []
+
+    def column(field):
+        if input_format == "jsonl":
+            return [record.get(field) for record in records]
+        if field not in positions:
+            return [None] * len(records)
+        position = positions[field]
+        return [row[position] for row in records]
+
+    def as_csv_row(record):
+        if input_format == "jsonl":
+            return [record.get(field, "") for field in kept_fields]
+        if len(kept_positions) != len(header):
+            return [record[i] for i in kept_positions]
+        return record
+
+    def drop_rows(row_errors, columns, starts):
+        """Take the rows that row_errors refer to out of the chunk"""
+        failed_lines = {error.line_number for error in row_errors}
+        ok = [line_number not in failed_lines for line_number in line_numbers]
+        records[:] = [record for record, row_ok in zip(records, ok) if row_ok]
+        line_numbers[:] = [line_number for line_number in line_numbers if line_number not in failed_lines]
+        read_errors.extend(row_errors)
+        columns = {field: [value for value, row_ok in zip(values, ok) if row_ok] for field, values in columns.items()}
+        return columns, (starts[np.array(ok, dtype=bool)] if starts is not None else None)
+
+    def flush():
+        nonlocal writer, written, failed
+        columns = {field: column(field) for field in INPUT_FIELDS}
+        starts = None
+        if tariff is not None:
+            starts, start_errors = parse_start_times(line_numbers, column(START_TIME_FIELD))
+            if start_errors:
+                columns, starts = drop_rows(start_errors, columns, starts)
+        source_files = column(SOURCE_FILE_FIELD)
+        if any(source_files):
+            file_errors = fill_from_source_files(line_numbers, columns, source_files, material_density)
+            if file_errors:
+                columns, starts = drop_rows(file_errors, columns, starts)
+            # show the weight and time that were read from the files in the output rows
+            for field in ("print_weight", "estimated_print_time"):
+                if input_format == "jsonl":
+                    for record, value in zip(records, columns[field]):
+                        record[field] = value
+                elif field in positions:
+                    position = positions[field]
+                    for record, value in zip(records, columns[field]):
+                        record[position] = value
+
+        keep, arrays, errors = parse_columns(line_numbers, columns, defaults)
+        if starts is not None:
+            from tariffs import MAX_WINDOW_HOURS
+
+            starts = starts[keep] if errors else starts
+            # a tariff is only tabulated so far; longer prints fail on their own line, not the whole batch
+            too_long = ~np.isnan(starts) & (arrays[1] > MAX_WINDOW_HOURS)
+            if too_long.any():
+                kept_lines = np.array(line_numbers)[keep]
+                errors = errors + [RowError(int(line_number), f"estimated_print_time over {MAX_WINDOW_HOURS} hours "
+                                                              "can't be costed on a tariff")
+                                   for line_number in kept_lines[too_long]]
+                keep[np.flatnonzero(keep)[too_long]] = False
+                arrays = [array[~too_long] for array in arrays]
+                starts = starts[~too_long]
+        for error in sorted(read_errors + errors, key=lambda e: e.line_number):
+            error_stream.write(f"{error}\n")
+        failed += len(read_errors) + len(errors)
+
+        good = records if not errors else [record for record, ok in zip(records, keep.tolist()) if ok]
+
+        def kept(field):
+            values = column(field)
+            return values if not errors else [value for value, ok in zip(values, keep.tolist()) if ok]
+
+        phases = None
+        if printers is not None:
+            phases = apply_printer_profiles(printers, kept(PRINTER_FIELD), arrays)
+        filament, electricity, total = calculate_costs(**dict(zip(INPUT_FIELDS, arrays)))
+        if starts is not None:
+            electricity, total = apply_tariff(tariff, starts, arrays, filament, electricity, phases)
+        costs = format_costs(filament, electricity, total, decimals)
+        if history is not None and good:
+            jobs = [dict(zip(INPUT_FIELDS + OUTPUT_FIELDS, inputs + cost), printer=job_printer, material=job_material)
+                    for inputs, cost, job_printer, job_material
+                    in zip(np.column_stack(arrays).tolist(), costs, kept(PRINTER_FIELD), kept(MATERIAL_FIELD))]
+            history.record_jobs(jobs, material=material)
+        if output_format == "csv" and good:
+            if writer is None:
+                writer = csv.writer(output_stream)
+                writer.writerow(kept_fields + list(OUTPUT_FIELDS))
+            writer.writerows(map(list.__add__, map(as_csv_row, good), costs))
+        elif output_format == "jsonl":
+            for record, cost in zip(good, costs):
+                if input_format == "csv":
+                    record = dict(zip(header, record))
+                record.update(zip(OUTPUT_FIELDS, cost))
+                output_stream.write(json.dumps(record) + "\n")
+        written += len(good)
+        line_numbers.clear()
+        records.clear()
+        read_errors.clear()
+
+    for line_number, record in rows:
+        if isinstance(record, RowError):
+            read_errors.append(record)
+        else:
+            line_numbers.append(line_number)
+            records.append(record)
+        # a long run of malformed rows is written out too, so nothing piles up between chunks
+        if len(records) >= chunk_size or len(read_errors) >= chunk_size:
+            flush()
+    if records or read_errors:
+        flush()
+    return written, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quote a CSV or JSONL file of print jobs with PlasticTax.")
+    parser.add_argument("input", help="job file to read, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="where to write costed rows (default: stdout)")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="defaults to the input file extension, then csv")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], help="defaults to the output file extension, then the input format")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows costed per vectorized pass")
+    parser.add_argument("--decimals", type=int, help="round costs to this many decimal places")
+    parser.add_argument("--settings", help="settings.csv to take defaults from (default: the app's settings file)")
+    parser.add_argument("--history", nargs="?", const="", metavar="DATABASE",
+                        help="also record the costed jobs in the job history (default: the app's own)")
+    parser.add_argument("--tariff", help="time-of-use tariff for rows with a start_time (default: the one chosen in settings)")
+    args = parser.parse_args(argv)
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or (detect_format(args.output, input_format) if args.output != "-" else input_format)
+
+    material = get_settings_store(args.settings).get("default_material", "PLA")
+    tariff_name = args.tariff if args.tariff is not None else get_settings_store(args.settings).get("electricity_tariff")
+    tariff = None
+    if tariff_name:
+        from tariffs import get_tariff_store
+
+        try:
+            tariff = get_tariff_store(args.settings).get(tariff_name)
+        except (OSError, ValueError) as e:
+            print(f"Could not load tariff: {e}", file=sys.stderr)
+            return 2
+    history = None
+    if args.history is not None:
+        from history import get_history_store
+
+        history = get_history_store(args.history or None)
+
+    # printer profiles only cost anything when there are some
+    printers = get_printer_registry(args.settings)
+    try:
+        printers = printers if printers.names() else None
+    except (OSError, ValueError) as e:
+        print(f"Could not load printer profiles: {e}", file=sys.stderr)
+        return 2
+
+    input_stream = sys.stdin if args.input == "-" else open(args.input, "r", newline="")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        written, failed = quote_stream(
+            input_stream, output_stream, input_format, output_format,
+            defaults=load_defaults(args.settings), chunk_size=max(args.chunk_size, 1), decimals=args.decimals,
+            material_density=get_material_density(material), history=history, material=material, tariff=tariff,
+            printers=printers,
+        )
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+
+    print(f"Quoted {written} jobs, {failed} rows failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+# headless cost engine shared by the GUI and the batch tools
+import numpy as np
+
+
+def cost_formula(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating):
+    """Apply the PlasticTax cost formula to floats or NumPy arrays alike.
+
+    Returns a (filament_cost, electricity_cost, total_cost) tuple.
+    """
+    # convert inputs
+    print_weight_kg = print_weight / 1000  # convert grams to kg
+    printer_power_kw = printer_power_rating / 1000  # convert watts to kW
+    electricity_cost_per_kwh_dollars = electricity_cost_per_kwh / 100  # convert cents to dollars
+
+    # calculate the cost
+    filament_cost = filament_cost_per_kg * print_weight_kg
+    electricity_cost = electricity_cost_per_kwh_dollars * printer_power_kw * estimated_print_time
+
+    total_cost = filament_cost + electricity_cost
+    return filament_cost, electricity_cost, total_cost
+
+
+def calculate_single_cost(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating):
+    """Cost one job from numbers or numeric strings, raising ValueError on bad input"""
+    return cost_formula(
+        float(filament_cost_per_kg),
+        float(print_weight),
+        float(estimated_print_time),
+        float(electricity_cost_per_kwh),
+        float(printer_power_rating),
+    )
+
+
+def calculate_costs(*, filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating):
+    """Cost many jobs at once from columnar inputs.
+
+    The arguments are keyword-only, so columns can't be passed in the wrong
+    order. Every one may be a scalar or a 1-D array of the same length; scalars
+    are broadcast across all jobs. Returns float64 (filament, electricity, total) arrays.
+    """
+    columns = np.broadcast_arrays(
+        np.asarray(filament_cost_per_kg, dtype=np.float64),
+        np.asarray(print_weight, dtype=np.float64),
+        np.asarray(estimated_print_time, dtype=np.float64),
+        np.asarray(electricity_cost_per_kwh, dtype=np.float64),
+        np.asarray(printer_power_rating, dtype=np.float64),
+    )
+    return cost_formula(*columns)
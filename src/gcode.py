@@ -0,0 +1,474 @@
+# G-code analysis: print weight and time from slicer metadata, or from the moves themselves
+import argparse
+import json
+import math
+import mmap
+import os
+import re
+import sys
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+GCODE_EXTENSIONS = (".gcode", ".gco", ".g")
+
+# used to turn filament length into grams when the file doesn't say
+DEFAULT_FILAMENT_DIAMETER_MM = 1.75
+DEFAULT_FILAMENT_DENSITY = 1.24  # g/cm^3, PLA
+
+# slicers write their summary at the top (Cura, Orca/Bambu) or bottom (PrusaSlicer),
+# so those regions are searched first and the rest of the file only if needed
+EDGE_SEARCH_BYTES = 1 << 20
+
+_NUMBER = rb"([-+]?\d+(?:\.\d+)?)"
+_NUMBER_LIST = rb"([-+\d.,\s]+?)\s*$"
+
+WEIGHT_PATTERNS = (
+    re.compile(rb"^;\s*total filament weight \[g\]\s*[:=]\s*" + _NUMBER, re.M),  # Orca/Bambu
+    re.compile(rb"^;\s*filament used \[g\]\s*[:=]\s*" + _NUMBER_LIST, re.M),  # PrusaSlicer/Orca, per extruder
+    re.compile(rb"^;\s*Plastic weight:\s*" + _NUMBER + rb"\s*g", re.M),  # Simplify3D
+)
+LENGTH_MM_PATTERNS = (
+    re.compile(rb"^;\s*filament used \[mm\]\s*[:=]\s*" + _NUMBER_LIST, re.M),  # PrusaSlicer/Orca
+    re.compile(rb"^;\s*Filament length:\s*" + _NUMBER + rb"\s*mm", re.M),  # Simplify3D
+)
+LENGTH_M_PATTERNS = (
+    re.compile(rb"^;\s*Filament used:\s*([-+\d.,\sm]+?)\s*$", re.M),  # Cura, "1.234m" per extruder
+)
+TIME_TEXT_PATTERNS = (
+    re.compile(rb"^;.*?total estimated time:\s*([\ddhms ]+)", re.M),  # Orca/Bambu
+    re.compile(rb"^;\s*estimated printing time \(normal mode\)\s*=\s*([\ddhms ]+)", re.M),  # PrusaSlicer/Orca
+    re.compile(rb"^;\s*Build time:\s*([\d\w ]+?)\s*$", re.M),  # Simplify3D, "1 hours 2 minutes"
+)
+TIME_SECONDS_PATTERNS = (
+    re.compile(rb"^;TIME:" + _NUMBER, re.M),  # Cura
+    re.compile(rb"^;PRINT\.TIME:" + _NUMBER, re.M),  # Cura (Griffin flavor)
+)
+DIAMETER_PATTERN = re.compile(rb"^;\s*filament_diameter\s*=\s*" + _NUMBER, re.M)
+DENSITY_PATTERN = re.compile(rb"^;\s*filament_density\s*=\s*" + _NUMBER, re.M)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)\s*(d|h|m|s)", re.I)
+_DURATION_UNITS = {"d": 86400, "h": 3600, "m": 60, "s": 1}
+
+
+def parse_duration(text):
+    """Seconds in a slicer duration such as '1d 2h 3m 4s' or '1 hours 2 minutes'"""
+    return sum(float(amount) * _DURATION_UNITS[unit.lower()] for amount, unit in _DURATION_PART.findall(text))
+
+
+def _sum_numbers(raw):
+    return sum(float(part) for part in re.split(r"[,\s]+", raw.replace("m", " ").strip()) if part)
+
+
+def filament_grams(length_mm, diameter_mm=DEFAULT_FILAMENT_DIAMETER_MM, density=DEFAULT_FILAMENT_DENSITY):
+    """Weight in grams of length_mm of filament"""
+    area_mm2 = math.pi * (diameter_mm / 2) ** 2
+    return length_mm * area_mm2 / 1000 * density
+
+
+class _MetadataSearch:
+    """Finds slicer comments in a memory-mapped file, looking at its ends before the middle"""
+
+    def __init__(self, data):
+        self.data = data
+        size = len(data)
+        if size <= 2 * EDGE_SEARCH_BYTES:
+            self.regions = [(0, size)]
+        else:
+            self.regions = [(0, EDGE_SEARCH_BYTES), (size - EDGE_SEARCH_BYTES, size), (EDGE_SEARCH_BYTES, size - EDGE_SEARCH_BYTES)]
+
+    def find(self, patterns):
+        for start, end in self.regions:
+            for pattern in patterns:
+                match = pattern.search(self.data, start, end)
+                if match:
+                    return match.group(1).decode("ascii", "replace")
+        return None
+
+
+def read_filament_metadata(data):
+    """Pull what the slicer comments say, before any material is applied.
+
+    Returns a dict with weight_g (when the slicer states grams), filament_mm
+    with the diameter_mm and density the file was sliced for (when it only
+    states a length), and print_time_h; anything the comments lack is None.
+    """
+    search = _MetadataSearch(data)
+    found = {"weight_g": None, "filament_mm": None, "diameter_mm": None, "density": None, "print_time_h": None}
+
+    raw = search.find(WEIGHT_PATTERNS)
+    if raw is not None:
+        found["weight_g"] = _sum_numbers(raw)
+    else:
+        raw = search.find(LENGTH_MM_PATTERNS)
+        if raw is not None:
+            found["filament_mm"] = _sum_numbers(raw)
+        else:
+            raw = search.find(LENGTH_M_PATTERNS)
+            if raw is not None:
+                found["filament_mm"] = _sum_numbers(raw) * 1000
+        if found["filament_mm"] is not None:
+            diameter = search.find((DIAMETER_PATTERN,))
+            file_density = search.find((DENSITY_PATTERN,))
+            found["diameter_mm"] = float(diameter) if diameter else None
+            found["density"] = float(file_density) if file_density and float(file_density) > 0 else None
+
+    raw = search.find(TIME_TEXT_PATTERNS)
+    if raw is not None and parse_duration(raw) > 0:
+        found["print_time_h"] = parse_duration(raw) / 3600
+    else:
+        raw = search.find(TIME_SECONDS_PATTERNS)
+        if raw is not None:
+            found["print_time_h"] = float(raw) / 3600
+    return found
+
+
+def gcode_weight(measured, diameter_mm=DEFAULT_FILAMENT_DIAMETER_MM, density=DEFAULT_FILAMENT_DENSITY):
+    """Grams for a read_filament_metadata or measure_gcode result.
+
+    The slicer's own figure wins; otherwise the filament length is weighed at the
+    diameter and density the file names, falling back to the ones given.
+    """
+    if measured["weight_g"] is not None:
+        return measured["weight_g"]
+    if measured["filament_mm"] is None:
+        return None
+    return filament_grams(measured["filament_mm"],
+                          diameter_mm if measured["diameter_mm"] is None else measured["diameter_mm"],
+                          density if measured["density"] is None else measured["density"])
+
+
+def read_metadata(data, diameter_mm=DEFAULT_FILAMENT_DIAMETER_MM, density=DEFAULT_FILAMENT_DENSITY):
+    """Pull weight (g) and time (h) out of slicer comments; either may come back None"""
+    found = read_filament_metadata(data)
+    return gcode_weight(found, diameter_mm, density), found["print_time_h"]
+
+
+# moves are parsed a chunk at a time with NumPy: lines, comments and X/Y/Z/E/F
+# words are located with byte comparisons and every number in the chunk is
+# converted in one call; only the rare mode-changing commands are handled in Python.
+# Chunks are upper-cased first, and a word's number runs until the first byte that
+# can't be part of one, so "G1X1E2" is X1 and E2 just like "G1 X1 E2".
+MOVE_CHUNK_BYTES = 16 << 20
+AXES = (b"X", b"Y", b"Z", b"E", b"F")
+
+_AXIS_CODES = np.zeros(256, dtype=np.int8)
+for _code, _axis in enumerate(AXES, start=1):
+    _AXIS_CODES[ord(_axis)] = _code
+_NUMBER_BYTES = np.zeros(256, dtype=bool)
+_NUMBER_BYTES[list(b"0123456789.-+")] = True
+# a line starting with one of these has leading whitespace or an N line number to strip
+_LINE_PREFIX_BYTES = np.zeros(256, dtype=bool)
+_LINE_PREFIX_BYTES[[ord(" "), ord("\t"), ord("N")]] = True
+_LINE_PREFIX = re.compile(rb"^[ \t]*(?:N\d+[ \t]*)?", re.M)
+
+_STATE_COMMAND = re.compile(rb"^(G9[01]|M8[23]|G92|G4)(?![\d.])([^;]*)")
+_WORD = re.compile(rb"([A-Z])([-+]?[\d.]+)")
+
+
+class _MoveState:
+    """Machine state carried from one chunk of moves to the next"""
+
+    def __init__(self):
+        self.position = {b"X": 0.0, b"Y": 0.0, b"Z": 0.0}
+        self.e = 0.0
+        self.feedrate = 1500.0  # mm/min until the file sets one
+        self.absolute_xyz = True
+        self.absolute_e = True
+        self.filament_mm = 0.0
+        self.seconds = 0.0
+
+    def apply_command(self, line):
+        match = _STATE_COMMAND.match(line)
+        if match is None:
+            return
+        command, arguments = match.groups()
+        if command == b"G90":
+            self.absolute_xyz = self.absolute_e = True
+        elif command == b"G91":
+            self.absolute_xyz = self.absolute_e = False
+        elif command == b"M82":
+            self.absolute_e = True
+        elif command == b"M83":
+            self.absolute_e = False
+        else:
+            for axis, value in _WORD.findall(arguments):
+                try:
+                    value = float(value)
+                except ValueError:
+                    continue
+                if command == b"G92":
+                    if axis == b"E":
+                        self.e = value
+                    elif axis in self.position:
+                        self.position[axis] = value
+                elif axis == b"P":  # G4 dwell
+                    self.seconds += value / 1000
+                elif axis == b"S":
+                    self.seconds += value
+
+
+def _float_or_nan(value):
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def _parse_numbers(chunk, data, starts, ends):
+    """Parse the number tokens data[starts[i]:ends[i]] into a float array"""
+    counts = np.zeros(len(data) + 1, dtype=np.int8)
+    counts[starts] = 1
+    counts[ends] -= 1
+    inside = np.cumsum(counts[:len(data)], dtype=np.int8).view(bool)
+    # keep only the token bytes, each followed by one space, and let NumPy split them
+    inside[ends] = True
+    text = data[inside]
+    text[np.cumsum(ends - starts + 1) - 1] = ord(" ")
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            numbers = np.fromstring(text.tobytes(), dtype=np.float64, sep=" ")
+    except ValueError:
+        numbers = None
+    if numbers is None or len(numbers) != len(starts):
+        # a malformed number somewhere in the chunk; treat just those words as absent
+        numbers = np.array([_float_or_nan(chunk[a:b]) for a, b in zip(starts.tolist(), ends.tolist())], dtype=np.float64)
+    return numbers
+
+
+def _forward_fill(values, initial):
+    """Replace NaNs with the last value seen before them (or initial)"""
+    values = np.concatenate(([initial], values))
+    index = np.where(np.isnan(values), 0, np.arange(len(values)))
+    np.maximum.accumulate(index, out=index)
+    return values[index]
+
+
+def _integrate_segment(columns, state):
+    """Add the extrusion and time of a run of moves with no mode changes in between"""
+    if not len(columns[b"F"]):
+        return
+
+    squared = 0.0
+    for axis in (b"X", b"Y", b"Z"):
+        values = columns[axis]
+        if state.absolute_xyz:
+            filled = _forward_fill(values, state.position[axis])
+            delta = np.diff(filled)
+            state.position[axis] = float(filled[-1])
+        else:
+            delta = np.nan_to_num(values)
+            state.position[axis] += float(delta.sum())
+        squared = squared + delta * delta
+
+    if state.absolute_e:
+        filled = _forward_fill(columns[b"E"], state.e)
+        de = np.diff(filled)
+        state.e = float(filled[-1])
+    else:
+        de = np.nan_to_num(columns[b"E"])
+        state.e += float(de.sum())
+    state.filament_mm += float(de.sum())
+
+    feedrates = np.where(columns[b"F"] > 0, columns[b"F"], np.nan)
+    feedrates = _forward_fill(feedrates, state.feedrate)[1:]
+    state.feedrate = float(feedrates[-1])
+
+    distance = np.sqrt(squared)
+    distance = np.where(distance > 0, distance, np.abs(de))
+    state.seconds += float((distance / (feedrates / 60)).sum())
+
+
+def _split_lines(chunk):
+    data = np.frombuffer(chunk, dtype=np.uint8)
+    is_newline = data == ord("\n")
+    newlines = np.flatnonzero(is_newline)
+    line_starts = np.concatenate(([0], newlines[:-1] + 1))
+    return data, is_newline, newlines, line_starts
+
+
+def _integrate_chunk(chunk, state):
+    """Integrate every move in chunk, which must end with a newline"""
+    chunk = chunk.upper()
+    data, is_newline, newlines, line_starts = _split_lines(chunk)
+    if _LINE_PREFIX_BYTES[data[line_starts]].any():
+        # indented or line-numbered G-code (rare) is rewritten so every line starts with its command
+        chunk = _LINE_PREFIX.sub(b"", chunk)
+        data, is_newline, newlines, line_starts = _split_lines(chunk)
+    padded = np.concatenate((data, np.zeros(4, dtype=np.uint8)))
+    line_numbers = np.cumsum(is_newline, dtype=np.int32)
+    line_numbers -= is_newline
+
+    # G0/G1 (or G00/G01) moves, and the few commands that change how moves are read
+    c0, c1, c2, c3 = (padded[line_starts + i] for i in range(4))
+    is_g = c0 == ord("G")
+    is_move = is_g & (
+        (((c1 == ord("0")) | (c1 == ord("1"))) & ~_NUMBER_BYTES[c2])
+        | ((c1 == ord("0")) & ((c2 == ord("0")) | (c2 == ord("1"))) & ~_NUMBER_BYTES[c3])
+    )
+    is_state = (is_g & ((c1 == ord("9")) | ((c1 == ord("4")) & ~_NUMBER_BYTES[c2]))) | ((c0 == ord("M")) & (c1 == ord("8")))
+    move_lines = np.flatnonzero(is_move)
+    state_lines = np.flatnonzero(is_state)
+
+    # axis words inside move lines, before any comment or checksum, each followed by its number
+    semicolons = np.concatenate((np.flatnonzero((data == ord(";")) | (data == ord("*"))), [len(data)]))
+    code_ends = np.minimum(semicolons[np.searchsorted(semicolons, line_starts)], newlines)
+    codes = _AXIS_CODES[data]
+    words = np.flatnonzero(codes)
+    words = words[words > 0]
+    line_of_word = line_numbers[words]
+    keep = is_move[line_of_word] & (words < code_ends[line_of_word])
+    words, line_of_word = words[keep], line_of_word[keep]
+    # the chunk ends with a newline, so every word has a byte after its number
+    not_number = np.flatnonzero(~_NUMBER_BYTES[data])
+    word_ends = not_number[np.searchsorted(not_number, words + 1)]
+    keep = word_ends > words + 1
+    words, line_of_word, word_ends = words[keep], line_of_word[keep], word_ends[keep]
+    numbers = _parse_numbers(chunk, data, words + 1, word_ends)
+
+    move_of_word = np.searchsorted(move_lines, line_of_word)
+    columns = {}
+    for code, axis in enumerate(AXES, start=1):
+        values = np.full(len(move_lines), np.nan)
+        selected = codes[words] == code
+        values[move_of_word[selected]] = numbers[selected]
+        columns[axis] = values
+
+    # moves between two mode changes are integrated together
+    boundaries = np.searchsorted(move_lines, state_lines).tolist()
+    start = 0
+    for line, boundary in zip(state_lines.tolist(), boundaries):
+        _integrate_segment({axis: values[start:boundary] for axis, values in columns.items()}, state)
+        state.apply_command(chunk[line_starts[line]:newlines[line]])
+        start = boundary
+    _integrate_segment({axis: values[start:] for axis, values in columns.items()}, state)
+
+
+def integrate_moves(stream, progress=None):
+    """Walk the moves in a binary G-code stream and return (filament length mm, print time h).
+
+    Extrusion is the net E travel (so retract/unretract pairs cancel out); time is
+    each move's length over its feedrate, plus G4 dwells, ignoring acceleration.
+    Handles G90/G91, M82/M83 and G92. The stream is read MOVE_CHUNK_BYTES at a
+    time and each chunk is parsed with NumPy, so memory stays flat. progress, if
+    given, is called with the number of bytes parsed so far after every chunk.
+    """
+    state = _MoveState()
+    carry = b""
+    done = 0
+    while True:
+        block = stream.read(MOVE_CHUNK_BYTES)
+        if not block:
+            break
+        block = carry + block
+        cut = block.rfind(b"\n") + 1
+        if cut == 0:
+            carry = block
+            continue
+        carry = block[cut:]
+        _integrate_chunk(block[:cut], state)
+        done += cut
+        if progress is not None:
+            progress(done)
+    if carry:
+        _integrate_chunk(carry + b"\n", state)
+        if progress is not None:
+            progress(done + len(carry))
+
+    return max(state.filament_mm, 0.0), state.seconds / 3600
+
+
+def measure_gcode(path, progress=None):
+    """Return the filament and time of one G-code file, before any material is applied.
+
+    Slicer metadata is used when present: the file is memory-mapped and searched
+    with compiled regexes, so only the pages that hold the comments are read.
+    Whatever the metadata lacks is worked out by streaming through the moves.
+    The result has read_filament_metadata's fields plus source; gcode_weight
+    turns it into grams for a material.
+    """
+    size = os.path.getsize(path)
+    measured = {"weight_g": None, "filament_mm": None, "diameter_mm": None, "density": None, "print_time_h": None}
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            measured = read_filament_metadata(data)
+
+    has_filament = measured["weight_g"] is not None or measured["filament_mm"] is not None
+    source = "metadata"
+    if not has_filament or measured["print_time_h"] is None:
+        with open(path, "rb", buffering=1 << 20) as f:
+            filament_mm, move_hours = integrate_moves(f, None if progress is None else lambda n: progress(n, size))
+        source = "moves" if not has_filament and measured["print_time_h"] is None else "metadata+moves"
+        if not has_filament:
+            measured["filament_mm"] = filament_mm
+        if measured["print_time_h"] is None:
+            measured["print_time_h"] = move_hours
+
+    measured["source"] = source
+    return measured
+
+
+def analyze_gcode(path, diameter_mm=DEFAULT_FILAMENT_DIAMETER_MM, density=DEFAULT_FILAMENT_DENSITY, progress=None):
+    """Return {'weight_g', 'print_time_h', 'source'} for one G-code file (see measure_gcode)"""
+    measured = measure_gcode(path, progress)
+    return {"weight_g": gcode_weight(measured, diameter_mm, density), "print_time_h": measured["print_time_h"],
+            "source": measured["source"]}
+
+
+def find_gcode_files(directory):
+    """Every G-code file directly inside directory, sorted by name"""
+    return sorted(
+        entry.path for entry in os.scandir(directory)
+        if entry.is_file() and entry.name.lower().endswith(GCODE_EXTENSIONS)
+    )
+
+
+def _analyze_for_pool(args):
+    path, diameter_mm, density = args
+    try:
+        return path, analyze_gcode(path, diameter_mm, density), None
+    except (OSError, ValueError) as e:
+        return path, None, str(e)
+
+
+def analyze_folder(directory, processes=None, diameter_mm=DEFAULT_FILAMENT_DIAMETER_MM, density=DEFAULT_FILAMENT_DENSITY):
+    """Analyze every G-code file in directory across a process pool.
+
+    Yields (path, result, error) in file name order; error is a message when the
+    file could not be read, otherwise None.
+    """
+    work = [(path, diameter_mm, density) for path in find_gcode_files(directory)]
+    if processes == 1 or len(work) <= 1:
+        yield from map(_analyze_for_pool, work)
+        return
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        yield from executor.map(_analyze_for_pool, work, chunksize=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read print weight and time from G-code files.")
+    parser.add_argument("path", help="a G-code file, or a folder of them")
+    parser.add_argument("--processes", type=int, help="worker processes for a folder (default: one per CPU)")
+    parser.add_argument("--diameter", type=float, default=DEFAULT_FILAMENT_DIAMETER_MM, help="filament diameter in mm")
+    parser.add_argument("--density", type=float, default=DEFAULT_FILAMENT_DENSITY, help="filament density in g/cm^3")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.path):
+        results = analyze_folder(args.path, args.processes, args.diameter, args.density)
+    else:
+        results = [_analyze_for_pool((args.path, args.diameter, args.density))]
+
+    failed = 0
+    for path, result, error in results:
+        if error is not None:
+            print(f"{path}: {error}", file=sys.stderr)
+            failed += 1
+        else:
+            print(json.dumps({"path": path, **result}))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
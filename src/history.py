@@ -0,0 +1,290 @@
+# job history: every costed job in SQLite, with daily/monthly rollups for fast spend reports
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from settings import get_default_settings_path
+
+# inputs and outputs stored for every job, in batch_quote's INPUT_FIELDS order then the costs
+JOB_FIELDS = ("print_weight", "estimated_print_time", "filament_cost_per_kg", "electricity_cost_per_kwh",
+              "printer_power_rating", "filament_cost", "electricity_cost", "total_cost")
+# what the rollups add up per (period, printer, material)
+ROLLUP_SUMS = ("weight_g", "hours", "filament_cost", "electricity_cost", "total_cost")
+GROUP_COLUMNS = ("printer", "material")
+
+DEFAULT_PAGE_SIZE = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    printer TEXT NOT NULL DEFAULT '',
+    material TEXT NOT NULL DEFAULT '',
+    name TEXT,
+    print_weight REAL NOT NULL,
+    estimated_print_time REAL NOT NULL,
+    filament_cost_per_kg REAL NOT NULL,
+    electricity_cost_per_kwh REAL NOT NULL,
+    printer_power_rating REAL NOT NULL,
+    filament_cost REAL NOT NULL,
+    electricity_cost REAL NOT NULL,
+    total_cost REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS jobs_printer_created_at ON jobs (printer, created_at);
+CREATE INDEX IF NOT EXISTS jobs_material_created_at ON jobs (material, created_at);
+CREATE TABLE IF NOT EXISTS rollups (
+    period TEXT NOT NULL,
+    start TEXT NOT NULL,
+    printer TEXT NOT NULL,
+    material TEXT NOT NULL,
+    jobs INTEGER NOT NULL,
+    weight_g REAL NOT NULL,
+    hours REAL NOT NULL,
+    filament_cost REAL NOT NULL,
+    electricity_cost REAL NOT NULL,
+    total_cost REAL NOT NULL,
+    PRIMARY KEY (period, start, printer, material)
+) WITHOUT ROWID;
+"""
+
+_INSERT_JOB = (
+    "INSERT INTO jobs (created_at, printer, material, name, " + ", ".join(JOB_FIELDS) + ") "
+    "VALUES (?, ?, ?, ?, " + ", ".join("?" * len(JOB_FIELDS)) + ")"
+)
+_UPSERT_ROLLUP = (
+    "INSERT INTO rollups (period, start, printer, material, jobs, " + ", ".join(ROLLUP_SUMS) + ") "
+    "VALUES (?, ?, ?, ?, ?, " + ", ".join("?" * len(ROLLUP_SUMS)) + ") "
+    "ON CONFLICT (period, start, printer, material) DO UPDATE SET jobs = jobs + excluded.jobs, "
+    + ", ".join(f"{column} = {column} + excluded.{column}" for column in ROLLUP_SUMS)
+)
+
+
+def page_cursor(job):
+    """Paging cursor for a job dict returned by HistoryStore.page"""
+    return job["created_at"], job["id"]
+
+
+def get_history_path():
+    """SQLite file holding the job history, next to the settings file"""
+    return os.path.join(os.path.dirname(get_default_settings_path()), "history.sqlite3")
+
+
+def quarter_range(day=None):
+    """(first day, first day of the next quarter) of the quarter holding day (today by default)"""
+    day = day or datetime.date.today()
+    first_month = 3 * ((day.month - 1) // 3) + 1
+    start = datetime.date(day.year, first_month, 1)
+    end = datetime.date(day.year + (first_month == 10), 1 if first_month == 10 else first_month + 3, 1)
+    return start, end
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _next_month(day):
+    return datetime.date(day.year + (day.month == 12), 1 if day.month == 12 else day.month + 1, 1)
+
+
+class HistoryStore:
+    """Append-only log of costed jobs plus per-day and per-month totals.
+
+    Jobs are written in batches, one transaction per batch; the same transaction
+    adds the batch's totals to the day and month rollup rows of every printer and
+    material it touches, so reports never have to scan the jobs table. Days and
+    months are in local time. The database is in WAL mode, so the GUI can page
+    through history while a batch tool is writing to it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_history_path()
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def record_jobs(self, jobs, printer="", material="", created_at=None):
+        """Store a batch of job dicts in one transaction and return how many were written.
+
+        Each job needs the JOB_FIELDS numbers; printer, material, name and
+        created_at (Unix seconds) are taken from the job when it has them, else
+        from the arguments (created_at defaults to now).
+        """
+        now = time.time() if created_at is None else created_at
+        rows = []
+        totals = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0, 0.0])
+        for job in jobs:
+            stamp = float(job.get("created_at") or now)
+            job_printer = str(job.get("printer") or printer or "")
+            job_material = str(job.get("material") or material or "")
+            values = [float(job[field]) for field in JOB_FIELDS]
+            rows.append((stamp, job_printer, job_material, job.get("name") or job.get("job_id")) + tuple(values))
+
+            local = time.localtime(stamp)
+            day, month = time.strftime("%Y-%m-%d", local), time.strftime("%Y-%m", local)
+            sums = (values[0], values[1], values[5], values[6], values[7])
+            for key in (("day", day, job_printer, job_material), ("month", month, job_printer, job_material)):
+                entry = totals[key]
+                entry[0] += 1
+                for i, value in enumerate(sums, start=1):
+                    entry[i] += value
+
+        if not rows:
+            return 0
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany(_INSERT_JOB, rows)
+            connection.executemany(_UPSERT_ROLLUP, [key + tuple(entry) for key, entry in totals.items()])
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def record_job(self, job, printer="", material=""):
+        return self.record_jobs([job], printer, material)
+
+    def _page(self, cursor, newer, limit, printer, material):
+        conditions, parameters = [], []
+        if cursor is not None:
+            conditions.append(f"(created_at, id) {'>' if newer else '<'} (?, ?)")
+            parameters += list(cursor)
+        for column, value in (("printer", printer), ("material", material)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                parameters.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "ASC" if newer else "DESC"
+        rows = self._connection().execute(
+            f"SELECT * FROM jobs {where} ORDER BY created_at {order}, id {order} LIMIT ?", parameters + [limit]).fetchall()
+        rows = [dict(row) for row in rows]
+        return rows[::-1] if newer else rows
+
+    def page(self, before=None, limit=DEFAULT_PAGE_SIZE, printer=None, material=None):
+        """Newest-first page of jobs older than the (created_at, id) cursor before, as dicts.
+
+        Paging is by key rather than OFFSET and follows the time indexes, so page
+        10,000 costs the same as page 1, filtered or not. Pass page_cursor() of
+        the last job on one page to get the next.
+        """
+        return self._page(before, False, limit, printer, material)
+
+    def newer_page(self, after, limit=DEFAULT_PAGE_SIZE, printer=None, material=None):
+        """The page of jobs just newer than the cursor after, newest first (for paging back)"""
+        return self._page(after, True, limit, printer, material)
+
+    def count(self):
+        return self._connection().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def spend(self, group_by="printer", start=None, end=None):
+        """Totals per printer or material (or overall, group_by=None) for days in [start, end).
+
+        start and end are dates (None means unbounded). Whole months inside the
+        range are read from the monthly rollups and the days around them from the
+        daily ones, so a quarter costs a handful of rows per printer whatever the
+        number of jobs. Returns a list of dicts sorted by total_cost, largest first.
+        """
+        if group_by is not None and group_by not in GROUP_COLUMNS:
+            raise ValueError(f"group_by must be one of {GROUP_COLUMNS} or None")
+
+        ranges, parameters = [], []
+        if start is None and end is None:
+            ranges.append("period = 'month'")
+        else:
+            start = start or datetime.date(1970, 1, 1)
+            end = end or datetime.date(9999, 1, 1)
+            first_full = start if start.day == 1 else _next_month(start)
+            last_full = _month_start(end)
+            if first_full < last_full:
+                ranges.append("(period = 'day' AND start >= ? AND start < ?)")
+                parameters += [start.isoformat(), first_full.isoformat()]
+                ranges.append("(period = 'month' AND start >= ? AND start < ?)")
+                parameters += [first_full.isoformat()[:7], last_full.isoformat()[:7]]
+                ranges.append("(period = 'day' AND start >= ? AND start < ?)")
+                parameters += [last_full.isoformat(), end.isoformat()]
+            else:
+                ranges.append("(period = 'day' AND start >= ? AND start < ?)")
+                parameters += [start.isoformat(), end.isoformat()]
+
+        key = f"{group_by}, " if group_by else ""
+        sums = ", ".join(f"SUM({column}) AS {column}" for column in ("jobs",) + ROLLUP_SUMS)
+        group = f"GROUP BY {group_by}" if group_by else ""
+        rows = self._connection().execute(
+            f"SELECT {key}{sums} FROM rollups WHERE {' OR '.join(ranges)} {group} ORDER BY total_cost DESC",
+            parameters).fetchall()
+        return [dict(row) for row in rows if row["jobs"]]
+
+    def rebuild_rollups(self):
+        """Recompute every rollup row from the jobs table (after editing jobs by hand)"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM rollups")
+            for period, pattern in (("day", "%Y-%m-%d"), ("month", "%Y-%m")):
+                connection.execute(
+                    "INSERT INTO rollups (period, start, printer, material, jobs, " + ", ".join(ROLLUP_SUMS) + ") "
+                    f"SELECT '{period}', strftime('{pattern}', created_at, 'unixepoch', 'localtime'), printer, material, "
+                    "COUNT(*), SUM(print_weight), SUM(estimated_print_time), SUM(filament_cost), "
+                    "SUM(electricity_cost), SUM(total_cost) FROM jobs GROUP BY 2, 3, 4")
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_history_store(path=None):
+    """Return the shared HistoryStore for a database file (the app's own by default)"""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = HistoryStore(path)
+        return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report on the PlasticTax job history.")
+    parser.add_argument("--history", help="history database to use (default: the app's own)")
+    parser.add_argument("--by", choices=GROUP_COLUMNS + ("none",), default="printer", help="what to total spend by")
+    parser.add_argument("--quarter", action="store_true", help="only this quarter")
+    parser.add_argument("--start", type=datetime.date.fromisoformat, help="first day (YYYY-MM-DD)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat, help="day after the last day (YYYY-MM-DD)")
+    parser.add_argument("--rebuild", action="store_true", help="recompute the rollups from the jobs first")
+    args = parser.parse_args(argv)
+
+    store = get_history_store(args.history)
+    if args.rebuild:
+        store.rebuild_rollups()
+    start, end = quarter_range() if args.quarter else (args.start, args.end)
+    for row in store.spend(None if args.by == "none" else args.by, start, end):
+        print(json.dumps(row))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
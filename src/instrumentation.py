@@ -0,0 +1,197 @@
+# opt-in timers and counters for hot paths, switched on by an entry point's --metrics <file>
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
+
+# Prometheus names are prefixed with this
+NAMESPACE = "plastictax"
+
+# how often the window rewrites the metrics file while it is open
+EXPORT_SECONDS = 60
+
+
+# off until configure() is called; library code and CLIs that never export leave it off
+metrics_path = None
+enabled = False
+session_profile_path = None
+
+_lock = threading.Lock()
+# name -> [calls, total seconds, slowest call]
+_timers = {}
+_counters = {}
+_profiler = None
+_NULL_TIMER = nullcontext()
+
+
+def configure(path=None, profile_path=None):
+    """Collect metrics for export to path (None switches them off) and set where a session profile goes.
+
+    Entry points call this with their parsed --metrics and --profile-session.
+    Functions decorated earlier with timed() follow it from their next call.
+    """
+    global metrics_path, enabled, session_profile_path
+    metrics_path = path or None
+    enabled = metrics_path is not None
+    session_profile_path = profile_path or None
+
+
+def _record(name, seconds):
+    with _lock:
+        stats = _timers.get(name)
+        if stats is None:
+            _timers[name] = [1, seconds, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+            if seconds > stats[2]:
+                stats[2] = seconds
+
+
+class _Timer:
+    # a plain class rather than @contextmanager: no generator to create per block
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        _record(self.name, time.perf_counter() - self.start)
+
+
+def timer(name):
+    """Context manager timing a block under name; a shared no-op when metrics are off"""
+    return _Timer(name) if enabled else _NULL_TIMER
+
+
+def timed(name):
+    """Decorator timing every call under name (only a flag check when metrics are off)"""
+    def decorate(fn):
+        # decorators run at import, before any --metrics is parsed, so the flag is read per call
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1):
+    """Add amount to the counter name (nothing but a flag check when metrics are off)"""
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot():
+    """Every timer and counter so far, plus the startup phases, as a JSON-friendly dict"""
+    import startup_profile
+
+    with _lock:
+        timers = {name: {"count": calls, "total_seconds": total, "max_seconds": slowest, "mean_seconds": total / calls}
+                  for name, (calls, total, slowest) in sorted(_timers.items())}
+        counters = dict(sorted(_counters.items()))
+    return {
+        "timestamp": time.time(),
+        "pid": os.getpid(),
+        "timers": timers,
+        "counters": counters,
+        "startup": {
+            "phases": {name: seconds for name, seconds in startup_profile.phases()},
+            "time_to_first_frame": startup_profile.time_to_first_frame(),
+        },
+    }
+
+
+def _label(text):
+    return str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(data=None):
+    """A snapshot in the Prometheus text exposition format"""
+    data = data or snapshot()
+    lines = []
+    for name, stats in data["timers"].items():
+        metric = f"{NAMESPACE}_{name}_seconds"
+        lines += [f"# TYPE {metric} summary", f"{metric}_count {stats['count']}", f"{metric}_sum {stats['total_seconds']!r}",
+                  f"# TYPE {metric}_max gauge", f"{metric}_max {stats['max_seconds']!r}"]
+    for name, value in data["counters"].items():
+        lines += [f"# TYPE {NAMESPACE}_{name}_total counter", f"{NAMESPACE}_{name}_total {value!r}"]
+    startup = data["startup"]
+    if startup["phases"]:
+        lines.append(f"# TYPE {NAMESPACE}_startup_phase_seconds gauge")
+        lines += [f'{NAMESPACE}_startup_phase_seconds{{phase="{_label(name)}"}} {seconds!r}'
+                  for name, seconds in startup["phases"].items()]
+    if startup["time_to_first_frame"] is not None:
+        lines += [f"# TYPE {NAMESPACE}_time_to_first_frame_seconds gauge",
+                  f"{NAMESPACE}_time_to_first_frame_seconds {startup['time_to_first_frame']!r}"]
+    return "\n".join(lines) + "\n"
+
+
+def export(path=None):
+    """Write a snapshot to path (metrics_path by default): JSON for .json, Prometheus text otherwise.
+
+    The file is replaced atomically, so a scraper or the node_exporter textfile
+    collector never reads half of it. Returns the path written, or None.
+    """
+    path = path or metrics_path
+    if not path:
+        return None
+    data = snapshot()
+    text = json.dumps(data, indent=2) if path.lower().endswith(".json") else prometheus_text(data)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".metrics-", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as temp_file:
+            temp_file.write(text)
+        # readable by a scraper running as another user, unlike mkstemp's default
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return path
+
+
+def start_session_profile():
+    """Start cProfile on this thread if a session profile was asked for"""
+    global _profiler
+    if session_profile_path is None or _profiler is not None:
+        return
+    import cProfile
+
+    _profiler = cProfile.Profile()
+    _profiler.enable()
+
+
+def stop_session_profile():
+    """Stop the session profile and dump its stats (read them with python -m pstats)"""
+    global _profiler
+    if _profiler is None:
+        return None
+    _profiler.disable()
+    _profiler.dump_stats(session_profile_path)
+    _profiler = None
+    return session_profile_path
+
+
+def reset():
+    """Forget every timer and counter"""
+    with _lock:
+        _timers.clear()
+        _counters.clear()
@@ -1,10 +1,21 @@
 # initialize the libraries and font
-import customtkinter as ctk
-from PIL import Image
-from CTkToolTip import CTkToolTip
+import instrumentation
+import startup_profile
+from startup_profile import phase
+
+import argparse
 import os
-import platform
-from tkinter import filedialog
+import time
+
+# heavier, rarely used modules (cost engine/numpy, fpdf, tooltips, file dialogs) are imported on first use
+with phase("import customtkinter"):
+    import customtkinter as ctk
+
+with phase("import app modules"):
+    from assets import LOGO_IMAGE, get_background_image, get_resized_image, get_window_scaling
+    from instrumentation import timed, timer
+    from settings import MATERIAL_DENSITIES, get_default_settings_path, get_material_density, get_settings_store
+    from workers import TaskRunner
 
 def register_custom_font():
     try:
@@ -18,39 +29,15 @@ def register_custom_font():
     except Exception as e:
         print("Font load error:", e)
 
-register_custom_font()
-
-def get_default_settings_path():
-    """Get platform-specific default settings path"""
-    system = platform.system()
-    
-    if system == "Windows":
-        # Windows: LOCALAPPDATA\PlasticTax\settings.csv
-        localappdata = os.environ.get('LOCALAPPDATA', os.path.expanduser('~\\AppData\\Local'))
-        settings_dir = os.path.join(localappdata, 'PlasticTax')
-    elif system == "Darwin":  # macOS
-        # macOS: ~/Library/Application Support/PlasticTax/settings.csv
-        settings_dir = os.path.expanduser('~/Library/Application Support/PlasticTax')
-    else:
-        # Fallback for other systems (including Linux)
-        settings_dir = os.path.expanduser('~/.plastictax')
-    
-    # Create directory if it doesn't exist
-    os.makedirs(settings_dir, exist_ok=True)
-    return os.path.join(settings_dir, 'settings.csv')
-
 def create_default_settings():
     """Create default settings file if it doesn't exist"""
-    settings_path = get_default_settings_path()
-    
-    if not os.path.exists(settings_path):
-        try:
-            with open(settings_path, 'w') as f:
-                f.write("default_filament_cost,default_electricity_cost,default_printer_power,appearance_mode,color_theme,pdf_export_directory\n")
-                f.write("25.00,12.0,300.0,Dark,Blue,\n")  # Default values
-            print(f"Created default settings file at: {settings_path}")
-        except Exception as e:
-            print(f"Failed to create settings file: {e}")
+    settings_store = get_settings_store()
+
+    try:
+        if settings_store.ensure_exists():
+            print(f"Created default settings file at: {settings_store.path}")
+    except Exception as e:
+        print(f"Failed to create settings file: {e}")
 
 def get_settings_file_path():
     """Get the path for the settings file"""
@@ -64,9 +51,6 @@ def get_pdf_export_path():
     else:
         return os.getcwd()  # Current directory as default
 
-# Initialize settings on startup
-create_default_settings()
-
 
 def show_error_popup(title, message):
     popup = ctk.CTkToplevel()
@@ -77,32 +61,36 @@ def show_error_popup(title, message):
     button = ctk.CTkButton(popup, text="OK", command=popup.destroy)
     button.pack(pady=10)
 
+@timed("settings_popup")
 def show_settings_popup():
     popup = ctk.CTkToplevel()
     popup.title("Settings")
     popup.geometry("500x550")
 
-    if get_ctk_appearance_mode(read_default_value("appearance_mode")) == "dark":
-        # Load the image
-        bg_image = ctk.CTkImage(Image.open("src/img/hexagons.png"), size=(600, 600))
-
-        # Create a label with the image
-        bg_label = ctk.CTkLabel(popup, image=bg_image, text="")
-        bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-    else:
-        bg_image = ctk.CTkImage(Image.open("src/img/light_hexagons.png"), size=(600, 600))
-        bg_label = ctk.CTkLabel(popup, image=bg_image, text="")
-        bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+    # Reuse the cached background image instead of decoding it again
+    with timer("settings_popup_background"):
+        bg_image = get_background_image(get_ctk_appearance_mode(read_default_value("appearance_mode")),
+                                        scaling=get_window_scaling(popup))
+    bg_label = ctk.CTkLabel(popup, image=bg_image, text="")
+    bg_label.place(x=0, y=0, relwidth=1, relheight=1)
 
     settingsLabel = ctk.CTkLabel(popup, text="Settings", font=("poppins", 20))
     settingsLabel.place(relx=0.5, rely=0.08, anchor="center")
     
     # Default values section
-    defaultFilamentCostInput = ctk.CTkEntry(popup, placeholder_text="Default Filament Cost per kg (dollars)", width=350)
-    defaultFilamentCostInput.place(relx=0.5, rely=0.18, anchor="center")
+    defaultFilamentCostInput = ctk.CTkEntry(popup, placeholder_text="Default Filament Cost per kg (dollars)", width=250)
+    defaultFilamentCostInput.place(relx=0.4, rely=0.18, anchor="center")
 
-    defaultElectricityCostInput = ctk.CTkEntry(popup, placeholder_text="Default Electricity Cost per kWh (cents)", width=350)
-    defaultElectricityCostInput.place(relx=0.5, rely=0.28, anchor="center")
+    # material whose density preset turns imported model volumes into grams
+    materialDropdown = ctk.CTkOptionMenu(popup, values=list(MATERIAL_DENSITIES), width=90)
+    materialDropdown.place(relx=0.8, rely=0.18, anchor="center")
+
+    defaultElectricityCostInput = ctk.CTkEntry(popup, placeholder_text="Default Electricity Cost per kWh (cents)", width=250)
+    defaultElectricityCostInput.place(relx=0.4, rely=0.28, anchor="center")
+
+    # time-of-use schedules from tariffs.json; "Flat rate" uses the electricity cost above
+    tariffDropdown = ctk.CTkOptionMenu(popup, values=[FLAT_RATE] + list_tariff_names(), width=90)
+    tariffDropdown.place(relx=0.8, rely=0.28, anchor="center")
 
     defaultPrinterPowerInput = ctk.CTkEntry(popup, placeholder_text="Default Printer Power Rating (watts)", width=350)
     defaultPrinterPowerInput.place(relx=0.5, rely=0.38, anchor="center")
@@ -132,7 +120,7 @@ def show_settings_popup():
     button = ctk.CTkButton(popup, text="Save Settings", command=lambda: close_and_save_settings(
         popup, defaultFilamentCostInput.get(), defaultElectricityCostInput.get(), 
         defaultPrinterPowerInput.get(), appearanceModeDropdown.get(), colorThemeDropdown.get(),
-        getattr(pdfDirButton, 'selected_path', current_pdf_dir)
+        getattr(pdfDirButton, 'selected_path', current_pdf_dir), materialDropdown.get(), tariffDropdown.get()
     ))
     button.place(relx=0.5, rely=0.88, anchor="center")
 
@@ -157,55 +145,80 @@ def show_settings_popup():
     # Load appearance mode and color theme from settings
     appearanceModeDropdown.set(appearanceMode)
     colorThemeDropdown.set(colorTheme)
+    materialDropdown.set(read_default_value("default_material") or "PLA")
+    tariffDropdown.set(read_default_value("electricity_tariff") or FLAT_RATE)
+
+def list_tariff_names():
+    from tariffs import get_tariff_store
+
+    try:
+        return get_tariff_store().names()
+    except (OSError, ValueError) as e:
+        show_error_popup("Tariff Error", f"Could not read the tariffs file: {str(e)}")
+        return []
 
 def choose_pdf_directory(button):
     """Let user choose directory for PDF exports"""
+    from tkinter import filedialog
+
     directory = filedialog.askdirectory(title="Choose PDF Export Directory")
     if directory:
         button.selected_path = directory
         button.configure(text=f"Choose Directory ({os.path.basename(directory)})")
 
-def close_and_save_settings(popup, defaultFilamentCost, defaultElectricityCost, defaultPrinterPower, appearanceMode, colorTheme, pdfDir):
+def close_and_save_settings(popup, defaultFilamentCost, defaultElectricityCost, defaultPrinterPower, appearanceMode, colorTheme, pdfDir, material, tariff):
     popup.destroy()
     try:
-        # Use the platform-specific settings path
-        settings_file_path = get_default_settings_path()
-        
-        # Write new settings, completely overwriting the file
-        with open(settings_file_path, "w") as settings_file:
-            settings_file.write("default_filament_cost,default_electricity_cost,default_printer_power,appearance_mode,color_theme,pdf_export_directory\n")
-            settings_file.write(f"{defaultFilamentCost},{defaultElectricityCost},{defaultPrinterPower},{appearanceMode},{colorTheme},{pdfDir}\n")
+        # Atomically replace the platform-specific settings file
+        get_settings_store().save({
+            "default_filament_cost": defaultFilamentCost,
+            "default_electricity_cost": defaultElectricityCost,
+            "default_printer_power": defaultPrinterPower,
+            "appearance_mode": appearanceMode,
+            "color_theme": colorTheme,
+            "pdf_export_directory": pdfDir,
+            "default_material": material,
+            "electricity_tariff": "" if tariff == FLAT_RATE else tariff,
+        })
 
         show_error_popup("Settings Saved", "Your settings have been saved successfully. Restart the app to apply any theme changes.")
     except Exception as e:
         show_error_popup("Settings Error", f"An error occurred while saving settings: {str(e)}")
 
+# names the GUI asks for, mapped to their settings.csv columns
+DEFAULT_VALUE_KEYS = {
+    "filament_cost": "default_filament_cost",
+    "electricity_cost": "default_electricity_cost",
+    "printer_power": "default_printer_power",
+    "appearance_mode": "appearance_mode",
+    "color_theme": "color_theme",
+    "pdf_export_directory": "pdf_export_directory",
+    "default_material": "default_material",
+    "electricity_tariff": "electricity_tariff",
+    "default_printer": "default_printer",
+}
+
+# tariff dropdown entry for the single electricity cost per kWh
+FLAT_RATE = "Flat rate"
+
+# printer dropdown entry for the single power rating entry
+CUSTOM_PRINTER = "Custom"
+
+@timed("settings_read")
 def read_default_value(value):
-    # Use the platform-specific settings path
-    settings_file_path = get_default_settings_path()
-    
-    try:
-        with open(settings_file_path, "r") as settings_file:
-            lines = settings_file.readlines()
-            if len(lines) > 1:
-                default_values = lines[1].strip().split(",")
-                
-                if value == "filament_cost" and len(default_values) > 0:
-                    return str(round(float(default_values[0]), 2))
-                elif value == "electricity_cost" and len(default_values) > 1:
-                    return str(round(float(default_values[1]), 2))
-                elif value == "printer_power" and len(default_values) > 2:
-                    return str(round(float(default_values[2]), 2))
-                elif value == "appearance_mode" and len(default_values) > 3:
-                    return default_values[3]
-                elif value == "color_theme" and len(default_values) > 4:
-                    return default_values[4]
-                elif value == "pdf_export_directory" and len(default_values) > 5:
-                    return default_values[5]
-    except FileNotFoundError:
+    # Served from the cached settings store, which only re-reads the file when it changes
+    settings_store = get_settings_store()
+    setting = settings_store.get(DEFAULT_VALUE_KEYS[value])
+
+    if not settings_store.exists:
         if value not in ["pdf_export_directory"]:
             show_error_popup("Settings Error", "Settings file not found. Please set your defaults in the settings menu.")
-    return ""
+        return ""
+    if setting is None:
+        return ""
+    if isinstance(setting, float):
+        return str(round(setting, 2))
+    return setting
 
 def get_ctk_theme_name(theme_display_name):
     """Convert display theme name to CustomTkinter theme name"""
@@ -230,226 +243,699 @@ def load_default_value(entry_widget, value_type):
         entry_widget.insert(0, default_value)  # Insert default value
 
 
-def calculate_cost(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating):
-    # ensure inputs are valid
-    try:
-        # input validation
-        float(filament_cost_per_kg)
-        float(print_weight)
-        float(estimated_print_time)
-        float(electricity_cost_per_kwh)
-        float(printer_power_rating)
-
-        # convert inputs
-        print_weight = float(print_weight) / 1000  # convert grams to kg
-        printer_power_rating = float(printer_power_rating) / 1000  # convert watts to kW
-        electricity_cost_per_kwh_dollars = float(electricity_cost_per_kwh) / 100  # convert cents to dollars
+@timed("calculate_cost")
+def calculate_cost(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating, start_time=""):
+    global last_result
+    from printers import cost_job
 
-        # calculate the cost
-        filament_cost = float(filament_cost_per_kg) * print_weight
-        electricity_cost = electricity_cost_per_kwh_dollars * printer_power_rating * float(estimated_print_time)
+    try:
+        tariff = get_active_tariff()
+        printer = get_selected_printer()
+    except (OSError, ValueError) as e:
+        show_error_popup("Settings Error", str(e))
+        return None, None, None
 
-        total_cost = filament_cost + electricity_cost
+    # ensure inputs are valid
+    try:
+        # on a tariff the rate is averaged over the bands each phase of the print actually runs through
+        start = read_print_start(start_time) if tariff is not None else None
+        # remember the numbers (not the label text) for the PDF report
+        last_result = cost_job(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh,
+                               printer_power_rating, printer, tariff, start)
+        filament_cost, electricity_cost, total_cost = (last_result["filament_cost"], last_result["electricity_cost"],
+                                                       last_result["total_cost"])
 
         # update the labels with results
         filament_cost_label.configure(text=f"Filament Cost: ${filament_cost:.2f}")
         electricity_cost_label.configure(text=f"Electricity Cost: ${electricity_cost:.2f}")
         total_cost_label.configure(text=f"Total Cost: ${total_cost:.2f}")
+        # an earlier risk analysis was for different inputs
+        risk_label.configure(text="")
+
+        record_job_history(last_result, printer.name if printer is not None else "")
+
+        return filament_cost, electricity_cost, total_cost
 
     except ValueError:
         show_error_popup("Invalid Input", "Please enter valid numeric values.")
         return None, None, None
 
-def generate_pdf(filament_cost_entry, print_weight_entry, estimated_print_time_entry, electricity_cost_entry, printer_power_rating_entry):
-    filament_cost_per_kg = filament_cost_entry.get()
-    print_weight = print_weight_entry.get()
-    estimated_print_time = estimated_print_time_entry.get()
-    electricity_cost_per_kwh = electricity_cost_entry.get()
-    printer_power_rating = printer_power_rating_entry.get()
+def get_selected_printer():
+    """The printer profile picked in the main window, or None for the power rating entry"""
+    from printers import get_printer_registry
+
+    name = printer_dropdown.get() if printer_dropdown is not None else CUSTOM_PRINTER
+    return None if name == CUSTOM_PRINTER else get_printer_registry().get(name)
+
+def load_printer_profiles():
+    """Fill the printer dropdown from printers.csv and restore the last printer picked"""
+    from printers import get_printer_registry
+
+    try:
+        names = get_printer_registry().names()
+    except (OSError, ValueError) as e:
+        print(f"Could not load printer profiles: {e}")
+        names = []
+    printer_dropdown.configure(values=[CUSTOM_PRINTER] + names)
+    saved = read_default_value("default_printer")
+    printer_dropdown.set(saved if saved in names else CUSTOM_PRINTER)
+    show_printer_power()
+
+def select_printer(name):
+    try:
+        get_settings_store().save({"default_printer": "" if name == CUSTOM_PRINTER else name})
+    except Exception as e:
+        show_error_popup("Settings Error", f"An error occurred while saving settings: {str(e)}")
+    show_printer_power()
+
+def show_printer_power():
+    """A profile supplies the power itself, so its steady wattage is shown but can't be edited"""
+    try:
+        printer = get_selected_printer()
+    except (OSError, ValueError):
+        printer = None
+    if printer is None:
+        printer_power_rating.configure(state="normal")
+        power_load_defaults_btn.configure(state="normal")
+        return
+    printer_power_rating.configure(state="normal")
+    set_entry_value(printer_power_rating, f"{printer.steady_watts:g}")
+    printer_power_rating.configure(state="disabled")
+    power_load_defaults_btn.configure(state="disabled")
+
+def get_active_tariff():
+    """The time-of-use tariff chosen in settings, or None for the flat rate"""
+    from tariffs import get_tariff_store
+
+    return get_tariff_store().get(read_default_value("electricity_tariff"))
+
+def read_print_start(text):
+    """Unix time for the start entry: blank for now, HH:MM for its next occurrence, or YYYY-MM-DD HH:MM"""
+    import datetime
+
+    text = text.strip()
+    if not text:
+        return time.time()
+    if len(text) <= 5:
+        clock = datetime.datetime.strptime(text, "%H:%M").time()
+        start = datetime.datetime.combine(datetime.date.today(), clock)
+        if start < datetime.datetime.now():
+            start += datetime.timedelta(days=1)
+        return start.timestamp()
+    from tariffs import parse_start_time
+
+    return parse_start_time(text)
+
+def show_cheapest_start():
+    from printers import cheapest_phase_start, constant_power_phases, job_seconds, phase_tariff_cost
+    from tariffs import DEFAULT_SEARCH_HOURS
+
+    try:
+        tariff = get_active_tariff()
+        printer = get_selected_printer()
+    except (OSError, ValueError) as e:
+        show_error_popup("Settings Error", str(e))
+        return
+    if tariff is None:
+        show_error_popup("No Tariff", "Choose a time-of-use tariff in Settings to search for a cheaper start time.")
+        return
+    try:
+        hours = float(estimated_print_time.get())
+        phases = printer.phases if printer is not None else constant_power_phases(float(printer_power_rating.get()))
+        start = read_print_start(print_start_time.get())
+    except ValueError:
+        show_error_popup("Invalid Input", "Please enter the print time, printer power and a valid start time.")
+        return
+
+    # any start in the next day, as long as the print (warm-up and idle included) can finish
+    window_end = start + DEFAULT_SEARCH_HOURS * 3600 + job_seconds(hours, phases)
+    try:
+        best, best_cost = cheapest_phase_start(tariff, hours, phases, start, window_end)
+        cost = float(phase_tariff_cost(tariff, start, hours, phases))
+    except ValueError as e:
+        show_error_popup("Invalid Input", str(e))
+        return
+    set_entry_value(print_start_time, time.strftime("%Y-%m-%d %H:%M", time.localtime(best)))
+    show_error_popup("Cheapest Start", f"Starting at {time.strftime('%a %H:%M', time.localtime(best))} costs "
+                     f"${best_cost:.2f} in electricity, against ${cost:.2f} at {time.strftime('%a %H:%M', time.localtime(start))}.")
+
+def record_job_history(job, printer=""):
+    """Add a costed job to the history database, off the UI thread"""
+    material = read_default_value("default_material") or ""
 
-    filament_cost = filament_cost_label.cget("text")
-    electricity_cost = electricity_cost_label.cget("text")
-    total_cost = total_cost_label.cget("text")
+    def record(task, job):
+        from history import get_history_store
+
+        return get_history_store().record_job(job, printer=printer, material=material)
+
+    # bookkeeping: no progress bar, and Cancel or closing the window doesn't drop it
+    task_runner.submit(
+        record, dict(job),
+        description="History",
+        on_error=lambda error: print(f"Could not record job history: {error}"),
+        background=True
+    )
+
+def show_history_popup():
+    from tkinter import ttk
+    from history import get_history_store, page_cursor, quarter_range
+
+    store = get_history_store()
+    popup = ctk.CTkToplevel()
+    popup.title("Job History")
+    popup.geometry("700x480")
+
+    historyLabel = ctk.CTkLabel(popup, text="Job History", font=("poppins", 20))
+    historyLabel.pack(pady=(10, 0))
+
+    # spend per printer this quarter comes from the monthly/daily rollups, not the jobs
+    quarter_start, quarter_end = quarter_range()
+    spend = store.spend("printer", quarter_start, quarter_end)
+    summary = ", ".join(f"{row['printer'] or 'Unassigned'}: ${row['total_cost']:.2f}" for row in spend)
+    summaryLabel = ctk.CTkLabel(popup, text=f"This quarter: {summary or 'no jobs yet'}", wraplength=660)
+    summaryLabel.pack(pady=5)
+
+    columns = ("date", "printer", "material", "weight", "time", "total")
+    headings = ("Date", "Printer", "Material", "Weight (g)", "Time (h)", "Total ($)")
+    table = ttk.Treeview(popup, columns=columns, show="headings", height=14)
+    for column, heading in zip(columns, headings):
+        table.heading(column, text=heading)
+        table.column(column, width=150 if column == "date" else 100, anchor="w" if column == "date" else "e")
+    table.pack(fill="both", expand=True, padx=10)
+
+    # keyset paging: every page starts from the first or last job shown, never from an offset
+    shown = []
+
+    def show_page(jobs):
+        if not jobs:
+            return
+        shown[:] = jobs
+        table.delete(*table.get_children())
+        for job in jobs:
+            table.insert("", "end", values=(
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(job["created_at"])), job["printer"], job["material"],
+                f"{job['print_weight']:.2f}", f"{job['estimated_print_time']:.2f}", f"{job['total_cost']:.2f}"))
+
+    buttons = ctk.CTkFrame(popup, fg_color="transparent")
+    buttons.pack(pady=10)
+    newerButton = ctk.CTkButton(buttons, text="Newer", width=100,
+                                command=lambda: shown and show_page(store.newer_page(page_cursor(shown[0]))))
+    newerButton.pack(side="left", padx=10)
+    olderButton = ctk.CTkButton(buttons, text="Older", width=100,
+                                command=lambda: shown and show_page(store.page(page_cursor(shown[-1]))))
+    olderButton.pack(side="left", padx=10)
+
+    show_page(store.page())
+
+# how far either side of the calculated value each risk range starts out, in percent
+RISK_DEFAULT_SPREAD = {
+    "print_weight": 10,
+    "estimated_print_time": 15,
+    "filament_cost_per_kg": 10,
+    "electricity_cost_per_kwh": 10,
+}
+
+def show_risk_popup():
+    if last_result is None:
+        show_error_popup("No Results", "Please calculate the costs before running a risk analysis.")
+        return
+    from risk import DISTRIBUTION_KINDS, RISK_FIELDS, RISK_LABELS
+
+    popup = ctk.CTkToplevel()
+    popup.title("Risk Analysis")
+    popup.geometry("520x560")
+
+    riskLabel = ctk.CTkLabel(popup, text="Risk Analysis", font=("poppins", 20))
+    riskLabel.pack(pady=(10, 5))
+    helpLabel = ctk.CTkLabel(popup, text="Lowest and highest likely value of each input; the calculated value is the most likely.",
+                             wraplength=480)
+    helpLabel.pack()
+
+    # one row of low/high entries per uncertain input, starting from the last calculation
+    form = ctk.CTkFrame(popup, fg_color="transparent")
+    form.pack(pady=5)
+    range_entries = {}
+    for row, field in enumerate(RISK_FIELDS):
+        value = last_result[field]
+        ctk.CTkLabel(form, text=RISK_LABELS[field], width=120, anchor="w").grid(row=row, column=0, padx=5, pady=3)
+        low_entry = ctk.CTkEntry(form, width=90)
+        low_entry.grid(row=row, column=1, padx=5, pady=3)
+        high_entry = ctk.CTkEntry(form, width=90)
+        high_entry.grid(row=row, column=2, padx=5, pady=3)
+        low_entry.insert(0, f"{value * (1 - RISK_DEFAULT_SPREAD[field] / 100):.4g}")
+        high_entry.insert(0, f"{value * (1 + RISK_DEFAULT_SPREAD[field] / 100):.4g}")
+        range_entries[field] = (low_entry, high_entry)
+
+    kindDropdown = ctk.CTkOptionMenu(form, values=[kind.capitalize() for kind in DISTRIBUTION_KINDS], width=120)
+    kindDropdown.grid(row=len(RISK_FIELDS), column=0, padx=5, pady=8)
+    runButton = ctk.CTkButton(form, text="Run", width=190,
+                              command=lambda: run_risk_analysis(range_entries, kindDropdown.get().lower(), summaryLabel, tornadoCanvas))
+    runButton.grid(row=len(RISK_FIELDS), column=1, columnspan=2, padx=5, pady=8)
+
+    summaryLabel = ctk.CTkLabel(popup, text="", wraplength=480)
+    summaryLabel.pack(pady=5)
+    tornadoCanvas = ctk.CTkCanvas(popup, width=480, height=200, highlightthickness=0)
+    tornadoCanvas.pack(pady=5)
+
+def run_risk_analysis(range_entries, kind, summary_label, tornado_canvas):
+    """Sample the cost off the UI thread and show the result in the popup and main window"""
+    from printers import constant_power_phases
+    from risk import make_distribution, simulate
+
+    try:
+        distributions = {}
+        for field, (low_entry, high_entry) in range_entries.items():
+            distributions[field] = make_distribution(kind, float(low_entry.get()), last_result[field], float(high_entry.get()))
+    except ValueError as e:
+        show_error_popup("Invalid Input", f"Each range needs numbers around the calculated value ({str(e)}).")
+        return
+    try:
+        printer = get_selected_printer()
+    except (OSError, ValueError) as e:
+        show_error_popup("Settings Error", str(e))
+        return
+    phases = printer.phases if printer is not None else constant_power_phases(last_result["printer_power_rating"])
+
+    def show(result):
+        percentiles = result["percentiles"]
+        text = f"Risk: P50 ${percentiles['p50']:.2f}, P90 ${percentiles['p90']:.2f}, P99 ${percentiles['p99']:.2f}"
+        risk_label.configure(text=text)
+        summary_label.configure(text=f"{text} ({result['samples']:,} samples in {result['seconds']:.2f} s)")
+        draw_tornado(tornado_canvas, result)
+
+    task_runner.submit(
+        lambda task, distributions, phases: simulate(distributions, phases=phases), distributions, phases,
+        description="Risk analysis",
+        on_success=show,
+        on_error=lambda error: show_error_popup("Risk Analysis Error", str(error))
+    )
+
+def draw_tornado(canvas, result):
+    """Horizontal bars of each input's cost swing, widest on top, around the point estimate"""
+    from risk import RISK_LABELS
+
+    canvas.delete("all")
+    bars = result["tornado"]
+    low = min(bar["low_cost"] for bar in bars)
+    high = max(bar["high_cost"] for bar in bars)
+    left, right, row_height = 130, 360, 40
+    scale = (right - left) / ((high - low) or 1)
+
+    def x(cost):
+        return left + (cost - low) * scale
+
+    for row, bar in enumerate(bars):
+        top = 10 + row * row_height
+        canvas.create_text(left - 8, top + 12, text=RISK_LABELS[bar["field"]], anchor="e")
+        canvas.create_rectangle(x(bar["low_cost"]), top, max(x(bar["high_cost"]), x(bar["low_cost"]) + 1), top + 24,
+                                fill="#3B8ED0", outline="")
+        canvas.create_text(x(bar["high_cost"]) + 4, top + 12, text=f"${bar['low_cost']:.2f}-${bar['high_cost']:.2f}", anchor="w")
+    canvas.create_line(x(result["point"]), 4, x(result["point"]), 10 + len(bars) * row_height, dash=(3, 3))
+
+def show_pdf_export_error(error):
+    if isinstance(error, ImportError):
+        show_error_popup("PDF Export Error", "The fpdf library is not installed. Please install it using 'pip install fpdf' to enable PDF report generation.")
+    else:
+        show_error_popup("PDF Export Error", f"An error occurred while generating the PDF report: {str(error)}")
 
-    if filament_cost == "hit calculate to see result!" or electricity_cost == "hit calculate to see result!" or total_cost == "hit calculate to see result!":
+@timed("pdf_export_request")
+def generate_pdf():
+    if last_result is None:
         show_error_popup("No Results", "Please calculate the costs before exporting a PDF report.")
         return
+
+    # Save the PDF to the user-selected directory under a name no earlier report has used;
+    # the document itself is built off the UI thread from the last calculated values
+    from reports import discard_report_path, reserve_report_path, write_job_report
+
     try:
-        from fpdf import FPDF
+        pdf_output_path = reserve_report_path(get_pdf_export_path())
+    except OSError as e:
+        show_pdf_export_error(e)
+        return
 
-        pdf = FPDF()
-        pdf.add_page()
+    def export(task, job, path):
+        write_job_report(job, path)
+        # rendering can't be interrupted, so a Cancel pressed meanwhile takes effect here
+        task.check_cancelled()
+        return path
+
+    task = task_runner.submit(
+        export, dict(last_result), pdf_output_path,
+        description="PDF export",
+        on_success=lambda path: show_error_popup("PDF Exported", f"PDF report has been generated and saved to {path}"),
+        on_error=show_pdf_export_error
+    )
+
+    def discard_unfinished(future):
+        # runs even when Cancel or closing the window drops the export before it starts
+        if future.cancelled() or task.cancelled or future.exception() is not None:
+            discard_report_path(pdf_output_path)
+
+    task.future.add_done_callback(discard_unfinished)
+
+def set_entry_value(entry_widget, value):
+    entry_widget.delete(0, 'end')
+    entry_widget.insert(0, value)
+
+def fill_from_import(result):
+    """Put the weight (and time, for G-code) read from an imported file into their entries"""
+    set_entry_value(print_weight, f"{result['weight_g']:.2f}")
+    if result.get("print_time_h") is not None:
+        set_entry_value(estimated_print_time, f"{result['print_time_h']:.2f}")
+
+def import_print_file():
+    from tkinter import filedialog
+
+    path = filedialog.askopenfilename(
+        title="Import G-code or Model",
+        filetypes=[("G-code or model", "*.gcode *.gco *.g *.stl *.3mf"), ("G-code", "*.gcode *.gco *.g"),
+                   ("3D model", "*.stl *.3mf"), ("All files", "*.*")]
+    )
+    if not path:
+        return
+
+    # unsliced models only give a weight, estimated from their volume and the default material
+    material = read_default_value("default_material") or "PLA"
+    density = get_material_density(material)
+    if density is None:
+        show_error_popup("Import Error", f"Unknown material '{material}' in settings.")
+        return
 
-        # Set title
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(0, 10, "PlasticTax Cost Report", ln=True, align='C')
+    def analyze(task, path):
+        from metrics_cache import extract_job_metrics
+
+        def progress(done, total):
+            task.report_progress(done / max(total, 1))
+            task.check_cancelled()
+
+        # files seen before come straight from the metrics cache without being parsed again
+        return extract_job_metrics(path, density=density, progress=progress)
+
+    # large files can take a while, so read them off the UI thread
+    task_runner.submit(
+        analyze, path,
+        description="File import",
+        on_success=fill_from_import,
+        on_error=lambda error: show_error_popup("Import Error", f"Could not read {path}: {str(error)}")
+    )
+
+def update_task_progress(tasks):
+    """Show the progress bar and Cancel button while background tasks are running"""
+    if not tasks:
+        task_progress_bar.stop()
+        task_progress_bar.place_forget()
+        cancel_tasks_button.place_forget()
+        return
+
+    progress = [task.progress for task in tasks if task.progress is not None]
+    if progress:
+        task_progress_bar.stop()
+        task_progress_bar.configure(mode="determinate")
+        task_progress_bar.set(sum(progress) / len(tasks))
+    elif task_progress_bar.cget("mode") != "indeterminate":
+        task_progress_bar.configure(mode="indeterminate")
+        task_progress_bar.start()
+    task_progress_bar.place(relx=0.5, rely=0.035, anchor="center")
+    cancel_tasks_button.place(relx=0.72, rely=0.035, anchor="center")
+
+# main window widgets, created by build_main_window
+root = None
+filament_cost_per_kg = print_weight = estimated_print_time = electricity_cost_per_kwh = printer_power_rating = print_start_time = None
+filament_cost_label = electricity_cost_label = total_cost_label = risk_label = None
+task_progress_bar = cancel_tasks_button = None
+printer_dropdown = power_load_defaults_btn = None
+
+# inputs and costs of the last successful calculation, used for the PDF report
+last_result = None
+
+# runs PDF export and other slow work off the UI thread, created by build_main_window
+task_runner = None
+
+# (widget, message) pairs whose tooltips are created after the first frame
+pending_tooltips = []
+
+
+def build_main_window():
+    """Create the main window and every widget needed for the first frame.
+
+    Tooltips are only queued in pending_tooltips; attach_tooltips creates them once
+    the window is on screen.
+    """
+    global root, filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating, print_start_time
+    global filament_cost_label, electricity_cost_label, total_cost_label, risk_label
+    global task_progress_bar, cancel_tasks_button, task_runner, printer_dropdown, power_load_defaults_btn
+
+    with phase("root window and theme"):
+        root = ctk.CTk()
+        root.title("PlasticTax")
+        root.geometry("600x600")
+        root.resizable(False, False)
+
+        ctk.set_appearance_mode(get_ctk_appearance_mode(read_default_value("appearance_mode")))  # Load appearance mode from settings
+        ctk.set_default_color_theme(get_ctk_theme_name(read_default_value("color_theme")))  # Load color theme from settings
+
+    with phase("background image"):
+        # Load the background image
+        bg_image = get_background_image(get_ctk_appearance_mode(read_default_value("appearance_mode")),
+                                        scaling=get_window_scaling(root))
 
-        # Add some space
-        pdf.ln(20)
+        # Create a label with the image
+        bg_label = ctk.CTkLabel(root, image=bg_image, text="")
+        bg_label.place(x=0, y=0, relwidth=1, relheight=1)
 
-        # Set font for content
-        pdf.set_font("Arial", size=12)
+    with phase("app icon"):
+        # app icon
+        try:
+            from PIL import ImageTk
 
-        # show calculation for filament cost
-        pdf.cell(0, 10, f"Filament Cost per kg: ${filament_cost_per_kg}", ln=True)
-        pdf.cell(0, 10, f"Weight of Print: {print_weight} grams", ln=True)
-        pdf.cell(0, 10, f"{print_weight} grams = {float(print_weight) / 1000:.2f} kg", ln=True)
-        pdf.cell(0, 10, f"{filament_cost_per_kg} * {float(print_weight) / 1000:.2f} kg = {filament_cost}", ln=True)
+            icon_pil = get_resized_image(LOGO_IMAGE, (128, 128))
+            icon_tk = ImageTk.PhotoImage(icon_pil)
+            root.iconphoto(True, icon_tk)
+            root.icon_tk = icon_tk  # keep a reference so Tk doesn't lose the image
+        except Exception as e:
+            print(f"Could not set app icon: {e}")
+            # App will continue without icon if there's an issue
 
-        pdf.ln(10)
+    with phase("main window widgets"):
+        title = ctk.CTkLabel(root, text="PlasticTax", font=("poppins", 40), bg_color="transparent")
+        title.place(relx=0.5, rely=0.1, anchor="center")
 
-        # show calculation for electricity cost
-        pdf.cell(0, 10, f"Estimated Print Time: {estimated_print_time} hours", ln=True)
-        pdf.cell(0, 10, f"Electricity Cost per kWh: ${float(electricity_cost_per_kwh) / 100:.2f}", ln=True)
-        pdf.cell(0, 10, f"Printer Power Rating: {printer_power_rating} watts", ln=True)
-        pdf.cell(0, 10, f"{printer_power_rating} watts = {float(printer_power_rating) / 1000:.2f} kW", ln=True)
-        pdf.cell(0, 10, f"{float(electricity_cost_per_kwh) / 100:.2f} * {float(printer_power_rating) / 1000:.2f} kW * {estimated_print_time} hours = {electricity_cost}", ln=True)
+        # input fields
+        filament_cost_per_kg = ctk.CTkEntry(root, placeholder_text="Filament Cost per kg (dollars)", width=300)
+        filament_cost_per_kg.place(relx=0.4, rely=0.2, anchor="center")
 
-        # draw a line here
-        pdf.line(10, pdf.get_y() + 5, 200, pdf.get_y() + 5)
-        pdf.ln(10)
+        filament_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
+                                         font=("Arial", 12, "bold"), command=lambda: None)
+        filament_help_btn.place(relx=0.7, rely=0.2, anchor="center")
 
-        # show total cost
-        pdf.cell(0, 10, f"Total Cost =  {filament_cost} + {electricity_cost} = {total_cost}", ln=True)
+        pending_tooltips.append((filament_help_btn, "Enter the cost of your filament per kilogram in dollars (e.g., 25.00)"))
+        filament_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(filament_cost_per_kg, "filament_cost"))
 
-        # Save the PDF to the user-selected directory
-        pdf_dir = get_pdf_export_path()
-        pdf_output_path = os.path.join(pdf_dir, "plastic_tax_report.pdf")
-        pdf.output(pdf_output_path)
+        filament_load_defaults_btn.place(relx=0.85, rely=0.2, anchor="center")
+        pending_tooltips.append((filament_load_defaults_btn, "Load default filament cost from settings"))
 
-        show_error_popup("PDF Exported", f"PDF report has been generated and saved to {pdf_output_path}")
-    except ImportError:
-        show_error_popup("PDF Export Error", "The fpdf library is not installed. Please install it using 'pip install fpdf' to enable PDF report generation.")
+        # -------------------------------------------------------------------
 
-root = ctk.CTk()
-root.title("PlasticTax")
-root.geometry("600x600")
-root.resizable(False, False)
+        print_weight = ctk.CTkEntry(root, placeholder_text="Weight of Print (grams)", width=300)
+        print_weight.place(relx=0.4, rely=0.3, anchor="center")
 
-ctk.set_appearance_mode(get_ctk_appearance_mode(read_default_value("appearance_mode")))  # Load appearance mode from settings
-ctk.set_default_color_theme(get_ctk_theme_name(read_default_value("color_theme")))  # Load color theme from settings
+        weight_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
+                                       font=("Arial", 12, "bold"), command=lambda: None)
+        weight_help_btn.place(relx=0.7, rely=0.3, anchor="center")
+        pending_tooltips.append((weight_help_btn, "Enter the weight of your 3D print in grams (usually shown in your slicer)"))
 
-if get_ctk_appearance_mode(read_default_value("appearance_mode")) == "dark":
-    # Load the image
-    bg_image = ctk.CTkImage(Image.open("src/img/hexagons.png"), size=(600, 600))
+        # -------------------------------------------------------------------
 
-    # Create a label with the image
-    bg_label = ctk.CTkLabel(root, image=bg_image, text="")
-    bg_label.place(x=0, y=0, relwidth=1, relheight=1)
-else:
-    bg_image = ctk.CTkImage(Image.open("src/img/light_hexagons.png"), size=(600, 600))
-    bg_label = ctk.CTkLabel(root, image=bg_image, text="")
-    bg_label.place(x=0, y=0, relwidth=1, relheight=1)
+        estimated_print_time = ctk.CTkEntry(root, placeholder_text="Estimated Print Time (hours)", width=300)
+        estimated_print_time.place(relx=0.4, rely=0.4, anchor="center")
 
-# app icon
-try:
-    import tkinter as tk
-    from PIL import ImageTk
-    
-    icon_pil = Image.open("src/img/PlasticTax Logo.png")
-    icon_pil = icon_pil.resize((128, 128), Image.Resampling.LANCZOS)
-    icon_tk = ImageTk.PhotoImage(icon_pil)
-    root.iconphoto(True, icon_tk)
-except Exception as e:
-    print(f"Could not set app icon: {e}")
-    # App will continue without icon if there's an issue
+        time_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
+                                     font=("Arial", 12, "bold"), command=lambda: None)
+        time_help_btn.place(relx=0.7, rely=0.4, anchor="center")
+        pending_tooltips.append((time_help_btn, "Enter the estimated print time in hours (e.g., 2.5 for 2 hours 30 minutes)"))
 
+        # -------------------------------------------------------------------
 
-title = ctk.CTkLabel(root, text="PlasticTax", font=("poppins", 40), bg_color="transparent")
-title.place(relx=0.5, rely=0.1, anchor="center")
+        electricity_cost_per_kwh = ctk.CTkEntry(root, placeholder_text="Electricity Cost per kWh (cents)", width=300)
+        electricity_cost_per_kwh.place(relx=0.4, rely=0.5, anchor="center")
 
-# input fields
-filament_cost_per_kg = ctk.CTkEntry(root, placeholder_text="Filament Cost per kg (dollars)", width=300)
-filament_cost_per_kg.place(relx=0.4, rely=0.2, anchor="center")
+        electricity_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
+                                           font=("Arial", 12, "bold"), command=lambda: None)
+        electricity_help_btn.place(relx=0.7, rely=0.5, anchor="center")
+        pending_tooltips.append((electricity_help_btn, "Enter your electricity cost per kWh in cents (check your electricity bill!)"))
 
-filament_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
-                                 font=("Arial", 12, "bold"), command=lambda: None)
-filament_help_btn.place(relx=0.7, rely=0.2, anchor="center")
+        electricity_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(electricity_cost_per_kwh, "electricity_cost"))
+        electricity_load_defaults_btn.place(relx=0.85, rely=0.5, anchor="center")
+        pending_tooltips.append((electricity_load_defaults_btn, "Load default electricity cost from settings"))
 
-CTkToolTip(filament_help_btn, message="Enter the cost of your filament per kilogram in dollars (e.g., 25.00)")
-filament_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(filament_cost_per_kg, "filament_cost"))
+        # -------------------------------------------------------------------
 
-filament_load_defaults_btn.place(relx=0.85, rely=0.2, anchor="center")
-CTkToolTip(filament_load_defaults_btn, message="Load default filament cost from settings")
+        printer_power_rating = ctk.CTkEntry(root, placeholder_text="Printer Power Rating (watts)", width=300)
+        printer_power_rating.place(relx=0.4, rely=0.6, anchor="center")
 
-# -------------------------------------------------------------------
+        power_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
+                                      font=("Arial", 12, "bold"), command=lambda: None)
+        power_help_btn.place(relx=0.7, rely=0.6, anchor="center")
+        pending_tooltips.append((power_help_btn, "Enter your 3D printer's power consumption in watts (check your printer's specifications or manual)"))
 
-print_weight = ctk.CTkEntry(root, placeholder_text="Weight of Print (grams)", width=300)
-print_weight.place(relx=0.4, rely=0.3, anchor="center")
+        power_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(printer_power_rating, "printer_power"))
+        power_load_defaults_btn.place(relx=0.85, rely=0.6, anchor="center")
+        pending_tooltips.append((power_load_defaults_btn, "Load default printer power rating from settings"))
 
-weight_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
-                               font=("Arial", 12, "bold"), command=lambda: None)
-weight_help_btn.place(relx=0.7, rely=0.3, anchor="center")
-CTkToolTip(weight_help_btn, message="Enter the weight of your 3D print in grams (usually shown in your slicer)")
+        # -------------------------------------------------------------------
 
-# -------------------------------------------------------------------
+        # calculate button
+        calculateButton = ctk.CTkButton(root, text="Calculate", command=lambda: calculate_cost(
+            filament_cost_per_kg.get(),
+            print_weight.get(),
+            estimated_print_time.get(),
+            electricity_cost_per_kwh.get(),
+            printer_power_rating.get(),
+            print_start_time.get()
+        ))
+        calculateButton.place(relx=0.5, rely=0.7, anchor="center")
 
-estimated_print_time = ctk.CTkEntry(root, placeholder_text="Estimated Print Time (hours)", width=300)
-estimated_print_time.place(relx=0.4, rely=0.4, anchor="center")
+        # print start, only used to cost electricity on a time-of-use tariff
+        print_start_time = ctk.CTkEntry(root, placeholder_text="Start (HH:MM)", width=130)
+        print_start_time.place(relx=0.17, rely=0.7, anchor="center")
+        pending_tooltips.append((print_start_time, "When the print starts (blank for now, HH:MM or YYYY-MM-DD HH:MM); only used with a time-of-use tariff"))
 
-time_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
-                             font=("Arial", 12, "bold"), command=lambda: None)
-time_help_btn.place(relx=0.7, rely=0.4, anchor="center")
-CTkToolTip(time_help_btn, message="Enter the estimated print time in hours (e.g., 2.5 for 2 hours 30 minutes)")
+        cheapest_start_button = ctk.CTkButton(root, text="Cheapest Start", width=120, command=lambda: show_cheapest_start())
+        cheapest_start_button.place(relx=0.83, rely=0.7, anchor="center")
+        pending_tooltips.append((cheapest_start_button, "Find the start time in the next day with the cheapest electricity"))
 
-# -------------------------------------------------------------------
+        # result labels
+        # cost percentiles from the last risk analysis, if any
+        risk_label = ctk.CTkLabel(root, text="", font=("poppins", 12))
+        risk_label.place(relx=0.5, rely=0.755, anchor="center")
 
-electricity_cost_per_kwh = ctk.CTkEntry(root, placeholder_text="Electricity Cost per kWh (cents)", width=300)
-electricity_cost_per_kwh.place(relx=0.4, rely=0.5, anchor="center")
+        filament_cost_label = ctk.CTkLabel(root, text="Filament Cost: hit calculate to see result!", font=("poppins", 14))
+        filament_cost_label.place(relx=0.5, rely=0.8, anchor="center")
 
-electricity_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
-                                   font=("Arial", 12, "bold"), command=lambda: None)
-electricity_help_btn.place(relx=0.7, rely=0.5, anchor="center")
-CTkToolTip(electricity_help_btn, message="Enter your electricity cost per kWh in cents (check your electricity bill!)")
+        electricity_cost_label = ctk.CTkLabel(root, text="Electricity Cost: hit calculate to see result!", font=("poppins", 14))
+        electricity_cost_label.place(relx=0.5, rely=0.85, anchor="center")
 
-electricity_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(electricity_cost_per_kwh, "electricity_cost"))
-electricity_load_defaults_btn.place(relx=0.85, rely=0.5, anchor="center")
-CTkToolTip(electricity_load_defaults_btn, message="Load default electricity cost from settings")
+        total_cost_label = ctk.CTkLabel(root, text="Total Cost: hit calculate to see result!", font=("poppins", 14))
+        total_cost_label.place(relx=0.5, rely=0.9, anchor="center")
 
-# -------------------------------------------------------------------
 
-printer_power_rating = ctk.CTkEntry(root, placeholder_text="Printer Power Rating (watts)", width=300)
-printer_power_rating.place(relx=0.4, rely=0.6, anchor="center")
+        # misc buttons
+        settings_button = ctk.CTkButton(root, text="Settings", command=lambda: show_settings_popup())
+        settings_button.place(relx=0.05, rely=0.05, anchor="nw")
 
-power_help_btn = ctk.CTkButton(root, text="?", width=25, height=25, 
-                              font=("Arial", 12, "bold"), command=lambda: None)
-power_help_btn.place(relx=0.7, rely=0.6, anchor="center")
-CTkToolTip(power_help_btn, message="Enter your 3D printer's power consumption in watts (check your printer's specifications or manual)")
+        history_button = ctk.CTkButton(root, text="History", command=lambda: show_history_popup())
+        history_button.place(relx=0.05, rely=0.11, anchor="nw")
 
-power_load_defaults_btn = ctk.CTkButton(root, text="Load Defaults", command=lambda: load_default_value(printer_power_rating, "printer_power"))
-power_load_defaults_btn.place(relx=0.85, rely=0.6, anchor="center")
-CTkToolTip(power_load_defaults_btn, message="Load default printer power rating from settings")
+        export_pdf_report_button = ctk.CTkButton(root, text="Export PDF Report", command=lambda: generate_pdf())
+        export_pdf_report_button.place(relx=0.4, rely=0.93, anchor="nw")
 
-# -------------------------------------------------------------------
+        risk_button = ctk.CTkButton(root, text="Risk Analysis", width=110, command=lambda: show_risk_popup())
+        risk_button.place(relx=0.05, rely=0.93, anchor="nw")
 
-# calculate button
-calculateButton = ctk.CTkButton(root, text="Calculate", command=lambda: calculate_cost(
-    filament_cost_per_kg.get(),
-    print_weight.get(),
-    estimated_print_time.get(),
-    electricity_cost_per_kwh.get(),
-    printer_power_rating.get()
-))
-calculateButton.place(relx=0.5, rely=0.7, anchor="center")
+        import_file_button = ctk.CTkButton(root, text="Import G-code/Model", command=lambda: import_print_file())
+        import_file_button.place(relx=0.95, rely=0.05, anchor="ne")
 
-# result labels
-filament_cost_label = ctk.CTkLabel(root, text="Filament Cost: hit calculate to see result!", font=("poppins", 14))
-filament_cost_label.place(relx=0.5, rely=0.8, anchor="center")
+        # printer profiles are read from printers.csv after the first frame
+        printer_dropdown = ctk.CTkOptionMenu(root, values=[CUSTOM_PRINTER], width=140, command=select_printer)
+        printer_dropdown.place(relx=0.95, rely=0.11, anchor="ne")
+        pending_tooltips.append((printer_dropdown, "Printer profile (from printers.csv) whose warm-up, printing and idle power is used"))
 
-electricity_cost_label = ctk.CTkLabel(root, text="Electricity Cost: hit calculate to see result!", font=("poppins", 14))
-electricity_cost_label.place(relx=0.5, rely=0.85, anchor="center")
+        # background task progress, only placed while something is running
+        task_progress_bar = ctk.CTkProgressBar(root, width=160)
+        cancel_tasks_button = ctk.CTkButton(root, text="Cancel", width=60, command=lambda: task_runner.cancel_all())
+        task_runner = TaskRunner(root, on_activity=update_task_progress)
 
-total_cost_label = ctk.CTkLabel(root, text="Total Cost: hit calculate to see result!", font=("poppins", 14))
-total_cost_label.place(relx=0.5, rely=0.9, anchor="center")
+def attach_tooltips():
+    """Create the help tooltips queued while building the main window"""
+    from CTkToolTip import CTkToolTip
 
+    while pending_tooltips:
+        widget, message = pending_tooltips.pop(0)
+        CTkToolTip(widget, message=message)
 
-# misc buttons
-settings_button = ctk.CTkButton(root, text="Settings", command=lambda: show_settings_popup())
-settings_button.place(relx=0.05, rely=0.05, anchor="nw")
+def on_first_frame(exit_after_first_frame=False):
+    """Runs once the main window has been drawn; finishes the deferred startup work"""
+    root.update_idletasks()
+    startup_profile.mark_first_frame()
 
-export_pdf_report_button = ctk.CTkButton(root, text="Export PDF Report", command=lambda: generate_pdf(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating))
-export_pdf_report_button.place(relx=0.4, rely=0.93, anchor="nw")
+    with phase("tooltips (deferred)"):
+        attach_tooltips()
+    with phase("printer profiles (deferred)"):
+        load_printer_profiles()
+    startup_profile.report()
+    if instrumentation.enabled:
+        export_metrics_periodically()
 
+    if exit_after_first_frame:
+        root.destroy()
 
+def export_metrics(quiet=False):
+    """Write the metrics file, if metrics are on; errors are printed, never raised"""
+    try:
+        path = instrumentation.export()
+    except OSError as e:
+        print(f"Could not write metrics: {e}")
+        return
+    if path and not quiet:
+        print(f"Metrics written to {path}")
+
+def export_metrics_periodically():
+    # so a crash or a kill still leaves recent numbers behind
+    export_metrics(quiet=True)
+    root.after(instrumentation.EXPORT_SECONDS * 1000, export_metrics_periodically)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PlasticTax 3D print cost calculator")
+    parser.add_argument("--profile-startup", action="store_true", help="print a per-phase startup timing breakdown (also PLASTICTAX_PROFILE_STARTUP=1)")
+    parser.add_argument("--exit-after-first-frame", action="store_true", help="quit as soon as the main window is drawn (for startup benchmarks)")
+    parser.add_argument("--serve", action="store_true", help="run the HTTP/JSON quote service instead of the window")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve to listen on")
+    parser.add_argument("--port", type=int, default=8311, help="port for --serve to listen on")
+    parser.add_argument("--watch", metavar="FOLDER", help="quote every G-code file dropped into FOLDER instead of opening the window")
+    parser.add_argument("--metrics", metavar="FILE", help="time hot paths and write them to FILE, as JSON for .json and Prometheus text otherwise (also PLASTICTAX_METRICS=FILE)")
+    parser.add_argument("--profile-session", metavar="FILE", help="cProfile the whole session and dump the stats to FILE (also PLASTICTAX_PROFILE_SESSION=FILE)")
+    args = parser.parse_args(argv)
+
+    instrumentation.configure(args.metrics or os.environ.get("PLASTICTAX_METRICS"),
+                              args.profile_session or os.environ.get("PLASTICTAX_PROFILE_SESSION"))
+    instrumentation.start_session_profile()
+    try:
+        run_app(args)
+    finally:
+        if instrumentation.stop_session_profile():
+            print(f"Session profile written to {instrumentation.session_profile_path}")
+        export_metrics()
+
+def run_app(args):
+    """The window, or one of the headless modes"""
+    if args.serve:
+        # headless: no window, fonts or images, just the cost engine behind asyncio
+        from quote_server import serve
+
+        create_default_settings()
+        serve(args.host, args.port)
+        return
+    if args.watch:
+        # headless too: quotes land in the folder's report and the watch ledger
+        from watch_folder import watch
 
-root.mainloop()
\ No newline at end of file
+        create_default_settings()
+        watch(args.watch)
+        return
+    if args.profile_startup:
+        startup_profile.enabled = True
+
+    with phase("font registration"):
+        register_custom_font()
+    with phase("settings"):
+        # Initialize settings on startup
+        create_default_settings()
+
+    build_main_window()
+    root.after(0, lambda: on_first_frame(args.exit_after_first_frame))
+    root.mainloop()
+    task_runner.shutdown()
+
+if __name__ == "__main__":
+    main()
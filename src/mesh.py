@@ -0,0 +1,305 @@
+# mesh import: volume, surface area and an estimated print weight from STL and 3MF models
+import argparse
+import json
+import os
+import re
+import sys
+import zipfile
+import zlib
+
+import numpy as np
+
+MESH_EXTENSIONS = (".stl", ".3mf")
+
+# a sliced part is not solid: walls of roughly this thickness around an infill of this density
+DEFAULT_SHELL_THICKNESS_MM = 1.2
+DEFAULT_INFILL = 0.2
+
+# triangles handled per NumPy pass, so huge meshes don't need a float64 copy of everything at once
+TRIANGLE_BLOCK = 1 << 20
+
+# binary STL: 80 byte header, triangle count, then 50 bytes per triangle
+STL_HEADER_BYTES = 84
+STL_TRIANGLE = np.dtype([("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+
+# 3MF model units, in millimetres
+UNIT_SCALE = {
+    "micron": 0.001,
+    "millimeter": 1.0,
+    "centimeter": 10.0,
+    "inch": 25.4,
+    "foot": 304.8,
+    "meter": 1000.0,
+}
+
+_ASCII_VERTEX = re.compile(rb"vertex\s+(\S+)\s+(\S+)\s+(\S+)")
+
+
+def is_binary_stl(path):
+    """True when the file size matches the triangle count in a binary STL header"""
+    size = os.path.getsize(path)
+    if size < STL_HEADER_BYTES:
+        return False
+    with open(path, "rb") as f:
+        f.seek(80)
+        count = int.from_bytes(f.read(4), "little")
+    return size == STL_HEADER_BYTES + count * STL_TRIANGLE.itemsize
+
+
+def read_stl(path):
+    """Return an (n, 3, 3) array of triangle vertices from a binary or ASCII STL.
+
+    Binary files are memory-mapped, so the array is a view onto the file rather
+    than a copy in memory.
+    """
+    if is_binary_stl(path):
+        if os.path.getsize(path) == STL_HEADER_BYTES:
+            return np.zeros((0, 3, 3), dtype=np.float32)
+        return np.memmap(path, dtype=STL_TRIANGLE, mode="r", offset=STL_HEADER_BYTES)["vertices"]
+
+    with open(path, "rb") as f:
+        text = f.read()
+    if not text.lstrip().startswith(b"solid"):
+        raise ValueError(f"{path} is not an STL file")
+    vertices = np.array(_ASCII_VERTEX.findall(text), dtype=np.float64)
+    if len(vertices) % 3:
+        raise ValueError(f"{path} has a facet without three vertices")
+    return vertices.reshape(-1, 3, 3)
+
+
+def _triangle_blocks(vertices, triangles=None):
+    """Yield (3 corners, 3 axes, n) float64 arrays for blocks of triangles.
+
+    vertices is either (n, 3, 3) triangle corners, or (v, 3) points indexed by
+    an (n, 3) triangles array.
+    """
+    count = len(vertices) if triangles is None else len(triangles)
+    for start in range(0, count, TRIANGLE_BLOCK):
+        if triangles is None:
+            block = np.asarray(vertices[start:start + TRIANGLE_BLOCK], dtype=np.float64)
+        else:
+            block = np.asarray(vertices, dtype=np.float64)[triangles[start:start + TRIANGLE_BLOCK]]
+        # corner-major, axis-major layout so every coordinate is a contiguous column
+        yield np.ascontiguousarray(block.transpose(1, 2, 0))
+
+
+def mesh_volume_and_area(vertices, triangles=None):
+    """Return (volume mm^3, surface area mm^2) of a closed triangle mesh.
+
+    The volume is the sum of the signed tetrahedra each facet forms with a
+    common apex, computed for every triangle at once with NumPy. The apex is the
+    mesh's first vertex rather than the origin, which keeps the terms small and
+    the sum accurate for models placed far from (0, 0, 0).
+    """
+    volume = area = 0.0
+    apex = None
+    for block in _triangle_blocks(vertices, triangles):
+        if apex is None:
+            apex = block[0, :, :1].copy() if block.shape[2] else np.zeros((3, 1))
+        block -= apex
+        (ax, ay, az), (bx, by, bz), (cx, cy, cz) = block
+        volume += float((ax * (by * cz - bz * cy) + ay * (bz * cx - bx * cz) + az * (bx * cy - by * cx)).sum()) / 6
+        ux, uy, uz, vx, vy, vz = bx - ax, by - ay, bz - az, cx - ax, cy - ay, cz - az
+        area += float(np.sqrt((uy * vz - uz * vy) ** 2 + (uz * vx - ux * vz) ** 2 + (ux * vy - uy * vx) ** 2).sum()) / 2
+    # facets wound the wrong way round give a negative total
+    return abs(volume), area
+
+
+def _determinant(transform):
+    """Volume scale of a 3MF transform ('m00 m01 m02 m10 ... m32')"""
+    if not transform:
+        return 1.0
+    values = np.array(transform.split(), dtype=np.float64)
+    return abs(float(np.linalg.det(values[:9].reshape(3, 3))))
+
+
+# 3MF model XML is scanned in chunks of this many bytes
+MODEL_CHUNK_BYTES = 16 << 20
+
+_PREFIX = rb"(?:[\w.-]+:)?"
+_STRUCTURE_TAG = re.compile(rb"<(/?)" + _PREFIX + rb"(model|object|component|item)\b([^>]*?)(/?)>")
+_ATTRIBUTE = re.compile(rb'(?:[\w.-]+:)?([\w.-]+)\s*=\s*"([^"]*)"')
+# vertices and triangles are read in bulk, assuming the attribute order every slicer writes;
+# a segment where that doesn't hold is parsed element by element instead
+_VERTEX = re.compile(rb'vertex\s+x="([^"]*)"\s+y="([^"]*)"\s+z="([^"]*)"')
+_TRIANGLE = re.compile(rb'triangle\s+v1="([^"]*)"\s+v2="([^"]*)"\s+v3="([^"]*)"')
+_ANY_VERTEX = re.compile(rb"<" + _PREFIX + rb"vertex\b([^>]*)>")
+_ANY_TRIANGLE = re.compile(rb"<" + _PREFIX + rb"triangle\b([^>]*)>")
+
+
+def _attributes(raw):
+    return {key.decode(): value.decode() for key, value in _ATTRIBUTE.findall(raw)}
+
+
+def _read_elements(segment, tag, fast, anything, names, dtype):
+    """Rows of the named attributes of every tag element in segment, as an (n, 3) array"""
+    rows = fast.findall(segment)
+    # every mention of the tag name that isn't the plural container or a closing tag is an element
+    expected = segment.count(tag) - segment.count(tag + b"s") - segment.count(b"/" + tag + b">")
+    if len(rows) != expected:
+        rows = []
+        for raw in anything.findall(segment):
+            attributes = _attributes(raw)
+            rows.append(tuple(attributes.get(name, "nan") for name in names))
+    return np.array(rows, dtype=dtype).reshape(-1, 3)
+
+
+def _scan_model(model, name, meshes, components, build):
+    """Stream one .model file, measuring each mesh object as soon as it is closed"""
+    scale = 1.0
+    object_id = None
+    points, corners = [], []
+    carry = b""
+    while True:
+        chunk = model.read(MODEL_CHUNK_BYTES)
+        text = carry + chunk
+        # only whole tags are scanned; the rest waits for the next chunk
+        cut = len(text) if not chunk else text.rfind(b">") + 1
+        text, carry = text[:cut], text[cut:]
+
+        position = 0
+        for tag in _STRUCTURE_TAG.finditer(text):
+            segment = text[position:tag.start()]
+            position = tag.end()
+            if object_id is not None and segment:
+                points.append(_read_elements(segment, b"vertex", _VERTEX, _ANY_VERTEX, ("x", "y", "z"), np.float64))
+                corners.append(_read_elements(segment, b"triangle", _TRIANGLE, _ANY_TRIANGLE, ("v1", "v2", "v3"), np.int64))
+
+            closing, element, raw, self_closing = tag.groups()
+            attributes = _attributes(raw)
+            if element == b"model" and not closing:
+                scale = UNIT_SCALE.get(attributes.get("unit", "millimeter"), 1.0)
+            elif element == b"object" and not closing:
+                object_id = (name, attributes.get("id"))
+                points, corners = [], []
+            elif element == b"object":
+                triangles = np.concatenate(corners) if corners else np.zeros((0, 3), dtype=np.int64)
+                if len(triangles):
+                    vertices = np.concatenate(points) * scale
+                    if triangles.min() < 0 or triangles.max() >= len(vertices):
+                        raise ValueError(f"object {object_id[1]} in {name} has a triangle with a missing vertex")
+                    meshes[object_id] = mesh_volume_and_area(vertices, triangles) + (len(triangles),)
+                object_id = None
+                points, corners = [], []
+            elif element == b"component" and not closing:
+                target = attributes.get("path")
+                key = (target.lstrip("/") if target else name, attributes.get("objectid"))
+                components.setdefault(object_id, []).append((key, attributes.get("transform")))
+            elif element == b"item" and not closing:
+                build.append(((name, attributes.get("objectid")), attributes.get("transform")))
+
+        if object_id is not None and position < len(text):
+            segment = text[position:]
+            points.append(_read_elements(segment, b"vertex", _VERTEX, _ANY_VERTEX, ("x", "y", "z"), np.float64))
+            corners.append(_read_elements(segment, b"triangle", _TRIANGLE, _ANY_TRIANGLE, ("v1", "v2", "v3"), np.int64))
+        if not chunk:
+            return
+
+
+def read_3mf(path):
+    """Return (volume mm^3, surface area mm^2, triangle count) of everything on a 3MF build plate.
+
+    Each model XML is streamed out of the zip a chunk at a time. Structural tags
+    (objects, components, build items) are walked one by one, while the runs of
+    vertex and triangle elements between them are pulled out with one regex
+    pass each and converted by NumPy, so large meshes never go through a
+    per-element Python loop. Objects placed more than once, assemblies and
+    scaling transforms are all counted.
+    """
+    meshes, components, build = {}, {}, []
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = [name for name in archive.namelist() if name.lower().endswith(".model")]
+            if not names:
+                raise ValueError(f"{path} has no 3D model in it")
+            for name in names:
+                with archive.open(name) as model:
+                    _scan_model(model, name, meshes, components, build)
+    # a truncated or corrupt archive is bad input like any other unreadable model, not a crash
+    except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError) as e:
+        raise ValueError(f"{path} is not a readable 3MF file ({e})") from None
+
+    def measure(object_id, depth=0):
+        if object_id in meshes:
+            return meshes[object_id]
+        if depth > 32:
+            raise ValueError(f"{path} has components that refer to each other")
+        volume = area = count = 0
+        for child, transform in components.get(object_id, ()):
+            child_volume, child_area, child_count = measure(child, depth + 1)
+            factor = _determinant(transform)
+            volume += child_volume * factor
+            # area scales by factor^(2/3) for a uniform scale, which is what slicers use
+            area += child_area * factor ** (2 / 3)
+            count += child_count
+        return volume, area, count
+
+    # a file with no build section prints every object once
+    placements = build or [(object_id, None) for object_id in list(meshes) + list(components)]
+    volume = area = count = 0
+    for object_id, transform in placements:
+        part_volume, part_area, part_count = measure(object_id)
+        factor = _determinant(transform)
+        volume += part_volume * factor
+        area += part_area * factor ** (2 / 3)
+        count += part_count
+    return volume, area, count
+
+
+def estimate_weight(volume_mm3, area_mm2, density, infill=DEFAULT_INFILL, shell_mm=DEFAULT_SHELL_THICKNESS_MM):
+    """Grams of filament to print a part: solid walls shell_mm thick, infill elsewhere"""
+    shell = min(area_mm2 * shell_mm, volume_mm3)
+    printed_mm3 = shell + (volume_mm3 - shell) * infill
+    return printed_mm3 / 1000 * density
+
+
+def measure_mesh(path):
+    """Return (volume mm^3, surface area mm^2, triangle count) of an STL or 3MF file"""
+    if path.lower().endswith(".3mf"):
+        return read_3mf(path)
+    triangles = read_stl(path)
+    return mesh_volume_and_area(triangles) + (len(triangles),)
+
+
+def analyze_mesh(path, density, infill=DEFAULT_INFILL, shell_mm=DEFAULT_SHELL_THICKNESS_MM):
+    """Return {'weight_g', 'volume_cm3', 'area_cm2', 'triangles'} for an STL or 3MF file"""
+    volume, area, count = measure_mesh(path)
+    return {
+        "weight_g": estimate_weight(volume, area, density, infill, shell_mm),
+        "volume_cm3": volume / 1000,
+        "area_cm2": area / 100,
+        "triangles": count,
+    }
+
+
+def main(argv=None):
+    from settings import MATERIAL_DENSITIES, get_material_density, get_settings_store
+
+    parser = argparse.ArgumentParser(description="Estimate print weight from STL or 3MF models.")
+    parser.add_argument("paths", nargs="+", help="STL or 3MF files")
+    parser.add_argument("--material", help=f"density preset: {', '.join(MATERIAL_DENSITIES)} (default: from settings)")
+    parser.add_argument("--density", type=float, help="filament density in g/cm^3, overrides --material")
+    parser.add_argument("--infill", type=float, default=DEFAULT_INFILL, help="infill fraction, 0-1")
+    parser.add_argument("--shell", type=float, default=DEFAULT_SHELL_THICKNESS_MM, help="wall thickness in mm")
+    parser.add_argument("--settings", help="settings.csv to take the default material from")
+    args = parser.parse_args(argv)
+
+    material = args.material or get_settings_store(args.settings).get("default_material", "PLA")
+    density = args.density or get_material_density(material)
+    if density is None:
+        parser.error(f"unknown material {material!r}; use --density")
+
+    failed = 0
+    for path in args.paths:
+        try:
+            result = analyze_mesh(path, density, args.infill, args.shell)
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"{path}: {e}", file=sys.stderr)
+            failed += 1
+            continue
+        print(json.dumps({"path": path, "material": material, **result}))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
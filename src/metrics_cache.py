@@ -0,0 +1,285 @@
+# persistent cache of the weight, time and volume extracted from G-code and model files
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from settings import get_default_settings_path
+
+# bump when a parser changes what it extracts, so older cached results are ignored
+ANALYZER_VERSION = 3
+
+# most distinct (file content, options) results kept before the least recently used are dropped
+DEFAULT_MAX_ENTRIES = 10000
+
+HASH_BLOCK_BYTES = 1 << 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    key TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    weight_g REAL,
+    print_time_h REAL,
+    volume_cm3 REAL,
+    result TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS metrics_last_used ON metrics (last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+STAT_NAMES = ("hits", "content_hits", "misses", "evictions")
+
+
+def get_metrics_cache_path():
+    """SQLite file holding the cached metrics, next to the settings file"""
+    cache_dir = os.path.join(os.path.dirname(get_default_settings_path()), "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    return os.path.join(cache_dir, "metrics.sqlite3")
+
+
+def content_hash(path):
+    """SHA-256 of a file, read a block at a time"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class MetricsCache:
+    """Results of parsing job files, stored by file content in a SQLite database.
+
+    A lookup first checks the file's path, mtime and size against the last time
+    it was seen; if they match, the stored content hash is trusted and the file is
+    not read at all. Otherwise the file is hashed, so a copied, renamed or touched
+    file still finds its earlier result. Results are keyed by content hash plus
+    the options they were computed with, and the least recently used ones are
+    dropped once there are more than max_entries.
+
+    The database runs in WAL mode with a busy timeout and every write is its own
+    short transaction, so the GUI, batch tools and worker processes can share it.
+    Each thread gets its own connection.
+    """
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or get_metrics_cache_path()
+        self.max_entries = max_entries
+        # this instance's lookups; stats() also reports the totals across every process
+        self.session_stats = dict.fromkeys(STAT_NAMES, 0)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _count(self, connection, name, amount=1):
+        with self._stats_lock:
+            self.session_stats[name] += amount
+        connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, amount),
+        )
+
+    @staticmethod
+    def _key(digest, kind, options):
+        return f"{digest}:{kind}:{ANALYZER_VERSION}:{json.dumps(options, sort_keys=True)}"
+
+    def _fetch(self, connection, key):
+        row = connection.execute("SELECT result FROM metrics WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        connection.execute("UPDATE metrics SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def get_or_compute(self, path, kind, options, compute):
+        """Return the cached result for path, or compute() it and store it.
+
+        kind names the parser ('gcode', 'mesh') and options is a JSON-serializable
+        dict of whatever else the result depends on. compute() must return a dict;
+        its weight_g, print_time_h and volume_cm3 entries are also kept in their
+        own columns.
+        """
+        connection = self._connection()
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+
+        row = connection.execute(
+            "SELECT content_hash FROM files WHERE path = ? AND mtime_ns = ? AND size = ?",
+            (real_path, stat.st_mtime_ns, stat.st_size),
+        ).fetchone()
+        if row is not None:
+            result = self._fetch(connection, self._key(row[0], kind, options))
+            if result is not None:
+                self._count(connection, "hits")
+                return result
+
+        digest = content_hash(real_path)
+        connection.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, content_hash) VALUES (?, ?, ?, ?)",
+            (real_path, stat.st_mtime_ns, stat.st_size, digest),
+        )
+        key = self._key(digest, kind, options)
+        result = self._fetch(connection, key)
+        if result is not None:
+            self._count(connection, "content_hits")
+            return result
+
+        self._count(connection, "misses")
+        result = compute()
+        connection.execute(
+            "INSERT OR REPLACE INTO metrics (key, content_hash, weight_g, print_time_h, volume_cm3, result, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, digest, result.get("weight_g"), result.get("print_time_h"), result.get("volume_cm3"),
+             json.dumps(result), time.time()),
+        )
+        self._evict(connection)
+        return result
+
+    def _evict(self, connection):
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            (count,) = connection.execute("SELECT COUNT(*) FROM metrics").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                connection.execute(
+                    "DELETE FROM metrics WHERE key IN (SELECT key FROM metrics ORDER BY last_used LIMIT ?)", (excess,))
+                # paths whose content no longer has any result would only cost a wasted lookup
+                connection.execute(
+                    "DELETE FROM files WHERE content_hash NOT IN (SELECT content_hash FROM metrics)")
+                self._count(connection, "evictions", excess)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def stats(self):
+        """Lookup counts for this session and in total, plus how many results are stored"""
+        connection = self._connection()
+        totals = dict.fromkeys(STAT_NAMES, 0)
+        totals.update(connection.execute("SELECT name, value FROM stats").fetchall())
+        (entries,) = connection.execute("SELECT COUNT(*) FROM metrics").fetchone()
+
+        def with_rate(counts):
+            lookups = counts["hits"] + counts["content_hits"] + counts["misses"]
+            hit_rate = (counts["hits"] + counts["content_hits"]) / lookups if lookups else 0.0
+            return dict(counts, lookups=lookups, hit_rate=hit_rate)
+
+        with self._stats_lock:
+            session = dict(self.session_stats)
+        return {"session": with_rate(session), "total": with_rate(totals), "entries": entries,
+                "max_entries": self.max_entries, "path": self.path}
+
+    def clear(self):
+        """Drop every cached result and reset the statistics"""
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        connection.execute("DELETE FROM metrics")
+        connection.execute("DELETE FROM files")
+        connection.execute("DELETE FROM stats")
+        connection.execute("COMMIT")
+        with self._stats_lock:
+            self.session_stats = dict.fromkeys(STAT_NAMES, 0)
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_metrics_cache(path=None):
+    """Return the shared MetricsCache for a database file (the app's own by default)"""
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = MetricsCache(path)
+        return cache
+
+
+def extract_job_metrics(path, density=None, diameter_mm=None, infill=None, shell_mm=None, cache=None, progress=None):
+    """Weight, time and volume for a G-code, STL or 3MF file, reusing a cached parse when there is one.
+
+    Returns a dict with weight_g, print_time_h (None for models, which aren't
+    sliced yet), volume_cm3 (None for G-code) and source. Options left as None
+    use the parsers' defaults. Pass cache=False to skip the cache entirely.
+    """
+    from gcode import DEFAULT_FILAMENT_DENSITY, DEFAULT_FILAMENT_DIAMETER_MM, GCODE_EXTENSIONS
+    from mesh import DEFAULT_INFILL, DEFAULT_SHELL_THICKNESS_MM, MESH_EXTENSIONS
+
+    if cache is None:
+        cache = get_metrics_cache()
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in MESH_EXTENSIONS:
+        from mesh import estimate_weight, measure_mesh
+
+        # only the geometry is cached, so changing material or infill never re-reads the model
+        def compute():
+            volume, area, triangles = measure_mesh(path)
+            return {"volume_mm3": volume, "area_mm2": area, "triangles": triangles,
+                    "volume_cm3": volume / 1000, "source": "mesh"}
+
+        geometry = cache.get_or_compute(path, "mesh", {}, compute) if cache else compute()
+        density = DEFAULT_FILAMENT_DENSITY if density is None else density
+        weight_g = estimate_weight(geometry["volume_mm3"], geometry["area_mm2"], density,
+                                   DEFAULT_INFILL if infill is None else infill,
+                                   DEFAULT_SHELL_THICKNESS_MM if shell_mm is None else shell_mm)
+        return {"weight_g": weight_g, "print_time_h": None, "volume_cm3": geometry["volume_cm3"],
+                "source": geometry["source"]}
+
+    if extension in GCODE_EXTENSIONS:
+        from gcode import gcode_weight, measure_gcode
+
+        # likewise only the filament length (or the slicer's grams) is cached, and weighed for the material here
+        def compute():
+            return measure_gcode(path, progress)
+
+        measured = cache.get_or_compute(path, "gcode", {}, compute) if cache else compute()
+        weight_g = gcode_weight(measured, DEFAULT_FILAMENT_DIAMETER_MM if diameter_mm is None else diameter_mm,
+                                DEFAULT_FILAMENT_DENSITY if density is None else density)
+        return {"weight_g": weight_g, "print_time_h": measured["print_time_h"], "volume_cm3": None,
+                "source": measured["source"]}
+
+    raise ValueError(f"{os.path.basename(path)} is not a G-code, STL or 3MF file")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the PlasticTax job metrics cache.")
+    parser.add_argument("--cache", help="cache database to use (default: the app's own)")
+    parser.add_argument("--clear", action="store_true", help="drop every cached result")
+    args = parser.parse_args(argv)
+
+    cache = get_metrics_cache(args.cache)
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
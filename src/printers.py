@@ -0,0 +1,266 @@
+# printer fleet profiles: warm-up / steady-state / idle power phases instead of one wattage
+import argparse
+import csv
+import os
+import sys
+from collections import namedtuple
+from itertools import repeat
+
+import numpy as np
+
+from settings import get_default_settings_path
+
+# printers.csv columns after the name, in the order the phase arrays use them
+PROFILE_FIELDS = ("warmup_minutes", "warmup_watts", "steady_watts", "idle_minutes", "idle_watts")
+WARMUP_MINUTES, WARMUP_WATTS, STEADY_WATTS, IDLE_MINUTES, IDLE_WATTS = range(len(PROFILE_FIELDS))
+
+
+def get_printers_path(settings_path=None):
+    """printers.csv, kept next to the settings file it goes with"""
+    return os.path.join(os.path.dirname(settings_path or get_default_settings_path()), "printers.csv")
+
+
+def constant_power_phases(watts):
+    """Phase rows for printers without a profile: no warm-up or idle, watts the whole print"""
+    watts = np.asarray(watts, dtype=np.float64)
+    phases = np.zeros(watts.shape + (len(PROFILE_FIELDS),))
+    phases[..., STEADY_WATTS] = watts
+    return phases
+
+
+def phase_energy_kwh(hours, phases):
+    """Energy of each job: warm-up, then hours at steady power, then the idle tail.
+
+    phases is one row of PROFILE_FIELDS or an (N, 5) array, one row per job.
+    """
+    phases = np.asarray(phases, dtype=np.float64)
+    watt_hours = (phases[..., WARMUP_MINUTES] / 60 * phases[..., WARMUP_WATTS]
+                  + np.asarray(hours, dtype=np.float64) * phases[..., STEADY_WATTS]
+                  + phases[..., IDLE_MINUTES] / 60 * phases[..., IDLE_WATTS])
+    return watt_hours / 1000
+
+
+def effective_watts(hours, phases):
+    """The constant wattage that uses the same energy over the print time as the phase model.
+
+    Feeding this to the flat cost formula as printer_power_rating gives the phase
+    model's electricity cost; prints of zero hours fall back to the steady power.
+    """
+    hours = np.asarray(hours, dtype=np.float64)
+    phases = np.asarray(phases, dtype=np.float64)
+    energy = phase_energy_kwh(hours, phases) * 1000
+    steady = np.broadcast_to(phases[..., STEADY_WATTS], energy.shape).copy()
+    return np.divide(energy, hours, out=steady, where=hours > 0)
+
+
+def job_seconds(hours, phases):
+    """How long the printer is drawing power for a job: warm-up, print and idle tail"""
+    phases = np.asarray(phases, dtype=np.float64)
+    return (phases[..., WARMUP_MINUTES] + phases[..., IDLE_MINUTES]) * 60 + np.asarray(hours, dtype=np.float64) * 3600
+
+
+def phase_tariff_cost(tariff, start, hours, phases):
+    """Electricity cost in dollars on a time-of-use tariff, with each phase at its own time.
+
+    The warm-up begins at start, the print follows it and the idle tail comes last,
+    so a long warm-up or idle period is priced at the rates in force when it happens.
+    """
+    phases = np.asarray(phases, dtype=np.float64)
+    start = np.asarray(start, dtype=np.float64)
+    hours = np.asarray(hours, dtype=np.float64)
+    warmup_hours = phases[..., WARMUP_MINUTES] / 60
+    print_start = start + warmup_hours * 3600
+    idle_start = print_start + hours * 3600
+    return (tariff.energy_cost(start, warmup_hours, phases[..., WARMUP_WATTS])
+            + tariff.energy_cost(print_start, hours, phases[..., STEADY_WATTS])
+            + tariff.energy_cost(idle_start, phases[..., IDLE_MINUTES] / 60, phases[..., IDLE_WATTS]))
+
+
+def phase_average_rate(tariff, start, hours, phases):
+    """Mean tariff rate in cents per kWh paid over a job's phases, weighted by energy"""
+    energy = phase_energy_kwh(hours, phases)
+    if energy <= 0:
+        return float(tariff.energy_cost(start, 1.0, 1000.0)) * 100
+    return float(phase_tariff_cost(tariff, start, hours, phases)) * 100 / float(energy)
+
+
+def cost_job(filament_cost_per_kg, print_weight, estimated_print_time, electricity_cost_per_kwh, printer_power_rating,
+             printer=None, tariff=None, start=None):
+    """Cost one job on an optional printer profile and tariff, as a dict of its inputs and costs.
+
+    A profile's average wattage over the print replaces printer_power_rating, and
+    on a tariff electricity_cost_per_kwh becomes the mean rate paid by a print
+    starting at start (Unix seconds), each phase at its own time. The window,
+    the watch folder and single quotes all cost jobs through here. Raises
+    ValueError on bad input.
+    """
+    from cost_engine import calculate_single_cost
+
+    hours = float(estimated_print_time)
+    # warm-up and idle tail folded into the average wattage over the print time
+    watts = float(printer.effective_watts(hours)) if printer is not None else float(printer_power_rating)
+    rate = float(electricity_cost_per_kwh) if tariff is None else phase_average_rate(
+        tariff, start, hours, printer.phases if printer is not None else constant_power_phases(watts))
+    job = {"print_weight": float(print_weight), "estimated_print_time": hours,
+           "filament_cost_per_kg": float(filament_cost_per_kg), "electricity_cost_per_kwh": rate,
+           "printer_power_rating": watts}
+    job["filament_cost"], job["electricity_cost"], job["total_cost"] = calculate_single_cost(
+        job["filament_cost_per_kg"], job["print_weight"], hours, rate, watts)
+    return job
+
+
+def cheapest_phase_start(tariff, hours, phases, window_start, window_end, step_minutes=1):
+    """(start, cost) of the cheapest start that fits warm-up, print and idle tail inside the window.
+
+    Every start step_minutes apart is costed in one vectorized pass. Raises
+    ValueError if the job is longer than the window, or the window too long to search.
+    """
+    from tariffs import check_search_window
+
+    check_search_window(window_start, window_end)
+    latest = window_end - job_seconds(hours, phases)
+    if latest < window_start:
+        raise ValueError("the print does not fit in the window")
+    starts = np.arange(window_start, latest + 1, step_minutes * 60, dtype=np.float64)
+    costs = phase_tariff_cost(tariff, starts, hours, phases)
+    best = int(np.argmin(costs))
+    return float(starts[best]), float(costs[best])
+
+
+class PrinterProfile(namedtuple("PrinterProfile", ("name",) + PROFILE_FIELDS)):
+    """One printer's power phases; warm-up and idle are in minutes, powers in watts"""
+
+    @property
+    def phases(self):
+        return np.array(self[1:], dtype=np.float64)
+
+    def energy_kwh(self, hours):
+        return phase_energy_kwh(hours, self.phases)
+
+    def effective_watts(self, hours):
+        return effective_watts(hours, self.phases)
+
+
+class PrinterRegistry:
+    """The printer profiles in printers.csv, one row per printer.
+
+    Nothing is read until a profile is first asked for; after that the file is
+    only re-read when its mtime or size changes. Profiles are held as one
+    (printers x 5) float array, so the phases of a whole queue of jobs are a
+    single row lookup per printer name. A missing file means no profiles.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_printers_path()
+        self._signature = None
+        self._index = {}
+        self._params = np.zeros((0, len(PROFILE_FIELDS)))
+
+    def _load(self):
+        index, rows = {}, []
+        with open(self.path, "r", newline="") as printers_file:
+            reader = csv.reader(printers_file)
+            header = next(reader, None) or []
+            missing = [field for field in ("name",) + PROFILE_FIELDS if field not in header]
+            if missing:
+                raise ValueError(f"{self.path} is missing the {', '.join(missing)} column(s)")
+            positions = [header.index(field) for field in PROFILE_FIELDS]
+            name_position = header.index("name")
+            for row in reader:
+                if not row or not "".join(row).strip():
+                    continue
+                name = row[name_position].strip()
+                try:
+                    values = [float(row[position]) for position in positions]
+                except (IndexError, ValueError):
+                    raise ValueError(f"{self.path} line {reader.line_num}: every phase needs a number") from None
+                if not name or any(not np.isfinite(value) or value < 0 for value in values):
+                    raise ValueError(f"{self.path} line {reader.line_num}: needs a name and non-negative phases")
+                index[name] = len(rows)
+                rows.append(values)
+        return index, np.array(rows, dtype=np.float64).reshape(-1, len(PROFILE_FIELDS))
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+            signature = stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            signature = None
+        if signature != self._signature:
+            if signature is None:
+                self._index, self._params = {}, np.zeros((0, len(PROFILE_FIELDS)))
+            else:
+                self._index, self._params = self._load()
+            self._signature = signature
+
+    def names(self):
+        self._refresh()
+        return list(self._index)
+
+    def get(self, name):
+        """The named profile, None for a blank name; raises ValueError for an unknown one"""
+        if not name:
+            return None
+        self._refresh()
+        if name not in self._index:
+            raise ValueError(f"no printer profile named {name!r} in {self.path}")
+        return PrinterProfile(name, *self._params[self._index[name]].tolist())
+
+    def phases(self, names, fallback_watts):
+        """(N, 5) phases for a queue of jobs, plus a mask of the jobs whose printer has a profile.
+
+        Jobs whose printer name is blank or unknown run at their fallback_watts the
+        whole print, as the flat formula assumes.
+        """
+        self._refresh()
+        try:
+            rows = np.fromiter(map(self._index.get, names, repeat(-1)), dtype=np.intp, count=len(names))
+        except TypeError:
+            # a JSON list or object where a printer name should be
+            rows = np.fromiter((self._index.get(name, -1) if isinstance(name, str) else -1 for name in names),
+                               dtype=np.intp, count=len(names))
+        profiled = rows >= 0
+        # row -1 picks the all-zero row appended below, which then gets its fallback steady power
+        phases = np.vstack((self._params, np.zeros(len(PROFILE_FIELDS))))[rows]
+        fallback = np.broadcast_to(np.asarray(fallback_watts, dtype=np.float64), rows.shape)
+        phases[:, STEADY_WATTS] = np.where(profiled, phases[:, STEADY_WATTS], fallback)
+        return phases, profiled
+
+
+_registries = {}
+
+
+def get_printer_registry(settings_path=None):
+    """Return the shared PrinterRegistry for a settings file's printers.csv (the app's own by default)"""
+    registry = _registries.get(settings_path)
+    if registry is None:
+        registry = _registries[settings_path] = PrinterRegistry(get_printers_path(settings_path))
+    return registry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List PlasticTax printer profiles and what a print costs on each.")
+    parser.add_argument("--settings", help="settings.csv whose printers.csv to use (default: the app's own)")
+    parser.add_argument("--hours", type=float, help="print time in hours, to show each printer's energy use")
+    parser.add_argument("--rate", type=float, help="electricity cost per kWh in cents (default: from settings)")
+    args = parser.parse_args(argv)
+
+    from settings import get_settings_store
+
+    registry = get_printer_registry(args.settings)
+    names = registry.names()
+    if args.hours is None:
+        for name in names:
+            print(registry.get(name))
+        return 0
+
+    rate = args.rate if args.rate is not None else get_settings_store(args.settings).get("default_electricity_cost", 12.0)
+    phases, _ = registry.phases(names, 0.0)
+    energy = phase_energy_kwh(args.hours, phases)
+    for name, kwh, watts in zip(names, energy.tolist(), effective_watts(args.hours, phases).tolist()):
+        print(f"{name}: {kwh:.3f} kWh (average {watts:.0f} W), ${kwh * rate / 100:.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
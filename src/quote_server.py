@@ -0,0 +1,351 @@
+# headless HTTP/JSON quoting service on asyncio, for the storefront and the farm scheduler
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+from batch_quote import (INPUT_FIELDS, OUTPUT_FIELDS, PRINTER_FIELD, START_TIME_FIELD, apply_printer_profiles, apply_tariff,
+                         load_defaults)
+from cost_engine import calculate_costs, cost_formula
+from printers import cost_job, get_printer_registry
+from settings import get_settings_store
+from tariffs import MAX_WINDOW_HOURS, get_tariff_store, parse_start_time
+import instrumentation
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8311
+
+# requests larger than this are refused before their body is read
+MAX_BODY_BYTES = 8 << 20
+MAX_BATCH_JOBS = 10000
+MAX_HEADER_BYTES = 64 << 10
+# idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_SECONDS = 30
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+    """A request that gets a structured JSON error response instead of a quote"""
+
+    def __init__(self, status, code, message, details=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+        self.details = details or []
+
+    def body(self):
+        error = {"code": self.code, "message": self.message}
+        if self.details:
+            error["details"] = self.details
+        return {"error": error}
+
+
+class PlainText(str):
+    """A response body sent as is rather than as JSON (the Prometheus metrics)"""
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def validate_job(job, defaults, index=None, printer_names=frozenset()):
+    """Return the five cost inputs of a JSON job in INPUT_FIELDS order, its (printer, start) and a list of problems.
+
+    Every problem is a {'field', 'message'} dict (with 'index' for batch jobs).
+    Fields left out fall back to the settings defaults where there is one. The
+    optional printer must be one of printer_names (the profiles in printers.csv);
+    the optional start_time (Unix seconds or a local ISO date/time) prices the
+    job on the tariff chosen in settings.
+    """
+    problems = []
+
+    def problem(field, message):
+        detail = {"field": field, "message": message}
+        if index is not None:
+            detail["index"] = index
+        problems.append(detail)
+
+    if not isinstance(job, dict):
+        problem(None, "job must be a JSON object")
+        return None, None, problems
+
+    values = []
+    for field in INPUT_FIELDS:
+        value = job.get(field)
+        if value is None:
+            if field not in defaults:
+                problem(field, "is required")
+                continue
+            value = defaults[field]
+        # JSON true/false would otherwise pass as 1/0
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            problem(field, "must be a number")
+            continue
+        try:
+            # JSON integers have no size limit; one too big for a float is a bad field, not a 500
+            value = float(value)
+        except OverflowError:
+            problem(field, "must be finite")
+            continue
+        if not math.isfinite(value):
+            problem(field, "must be finite")
+        elif value < 0:
+            problem(field, "must not be negative")
+        values.append(value)
+
+    printer = job.get(PRINTER_FIELD) or ""
+    if not isinstance(printer, str):
+        problem(PRINTER_FIELD, "must be a printer name")
+    elif printer and printer not in printer_names:
+        problem(PRINTER_FIELD, f"no printer profile named {printer!r}")
+    start = job.get(START_TIME_FIELD)
+    if start is not None:
+        try:
+            if isinstance(start, bool):
+                raise ValueError(start)
+            start = parse_start_time(start)
+        except (TypeError, ValueError, OverflowError):
+            problem(START_TIME_FIELD, "must be Unix seconds or an ISO date/time between 2000 and 2099")
+        else:
+            if len(values) == len(INPUT_FIELDS) and values[1] > MAX_WINDOW_HOURS:
+                problem("estimated_print_time", f"can't be over {MAX_WINDOW_HOURS} hours with a start_time")
+    if problems:
+        return None, None, problems
+    return values, (printer, start), problems
+
+
+def cost_jobs(rows, schedules, printers=None, tariff=None):
+    """Quote validated jobs the way batch_quote.py does, in one vectorized pass.
+
+    Jobs on a profiled printer are costed at its average wattage over their
+    phases, and with a tariff, jobs with a start time pay the rates in force
+    while they run. Returns one quote dict per job.
+    """
+    arrays = [np.array(column, dtype=np.float64) for column in zip(*rows)]
+    names = [printer for printer, _ in schedules]
+    starts = np.array([np.nan if start is None else start for _, start in schedules])
+    phases = apply_printer_profiles(printers, names, arrays) if printers is not None and any(names) else None
+    filament, electricity, total = calculate_costs(**dict(zip(INPUT_FIELDS, arrays)))
+    if tariff is not None:
+        electricity, total = apply_tariff(tariff, starts, arrays, filament, electricity, phases)
+
+    return list(map(make_quote, np.column_stack(arrays).tolist(), schedules,
+                    np.column_stack((filament, electricity, total)).tolist()))
+
+
+def make_quote(values, schedule, costs):
+    """A quote echoes the job's inputs, printer and start time next to its costs"""
+    quote = dict(zip(INPUT_FIELDS, values))
+    printer, start = schedule
+    if printer:
+        quote[PRINTER_FIELD] = printer
+    if start is not None:
+        quote[START_TIME_FIELD] = start
+    quote.update(zip(OUTPUT_FIELDS, costs))
+    return quote
+
+
+def printer_names(printers):
+    return frozenset(printers.names()) if printers is not None else frozenset()
+
+
+def quote_one(job, defaults, printers=None, tariff=None):
+    values, schedule, problems = validate_job(job, defaults, printer_names=printer_names(printers))
+    if problems:
+        raise RequestError(400, "validation_error", "the job has invalid fields", problems)
+    printer, start = schedule
+    if not printer and (start is None or tariff is None):
+        # nothing to look up, so the formula alone is the quote
+        return make_quote(values, schedule, cost_formula(**dict(zip(INPUT_FIELDS, values))))
+    # one job is costed like the window costs it; a NumPy pass costs more than that
+    job = cost_job(**dict(zip(INPUT_FIELDS, values)), printer=printers.get(printer) if printer else None,
+                   tariff=tariff if start is not None else None, start=start)
+    return make_quote([job[field] for field in INPUT_FIELDS], schedule, [job[field] for field in OUTPUT_FIELDS])
+
+
+def quote_batch(payload, defaults, printers=None, tariff=None):
+    jobs = payload.get("jobs") if isinstance(payload, dict) else payload
+    if not isinstance(jobs, list):
+        raise RequestError(400, "invalid_request", "body must be a list of jobs or an object with a 'jobs' list")
+    if len(jobs) > MAX_BATCH_JOBS:
+        raise RequestError(413, "too_many_jobs", f"at most {MAX_BATCH_JOBS} jobs per batch")
+
+    rows, schedules, problems = [], [], []
+    names = printer_names(printers)
+    for index, job in enumerate(jobs):
+        values, schedule, job_problems = validate_job(job, defaults, index, names)
+        problems.extend(job_problems)
+        rows.append(values)
+        schedules.append(schedule)
+    if problems:
+        raise RequestError(400, "validation_error", f"{len({p['index'] for p in problems})} of {len(jobs)} jobs have invalid fields", problems)
+    if not rows:
+        return {"quotes": []}
+    return {"quotes": cost_jobs(rows, schedules, printers, tariff)}
+
+
+class QuoteServer:
+    """Serves POST /quote, POST /quote/batch, GET /health and GET /metrics over HTTP/1.1 keep-alive.
+
+    Defaults come from settings.csv through the shared settings store, which
+    only re-reads the file when its mtime or size changes, so every request sees
+    the current defaults for the cost of one stat() call. Printer profiles and
+    the tariff chosen in settings are kept current the same way.
+    """
+
+    def __init__(self, settings_path=None):
+        self.settings_path = settings_path
+        self.requests_served = 0
+
+    def route(self, method, path, body):
+        path = path.split("?", 1)[0].rstrip("/") or "/"
+        if path == "/health":
+            if method != "GET":
+                raise RequestError(405, "method_not_allowed", "use GET")
+            return {"status": "ok", "requests_served": self.requests_served}
+        if path == "/metrics":
+            if method != "GET":
+                raise RequestError(405, "method_not_allowed", "use GET")
+            if not instrumentation.enabled:
+                raise RequestError(404, "metrics_disabled", "start the service with --metrics FILE (or PLASTICTAX_METRICS) to collect metrics")
+            return PlainText(instrumentation.prometheus_text())
+        if path not in ("/quote", "/quote/batch"):
+            raise RequestError(404, "not_found", f"no endpoint at {path}")
+        if method != "POST":
+            raise RequestError(405, "method_not_allowed", "use POST with a JSON body")
+
+        try:
+            payload = json.loads(body)
+        except (UnicodeDecodeError, ValueError) as e:
+            raise RequestError(400, "invalid_json", f"body is not valid JSON: {e}") from None
+        defaults, printers, tariff = self.costing()
+        if path == "/quote":
+            return quote_one(payload, defaults, printers, tariff)
+        return quote_batch(payload, defaults, printers, tariff)
+
+    def costing(self):
+        """(defaults, printer registry or None, tariff or None) from the current settings files"""
+        try:
+            printers = get_printer_registry(self.settings_path)
+            printers = printers if printers.names() else None
+            tariff = get_tariff_store(self.settings_path).get(get_settings_store(self.settings_path).get("electricity_tariff"))
+        except (OSError, ValueError) as e:
+            raise RequestError(500, "settings_error", f"could not load printer profiles or tariffs: {e}") from None
+        return load_defaults(self.settings_path), printers, tariff
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self.respond(writer, 413, RequestError(413, "headers_too_large", "request headers are too large").body(), False)
+                    return
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self.respond(writer, 400, RequestError(400, "bad_request", "malformed request line").body(), False)
+                    return
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                body = b""
+                if "content-length" in headers:
+                    try:
+                        length = int(headers["content-length"])
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        await self.respond(writer, 400, RequestError(400, "bad_request", "invalid Content-Length").body(), False)
+                        return
+                    if length > MAX_BODY_BYTES:
+                        await self.respond(writer, 413, RequestError(413, "body_too_large", f"body is over {MAX_BODY_BYTES} bytes").body(), False)
+                        return
+                    try:
+                        body = await reader.readexactly(length)
+                    except (asyncio.IncompleteReadError, ConnectionError):
+                        return
+                elif method == "POST":
+                    await self.respond(writer, 411, RequestError(411, "length_required", "send a Content-Length header").body(), False)
+                    return
+
+                try:
+                    with instrumentation.timer("quote_request"):
+                        status, payload = 200, self.route(method, target, body)
+                except RequestError as e:
+                    status, payload = e.status, e.body()
+                except Exception as e:  # never let one bad request take the server down
+                    print(f"Quote request failed: {e}", file=sys.stderr)
+                    status, payload = 500, RequestError(500, "internal_error", "the quote could not be computed").body()
+                self.requests_served += 1
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        if isinstance(payload, PlainText):
+            body, content_type = payload.encode(), PlainText.content_type
+        else:
+            body, content_type = json.dumps(payload).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+            + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        address = server.sockets[0].getsockname()
+        print(f"PlasticTax quote service listening on http://{address[0]}:{address[1]}", file=sys.stderr)
+        if ready is not None:
+            ready(address)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, settings_path=None):
+    """Run the quote service until interrupted"""
+    try:
+        asyncio.run(QuoteServer(settings_path).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve PlasticTax quotes over HTTP/JSON.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--settings", help="settings.csv to take defaults from (default: the app's settings file)")
+    parser.add_argument("--metrics", metavar="FILE", help="time requests, serve them at GET /metrics and write them to FILE on exit (also PLASTICTAX_METRICS=FILE)")
+    args = parser.parse_args(argv)
+    instrumentation.configure(args.metrics or os.environ.get("PLASTICTAX_METRICS"))
+    serve(args.host, args.port, args.settings)
+    try:
+        instrumentation.export()
+    except OSError as e:
+        print(f"Could not write metrics: {e}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
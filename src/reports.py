@@ -0,0 +1,292 @@
+# PDF cost reports: single jobs, combined multi-job reports and parallel per-job batches
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from instrumentation import count, timed
+
+# a job is a dict holding the five calculate_cost inputs and the filament_cost,
+# electricity_cost and total_cost computed from them, all as numbers, plus an
+# optional name/job_id used to label it
+
+# jobs per worker task when rendering one PDF per job
+RENDER_BATCH_SIZE = 25
+
+
+def _number(value):
+    """Format an input the way a user would type it (25 rather than 25.0)"""
+    return f"{value:g}"
+
+
+def job_name(job, index):
+    """Human readable name for a job: its name/job_id column, or its position"""
+    name = str(job.get("name") or job.get("job_id") or job.get("job") or f"Job {index + 1}")
+    # the built-in PDF fonts only cover Latin-1
+    return name.encode("latin-1", "replace").decode("latin-1")
+
+
+def add_job_page(pdf, job, title="PlasticTax Cost Report"):
+    """Add one page with the step-by-step cost calculation for job"""
+    filament_cost = f"Filament Cost: ${job['filament_cost']:.2f}"
+    electricity_cost = f"Electricity Cost: ${job['electricity_cost']:.2f}"
+    total_cost = f"Total Cost: ${job['total_cost']:.2f}"
+    print_weight_kg = job["print_weight"] / 1000
+    electricity_cost_per_kwh_dollars = job["electricity_cost_per_kwh"] / 100
+    printer_power_kw = job["printer_power_rating"] / 1000
+
+    pdf.add_page()
+
+    # Set title
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, title, ln=True, align='C')
+
+    # Add some space
+    pdf.ln(20)
+
+    # Set font for content
+    pdf.set_font("Arial", size=12)
+
+    # show calculation for filament cost
+    pdf.cell(0, 10, f"Filament Cost per kg: ${_number(job['filament_cost_per_kg'])}", ln=True)
+    pdf.cell(0, 10, f"Weight of Print: {_number(job['print_weight'])} grams", ln=True)
+    pdf.cell(0, 10, f"{_number(job['print_weight'])} grams = {print_weight_kg:.2f} kg", ln=True)
+    pdf.cell(0, 10, f"{_number(job['filament_cost_per_kg'])} * {print_weight_kg:.2f} kg = {filament_cost}", ln=True)
+
+    pdf.ln(10)
+
+    # show calculation for electricity cost
+    pdf.cell(0, 10, f"Estimated Print Time: {_number(job['estimated_print_time'])} hours", ln=True)
+    pdf.cell(0, 10, f"Electricity Cost per kWh: ${electricity_cost_per_kwh_dollars:.2f}", ln=True)
+    pdf.cell(0, 10, f"Printer Power Rating: {_number(job['printer_power_rating'])} watts", ln=True)
+    pdf.cell(0, 10, f"{_number(job['printer_power_rating'])} watts = {printer_power_kw:.2f} kW", ln=True)
+    pdf.cell(0, 10, f"{electricity_cost_per_kwh_dollars:.2f} * {printer_power_kw:.2f} kW * {_number(job['estimated_print_time'])} hours = {electricity_cost}", ln=True)
+
+    # draw a line here
+    pdf.line(10, pdf.get_y() + 5, 200, pdf.get_y() + 5)
+    pdf.ln(10)
+
+    # show total cost
+    pdf.cell(0, 10, f"Total Cost =  {filament_cost} + {electricity_cost} = {total_cost}", ln=True)
+
+
+def add_summary_table(pdf, jobs):
+    """Add a summary table of every job plus a totals row, spilling onto more pages as needed"""
+    columns = (("Job", 60), ("Weight (g)", 25), ("Time (h)", 22), ("Filament", 27), ("Electricity", 27), ("Total", 29))
+
+    def header_row():
+        pdf.set_font("Arial", 'B', 10)
+        for label, width in columns:
+            pdf.cell(width, 8, label, border=1, align='C')
+        pdf.ln()
+        pdf.set_font("Arial", size=10)
+
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(0, 10, "PlasticTax Cost Summary", ln=True, align='C')
+    pdf.set_font("Arial", size=10)
+    pdf.cell(0, 8, f"{len(jobs)} jobs", ln=True, align='C')
+    pdf.ln(4)
+    header_row()
+
+    for index, job in enumerate(jobs):
+        if pdf.get_y() > pdf.h - 25:
+            pdf.add_page()
+            header_row()
+        name = job_name(job, index)
+        cells = (name if len(name) <= 32 else name[:31] + "...",
+                 _number(job["print_weight"]), _number(job["estimated_print_time"]),
+                 f"${job['filament_cost']:.2f}", f"${job['electricity_cost']:.2f}", f"${job['total_cost']:.2f}")
+        for (_, width), text in zip(columns, cells):
+            pdf.cell(width, 7, text, border=1, align='L' if width == columns[0][1] else 'R')
+        pdf.ln()
+
+    pdf.set_font("Arial", 'B', 10)
+    totals = [sum(job[field] for job in jobs) for field in ("filament_cost", "electricity_cost", "total_cost")]
+    pdf.cell(columns[0][1] + columns[1][1] + columns[2][1], 8, "Total", border=1)
+    for (_, width), value in zip(columns[3:], totals):
+        pdf.cell(width, 8, f"${value:.2f}", border=1, align='R')
+    pdf.ln()
+
+
+@timed("pdf_render")
+def write_job_report(job, path):
+    """Write a single-job report to path"""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    add_job_page(pdf, job)
+    pdf.output(path)
+    count("pdf_bytes", os.path.getsize(path))
+    return path
+
+
+def write_combined_report(jobs, path, task=None):
+    """Write one PDF with a summary table followed by a calculation page per job"""
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    add_summary_table(pdf, jobs)
+    for index, job in enumerate(jobs):
+        add_job_page(pdf, job, title=f"PlasticTax Cost Report - {job_name(job, index)}")
+        if task is not None and index % 50 == 0:
+            task.report_progress(index / max(len(jobs), 1))
+            task.check_cancelled()
+    pdf.output(path)
+    return path
+
+
+def _safe_file_part(text):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in text)[:60]
+
+
+def reserve_report_path(directory, stem="plastic_tax_report"):
+    """Claim a report file name in directory that no other export has used.
+
+    The name carries a timestamp; if that is already taken a counter is added. The
+    file is created with O_EXCL so two exports (or two processes) can never be
+    handed the same name, and an existing report is never overwritten.
+    """
+    base = f"{stem}_{time.strftime('%Y%m%d-%H%M%S')}"
+    counter = 1
+    while True:
+        name = f"{base}.pdf" if counter == 1 else f"{base}_{counter}.pdf"
+        path = os.path.join(directory, name)
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+            return path
+        except FileExistsError:
+            counter += 1
+
+
+def discard_report_path(path):
+    """Remove a reserved report file whose export failed or was cancelled"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _render_batch(batch):
+    for job, path in batch:
+        write_job_report(job, path)
+    return len(batch)
+
+
+def write_job_reports(jobs, directory, processes=None, task=None):
+    """Write one PDF per job into directory, rendering in parallel across a process pool.
+
+    Output names are reserved up front in this process, so they are unique and in
+    job order no matter which worker renders which job. Returns the paths written.
+    If rendering fails or is cancelled, the names of reports that weren't
+    finished are removed again rather than left behind as empty files.
+    """
+    paths = [reserve_report_path(directory, f"plastic_tax_report_{_safe_file_part(job_name(job, index))}")
+             for index, job in enumerate(jobs)]
+    pairs = list(zip(jobs, paths))
+    batches = [pairs[i:i + RENDER_BATCH_SIZE] for i in range(0, len(pairs), RENDER_BATCH_SIZE)]
+    rendered = set()
+
+    try:
+        if processes == 1 or len(batches) <= 1:
+            for done, batch in enumerate(batches, start=1):
+                _render_batch(batch)
+                rendered.update(path for _, path in batch)
+                if task is not None:
+                    task.report_progress(done / len(batches))
+                    task.check_cancelled()
+            return paths
+
+        futures = []
+        try:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = [executor.submit(_render_batch, batch) for batch in batches]
+                for done, future in enumerate(futures, start=1):
+                    future.result()
+                    if task is not None:
+                        task.report_progress(done / len(futures))
+                        if task.cancelled:
+                            for pending in futures:
+                                pending.cancel()
+                            task.check_cancelled()
+        finally:
+            # the pool has shut down, so no worker is still writing any of these
+            for batch, future in zip(batches, futures):
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    rendered.update(path for _, path in batch)
+        return paths
+    except BaseException:
+        for path in paths:
+            if path not in rendered:
+                discard_report_path(path)
+        raise
+
+
+def load_jobs(path, settings_path=None):
+    """Read and cost a CSV/JSONL job file (the batch_quote.py format) into report job dicts"""
+    from batch_quote import INPUT_FIELDS, OUTPUT_FIELDS, RowError, detect_format, load_defaults, parse_columns, read_csv_rows, read_jsonl_rows
+    from cost_engine import calculate_costs
+
+    defaults = load_defaults(settings_path)
+    records, line_numbers = [], []
+    with open(path, "r", newline="") as stream:
+        if detect_format(path) == "csv":
+            rows = read_csv_rows(stream)
+            header = next(rows, [])
+            for line_number, row in rows:
+                if isinstance(row, RowError):
+                    print(row, file=sys.stderr)
+                    continue
+                records.append(dict(zip(header, row)))
+                line_numbers.append(line_number)
+        else:
+            for line_number, record in read_jsonl_rows(stream):
+                if isinstance(record, RowError):
+                    print(record, file=sys.stderr)
+                    continue
+                records.append(record)
+                line_numbers.append(line_number)
+
+    columns = {field: [record.get(field) for record in records] for field in INPUT_FIELDS}
+    keep, arrays, errors = parse_columns(line_numbers, columns, defaults)
+    for error in errors:
+        print(error, file=sys.stderr)
+    records = [record for record, ok in zip(records, keep.tolist()) if ok]
+    costs = calculate_costs(**dict(zip(INPUT_FIELDS, arrays)))
+
+    jobs = []
+    for i, record in enumerate(records):
+        job = dict(record)
+        job.update((field, float(array[i])) for field, array in zip(INPUT_FIELDS, arrays))
+        job.update((field, float(array[i])) for field, array in zip(OUTPUT_FIELDS, costs))
+        jobs.append(job)
+    return jobs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PlasticTax PDF reports for a CSV or JSONL file of jobs.")
+    parser.add_argument("input", help="job file in the batch_quote.py format")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--combined", metavar="PDF", help="write one multi-page PDF with a summary table")
+    mode.add_argument("--per-job", metavar="DIR", help="write one PDF per job into this directory")
+    parser.add_argument("--processes", type=int, help="worker processes for --per-job (default: one per CPU)")
+    parser.add_argument("--settings", help="settings.csv to take defaults from (default: the app's settings file)")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.input, args.settings)
+    if not jobs:
+        print("No jobs to report on", file=sys.stderr)
+        return 1
+    if args.combined:
+        write_combined_report(jobs, args.combined)
+        print(f"Wrote a {len(jobs)}-job report to {args.combined}", file=sys.stderr)
+    else:
+        os.makedirs(args.per_job, exist_ok=True)
+        paths = write_job_reports(jobs, args.per_job, args.processes)
+        print(f"Wrote {len(paths)} reports to {args.per_job}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# Monte Carlo risk mode: cost percentiles and tornado sensitivities from uncertain inputs
+import argparse
+import json
+import math
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from printers import constant_power_phases, phase_energy_kwh
+
+# the inputs a quote can be uncertain about, in the order results list them
+RISK_FIELDS = ("print_weight", "estimated_print_time", "filament_cost_per_kg", "electricity_cost_per_kwh")
+RISK_LABELS = {
+    "print_weight": "Print weight",
+    "estimated_print_time": "Print time",
+    "filament_cost_per_kg": "Filament price",
+    "electricity_cost_per_kwh": "Electricity rate",
+}
+
+DEFAULT_SAMPLES = 1_000_000
+PERCENTILES = (50, 90, 99)
+# tornado bars run between these percentiles of each input
+TORNADO_PERCENTILES = (10, 90)
+
+DISTRIBUTION_KINDS = ("triangular", "uniform", "normal")
+# a normal distribution's low..high is its central 95%
+NORMAL_95_WIDTH_SDS = 3.92
+# standard normal quantiles for the tornado percentiles (no scipy needed)
+NORMAL_QUANTILES = {10: -1.2815516, 90: 1.2815516}
+
+# kind is fixed, triangular, uniform or normal; mode is the point estimate
+Distribution = namedtuple("Distribution", "kind low mode high")
+
+
+def fixed(value):
+    return Distribution("fixed", value, value, value)
+
+
+def make_distribution(kind, low, mode, high):
+    """A Distribution, checked; a zero-width range becomes fixed"""
+    if not low <= mode <= high:
+        raise ValueError(f"need low <= estimate <= high, got {low}, {mode}, {high}")
+    if low < 0:
+        raise ValueError("ranges must not go below zero")
+    if low == high:
+        return fixed(mode)
+    if kind not in DISTRIBUTION_KINDS:
+        raise ValueError(f"kind must be one of {DISTRIBUTION_KINDS}")
+    return Distribution(kind, float(low), float(mode), float(high))
+
+
+def spread(value, percent, kind="triangular"):
+    """value give or take percent, most likely value itself"""
+    return make_distribution(kind, value * (1 - percent / 100), value, value * (1 + percent / 100))
+
+
+def draw(distribution, rng, size):
+    """size samples of one input as a float64 array"""
+    kind, low, mode, high = distribution
+    if kind == "fixed":
+        return np.full(size, float(mode))
+    if kind == "uniform":
+        return rng.uniform(low, high, size)
+    if kind == "triangular":
+        return rng.triangular(low, mode, high, size)
+    # normal, centred on the estimate; negative draws would mean negative grams or prices
+    samples = rng.normal(mode, (high - low) / NORMAL_95_WIDTH_SDS, size)
+    return np.maximum(samples, 0.0, out=samples)
+
+
+def quantile(distribution, percentile):
+    """Exact value of an input at a percentile of its distribution"""
+    kind, low, mode, high = distribution
+    q = percentile / 100
+    if kind == "fixed":
+        return float(mode)
+    if kind == "uniform":
+        return low + q * (high - low)
+    if kind == "triangular":
+        split = (mode - low) / (high - low)
+        if q < split:
+            return low + math.sqrt(q * (high - low) * (mode - low))
+        return high - math.sqrt((1 - q) * (high - low) * (high - mode))
+    return max(mode + NORMAL_QUANTILES[percentile] * (high - low) / NORMAL_95_WIDTH_SDS, 0.0)
+
+
+def _total_cost(weight, hours, filament_price, rate, phases):
+    return filament_price * weight / 1000 + rate / 100 * phase_energy_kwh(hours, phases)
+
+
+def simulate(distributions, power_w=None, phases=None, samples=DEFAULT_SAMPLES, seed=None):
+    """Draw samples of every RISK_FIELDS input at once and summarise the total cost.
+
+    distributions maps every one of RISK_FIELDS to a Distribution. Power comes
+    from a printer profile's phases, or power_w watts for the whole print.
+    Returns a dict with the point estimate (every input at its mode), mean, the
+    PERCENTILES of total cost, and a tornado list: each input's total cost at
+    TORNADO_PERCENTILES of that input with the others at their modes, widest
+    swing first.
+    """
+    if phases is None:
+        if power_w is None:
+            raise ValueError("give either power_w or a printer profile's phases")
+        phases = constant_power_phases(power_w)
+    phases = np.asarray(phases, dtype=np.float64)
+    started = time.perf_counter()
+
+    rng = np.random.default_rng(seed)
+    total = _total_cost(*(draw(distributions[field], rng, samples) for field in RISK_FIELDS), phases)
+    percentiles = np.percentile(total, PERCENTILES)
+
+    modes = {field: distributions[field].mode for field in RISK_FIELDS}
+    point = float(_total_cost(*(modes[field] for field in RISK_FIELDS), phases))
+    tornado = []
+    for field in RISK_FIELDS:
+        low_input, high_input = (quantile(distributions[field], p) for p in TORNADO_PERCENTILES)
+        costs = [float(_total_cost(*(value if name == field else modes[name] for name in RISK_FIELDS), phases))
+                 for value in (low_input, high_input)]
+        tornado.append({"field": field, "low_input": float(low_input), "high_input": float(high_input),
+                        "low_cost": min(costs), "high_cost": max(costs), "swing": abs(costs[1] - costs[0])})
+    tornado.sort(key=lambda bar: bar["swing"], reverse=True)
+
+    return {
+        "samples": samples,
+        "point": point,
+        "mean": float(total.mean()),
+        "percentiles": {f"p{p}": float(value) for p, value in zip(PERCENTILES, percentiles)},
+        "tornado": tornado,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+def parse_range(text, kind):
+    """'value', 'low:high' (estimate halfway) or 'low:estimate:high' as a Distribution"""
+    try:
+        values = [float(part) for part in text.split(":")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected value, low:high or low:estimate:high, got {text!r}") from None
+    if len(values) == 1:
+        return fixed(values[0])
+    if len(values) == 2:
+        values.insert(1, (values[0] + values[1]) / 2)
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError(f"expected value, low:high or low:estimate:high, got {text!r}")
+    try:
+        return make_distribution(kind, *values)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo cost percentiles for an uncertain print job.")
+    parser.add_argument("--weight", required=True, help="grams: value, low:high or low:estimate:high")
+    parser.add_argument("--time", required=True, help="hours: value, low:high or low:estimate:high")
+    parser.add_argument("--filament-cost", required=True, help="dollars per kg: value, low:high or low:estimate:high")
+    parser.add_argument("--rate", required=True, help="cents per kWh: value, low:high or low:estimate:high")
+    parser.add_argument("--power", type=float, default=300.0, help="printer power in watts")
+    parser.add_argument("--printer", help="printer profile to take the power phases from instead of --power")
+    parser.add_argument("--settings", help="settings.csv whose printers.csv to use (default: the app's own)")
+    parser.add_argument("--kind", choices=DISTRIBUTION_KINDS, default="triangular", help="shape of every range")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    try:
+        distributions = {field: parse_range(text, args.kind) for field, text in
+                         zip(RISK_FIELDS, (args.weight, args.time, args.filament_cost, args.rate))}
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    phases = None
+    if args.printer:
+        from printers import get_printer_registry
+
+        try:
+            phases = get_printer_registry(args.settings).get(args.printer).phases
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    print(json.dumps(simulate(distributions, args.power, phases, args.samples, args.seed), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
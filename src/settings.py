@@ -0,0 +1,186 @@
+# settings file location, schema and cached store, shared by the GUI and the headless tools
+import csv
+import os
+import platform
+import tempfile
+from collections import namedtuple
+
+from instrumentation import count
+
+# one entry per settings.csv column, in file order; kind is float or str
+SettingField = namedtuple("SettingField", "key kind default")
+
+SETTINGS_SCHEMA = (
+    SettingField("default_filament_cost", float, "25.00"),
+    SettingField("default_electricity_cost", float, "12.0"),
+    SettingField("default_printer_power", float, "300.0"),
+    SettingField("appearance_mode", str, "Dark"),
+    SettingField("color_theme", str, "Blue"),
+    SettingField("pdf_export_directory", str, ""),
+    SettingField("default_material", str, "PLA"),
+    # name of a time-of-use schedule in tariffs.json; blank means the flat electricity rate
+    SettingField("electricity_tariff", str, ""),
+    # printer profile picked in the main window; blank means the power rating entry
+    SettingField("default_printer", str, ""),
+)
+SETTINGS_FIELDS = {field.key: field for field in SETTINGS_SCHEMA}
+
+# filament densities in g/cm^3, used to turn a model's volume into grams
+MATERIAL_DENSITIES = {
+    "PLA": 1.24,
+    "PETG": 1.27,
+    "ABS": 1.04,
+    "ASA": 1.07,
+    "TPU": 1.21,
+    "Nylon": 1.14,
+    "PC": 1.20,
+}
+
+
+def get_material_density(material):
+    """Density preset for a material name (case-insensitive), or None if unknown"""
+    for name, density in MATERIAL_DENSITIES.items():
+        if name.lower() == (material or "").strip().lower():
+            return density
+    return None
+
+
+def get_default_settings_path():
+    """Get platform-specific default settings path"""
+    system = platform.system()
+
+    if system == "Windows":
+        # Windows: LOCALAPPDATA\PlasticTax\settings.csv
+        localappdata = os.environ.get('LOCALAPPDATA', os.path.expanduser('~\\AppData\\Local'))
+        settings_dir = os.path.join(localappdata, 'PlasticTax')
+    elif system == "Darwin":  # macOS
+        # macOS: ~/Library/Application Support/PlasticTax/settings.csv
+        settings_dir = os.path.expanduser('~/Library/Application Support/PlasticTax')
+    else:
+        # Fallback for other systems (including Linux)
+        settings_dir = os.path.expanduser('~/.plastictax')
+
+    # Create directory if it doesn't exist
+    os.makedirs(settings_dir, exist_ok=True)
+    return os.path.join(settings_dir, 'settings.csv')
+
+
+def parse_setting(key, raw):
+    """Convert a raw settings.csv cell to its schema type, or None if it is blank or unreadable"""
+    field = SETTINGS_FIELDS[key]
+    if field.kind is str:
+        return raw
+    if raw is None or raw.strip() == "":
+        return None
+    try:
+        return field.kind(raw)
+    except ValueError:
+        return None
+
+
+class SettingsStore:
+    """Typed view of settings.csv that only re-reads the file when it changes on disk.
+
+    The parsed values are cached together with the file's mtime and size; every
+    lookup costs one stat() call, and the file is only opened again when either
+    of those moves. Saves go to a temporary file that is renamed over the old one,
+    so a crash mid-write never leaves a half-written settings file behind.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_default_settings_path()
+        self._signature = None
+        self._values = {}
+        self.exists = False
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        count("settings_file_reads")
+        raw = {}
+        try:
+            with open(self.path, "r", newline="") as settings_file:
+                reader = csv.reader(settings_file)
+                header = next(reader, None)
+                row = next(reader, None)
+            if header and row is not None:
+                raw = dict(zip(header, row))
+            self.exists = True
+        except FileNotFoundError:
+            self.exists = False
+        # keys missing from an older file simply read as unset
+        self._values = {key: parse_setting(key, raw[key]) if key in raw else None for key in SETTINGS_FIELDS}
+
+    def values(self):
+        """Return every setting as a dict of typed values (None when unset)"""
+        signature = self._stat_signature()
+        if signature is None or signature != self._signature:
+            self._load()
+            self._signature = signature
+        return self._values
+
+    def get(self, key, default=None):
+        """Return one typed setting, or default when it is unset"""
+        value = self.values()[key]
+        return default if value is None else value
+
+    def ensure_exists(self):
+        """Write the default settings file if there is none yet; returns True if one was created"""
+        if os.path.exists(self.path):
+            return False
+        self.save({field.key: field.default for field in SETTINGS_SCHEMA})
+        return True
+
+    def save(self, new_values):
+        """Atomically replace settings.csv with new_values (raw strings or typed values).
+
+        Keys that are not given keep their current value. Raises ValueError if a
+        numeric setting is not a number.
+        """
+        current = self.values()
+        row = []
+        for field in SETTINGS_SCHEMA:
+            if field.key in new_values:
+                value = new_values[field.key]
+                value = "" if value is None else str(value).strip()
+                if field.kind is not str and value and parse_setting(field.key, value) is None:
+                    raise ValueError(f"{field.key} must be a number, got {value!r}")
+            else:
+                value = current[field.key]
+                value = "" if value is None else str(value)
+            row.append(value)
+
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".csv", dir=directory)
+        try:
+            with os.fdopen(fd, "w", newline="") as temp_file:
+                writer = csv.writer(temp_file, lineterminator="\n")
+                writer.writerow([field.key for field in SETTINGS_SCHEMA])
+                writer.writerow(row)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        # force the next lookup to pick up what was just written
+        self._signature = None
+
+
+_stores = {}
+
+
+def get_settings_store(path=None):
+    """Return the shared SettingsStore for a settings file (the app's own by default)"""
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = SettingsStore(path)
+    return store
@@ -0,0 +1,57 @@
+# opt-in startup profiler: PLASTICTAX_PROFILE_STARTUP=1 or --profile-startup
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+# imported first thing by main.py, so this is as close to "app start" as we can get
+_started = time.perf_counter()
+_phases = []
+_first_frame = None
+
+# main() switches this on for --profile-startup once it has parsed its arguments
+enabled = os.environ.get("PLASTICTAX_PROFILE_STARTUP", "") not in ("", "0")
+
+
+@contextmanager
+def phase(name):
+    """Time a block of startup work under name (two clock reads, so it is always on)
+
+    Phases run before main() has parsed --metrics, so they are recorded either
+    way; report() only prints them when profiling is on.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def mark_first_frame():
+    """Record that the main window has been drawn for the first time"""
+    global _first_frame
+    if _first_frame is None:
+        _first_frame = time.perf_counter() - _started
+
+
+def phases():
+    """(name, seconds) of every phase timed so far"""
+    return list(_phases)
+
+
+def time_to_first_frame():
+    """Seconds from start to the first drawn frame, or None if it has not happened yet"""
+    return _first_frame
+
+
+def report(stream=None):
+    """Print the per-phase breakdown collected so far"""
+    if not enabled:
+        return
+    stream = stream or sys.stderr
+    print("PlasticTax startup profile", file=stream)
+    for name, seconds in _phases:
+        print(f"  {name:<28}{seconds * 1000:9.1f} ms", file=stream)
+    if _first_frame is not None:
+        print(f"  {'time to first frame':<28}{_first_frame * 1000:9.1f} ms", file=stream)
+    stream.flush()
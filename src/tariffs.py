@@ -0,0 +1,342 @@
+# time-of-use electricity tariffs: per-minute rate tables integrated over a print's start/end window
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from settings import get_default_settings_path
+
+MINUTES_PER_DAY = 1440
+DAY_TYPES = ("weekday", "weekend")
+
+# tables are built this many days beyond the jobs that asked for them, so nearby jobs reuse them
+TABLE_PADDING_DAYS = 31
+
+# no table covers more than this (a few MB); jobs further apart are costed a window at a time
+MAX_TABLE_DAYS = 400
+
+# the longest window one job, or a search for a cheaper start, may span
+MAX_WINDOW_HOURS = 180 * 24
+
+# start times outside these years are typos or milliseconds, not print jobs
+EARLIEST_START = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+LATEST_START = datetime.datetime(2100, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+
+# how far ahead the GUI looks for a cheaper start
+DEFAULT_SEARCH_HOURS = 24
+
+
+def get_tariffs_path(settings_path=None):
+    """tariffs.json, kept next to the settings file it goes with"""
+    return os.path.join(os.path.dirname(settings_path or get_default_settings_path()), "tariffs.json")
+
+
+def parse_clock(value):
+    """Minute of the day for an 'HH:MM' string ('24:00' is the end of the day)"""
+    try:
+        hours, minutes = (int(part) for part in str(value).split(":"))
+    except ValueError:
+        raise ValueError(f"times must look like HH:MM, got {value!r}") from None
+    minute = hours * 60 + minutes
+    if not 0 <= minutes < 60 or not 0 <= minute <= MINUTES_PER_DAY:
+        raise ValueError(f"{value!r} is not a time of day")
+    return minute
+
+
+def parse_start_time(value):
+    """Unix seconds from a number or an ISO date/time string in local time.
+
+    Raises ValueError for anything outside 2000-2099, such as a millisecond
+    timestamp or a 1970 date, which would otherwise need a decades-long table.
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            seconds = float(text)
+        except ValueError:
+            seconds = datetime.datetime.fromisoformat(text).timestamp()
+    if not EARLIEST_START <= seconds < LATEST_START:
+        raise ValueError(f"start time {value!r} is not between 2000 and 2099")
+    return seconds
+
+
+def _rate(value, where):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value) or value < 0:
+        raise ValueError(f"{where}: rate must be a non-negative number of cents per kWh")
+    return float(value)
+
+
+def _day_profile(bands, base_rate, where):
+    """Rate for every minute of one day type; minutes outside every band pay base_rate"""
+    profile = np.full(MINUTES_PER_DAY, base_rate)
+    for band in bands:
+        start, end = parse_clock(band["start"]), parse_clock(band["end"])
+        rate = _rate(band.get("rate"), where)
+        if start < end:
+            profile[start:end] = rate
+        else:
+            # a band like 22:00-06:00 runs past midnight
+            profile[start:] = rate
+            profile[:end] = rate
+    return profile
+
+
+def check_search_window(window_start, window_end):
+    """Raise ValueError for a cheapest-start search too long to cost every minute of"""
+    if window_end - window_start > MAX_WINDOW_HOURS * 3600:
+        raise ValueError(f"the search window can be at most {MAX_WINDOW_HOURS // 24} days")
+
+
+class Tariff:
+    """One time-of-use schedule and its cumulative cost table.
+
+    A tariff has a base rate in cents per kWh, weekday and weekend bands, and
+    optionally seasons that swap in their own base rate and bands for some
+    months. Bands follow local wall-clock time, DST changes included. The
+    schedule is expanded into one rate per minute and a running total of those
+    rates, so the cost of any window is two lookups and a subtraction, for one
+    job or a whole array of them.
+    """
+
+    def __init__(self, name, spec):
+        self.name = name
+        where = f"tariff {name!r}"
+        if not isinstance(spec, dict):
+            raise ValueError(f"{where} must be a JSON object")
+        base_rate = _rate(spec.get("rate"), where)
+
+        # one profile per distinct (bands, day type); profile_index picks one per (month, day type)
+        profiles = []
+        self.profile_index = np.zeros((12, len(DAY_TYPES)), dtype=np.intp)
+
+        def day_profiles(section, section_where):
+            # a season may also change the rate outside its bands
+            rate = _rate(section["rate"], section_where) if "rate" in section else base_rate
+            weekday = _day_profile(section.get("weekday", []), rate, section_where)
+            weekend = _day_profile(section["weekend"], rate, section_where) if "weekend" in section else weekday
+            profiles.extend((weekday, weekend))
+            return len(profiles) - 2, len(profiles) - 1
+
+        self.profile_index[:] = day_profiles(spec, where)
+        for season in spec.get("seasons", []):
+            season_where = f"{where} season {season.get('name', '')!r}"
+            months = season.get("months", [])
+            if not months or any(not isinstance(month, int) or not 1 <= month <= 12 for month in months):
+                raise ValueError(f"{season_where}: months must be a list of 1-12")
+            self.profile_index[np.array(months) - 1] = day_profiles(season, season_where)
+        self.profiles = np.array(profiles)
+        self.base_rate = base_rate
+        # (first minute since the epoch, per-minute rates, running totals with a leading 0)
+        self._table = None
+
+    def _build_table(self, first_minute, count):
+        # the local UTC offset of every hour, so bands move with DST like the meter does
+        first_hour = first_minute // 60
+        hours = range(first_hour, (first_minute + count - 1) // 60 + 1)
+        offsets = np.array([time.localtime(hour * 3600).tm_gmtoff // 60 for hour in hours], dtype=np.int64)
+        skip = first_minute - first_hour * 60
+        local = np.arange(first_minute, first_minute + count, dtype=np.int64) + np.repeat(offsets, 60)[skip:skip + count]
+
+        # the calendar is worked out once per local day, then every minute picks its rate from that day's profile
+        days = np.arange(local[0] // MINUTES_PER_DAY, local[-1] // MINUTES_PER_DAY + 1)
+        # 1970-01-01 was a Thursday; Saturday and Sunday come out as 5 and 6
+        weekend = ((days + 3) % 7 >= 5).astype(np.intp)
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12
+        by_local_minute = self.profiles[self.profile_index[months, weekend]].ravel()
+        rates = by_local_minute[local - days[0] * MINUTES_PER_DAY]
+        cumulative = np.empty(count + 1)
+        cumulative[0] = 0.0
+        np.cumsum(rates, out=cumulative[1:])
+        return first_minute, rates, cumulative
+
+    def table(self, start, end):
+        """The cumulative table, rebuilt to cover Unix seconds start..end if it doesn't already.
+
+        A table grows to take in nearby jobs, but never past MAX_TABLE_DAYS; one
+        that would is replaced by a table for this window alone.
+        """
+        needed_first, needed_last = int(np.floor(start / 60)), int(np.floor(end / 60)) + 1
+        max_minutes = MAX_TABLE_DAYS * MINUTES_PER_DAY
+        # rounding out to whole days below adds up to a day at each end
+        room = max_minutes - 2 * MINUTES_PER_DAY - (needed_last - needed_first)
+        if room < 0:
+            raise ValueError(f"a tariff table covers at most {MAX_TABLE_DAYS} days")
+        padding = min(TABLE_PADDING_DAYS * MINUTES_PER_DAY, room // 2)
+        # whole UTC days, so tables built for different jobs line up
+        first = needed_first - padding
+        last = needed_last + padding
+        first -= first % MINUTES_PER_DAY
+        last += -last % MINUTES_PER_DAY
+        table = self._table
+        if table is not None:
+            covered_first, covered_rates, _ = table
+            covered_last = covered_first + len(covered_rates)
+            if covered_first <= needed_first and needed_last <= covered_last:
+                return table
+            if max(last, covered_last) - min(first, covered_first) <= max_minutes:
+                first, last = min(first, covered_first), max(last, covered_last)
+        self._table = table = self._build_table(first, last - first)
+        return table
+
+    def cumulative_cost(self, times, table=None):
+        """Rate-minutes (cents per kWh times minutes) accrued from the table start to each Unix time"""
+        times = np.asarray(times, dtype=np.float64)
+        first_minute, rates, cumulative = table or self.table(times.min(), times.max())
+        position = times / 60 - first_minute
+        index = np.clip(np.floor(position).astype(np.int64), 0, len(rates) - 1)
+        return cumulative[index] + (position - index) * rates[index]
+
+    def energy_cost(self, start, hours, power_w):
+        """Electricity cost in dollars of drawing power_w watts for hours from Unix time start.
+
+        Every argument may be a scalar or an array; each job is costed at the rates
+        in force minute by minute over its own window.
+        """
+        start, hours, power_w = np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (start, hours, power_w)))
+        if start.size == 0:
+            return np.zeros(start.shape)
+        if hours.max() > MAX_WINDOW_HOURS:
+            raise ValueError(f"a print can be costed on a tariff for at most {MAX_WINDOW_HOURS // 24} days")
+        end = start + hours * 3600
+        if end.max() - start.min() <= MAX_WINDOW_HOURS * 3600:
+            rate_minutes = self._rate_minutes(start, end)
+        else:
+            # jobs far apart in time: a table per group of starts, so none grows past MAX_TABLE_DAYS
+            flat_start, flat_end = start.ravel(), end.ravel()
+            order = np.argsort(flat_start, kind="stable")
+            sorted_starts = flat_start[order]
+            rate_minutes = np.empty(flat_start.size)
+            first = 0
+            while first < order.size:
+                last = max(int(np.searchsorted(sorted_starts, sorted_starts[first] + MAX_WINDOW_HOURS * 3600)), first + 1)
+                group = order[first:last]
+                rate_minutes[group] = self._rate_minutes(flat_start[group], flat_end[group])
+                first = last
+            rate_minutes = rate_minutes.reshape(start.shape)
+        # cents per kWh * minutes * kW -> dollars
+        return rate_minutes * (power_w / 1000) / 60 / 100
+
+    def _rate_minutes(self, start, end):
+        table = self.table(start.min(), end.max())
+        return self.cumulative_cost(end, table) - self.cumulative_cost(start, table)
+
+    def cheapest_start(self, hours, power_w, window_start, window_end, step_minutes=1):
+        """(start, cost) of the cheapest way to fit a print inside [window_start, window_end].
+
+        Every start step_minutes apart that lets the print finish by window_end is
+        costed in one vectorized pass. Raises ValueError if the print is longer
+        than the window, or the window longer than MAX_WINDOW_HOURS.
+        """
+        check_search_window(window_start, window_end)
+        latest = window_end - hours * 3600
+        if latest < window_start:
+            raise ValueError("the print does not fit in the window")
+        starts = np.arange(window_start, latest + 1, step_minutes * 60, dtype=np.float64)
+        costs = self.energy_cost(starts, hours, power_w)
+        best = int(np.argmin(costs))
+        return float(starts[best]), float(costs[best])
+
+
+class TariffStore:
+    """The tariffs in tariffs.json, re-read only when the file's mtime or size changes.
+
+    The file maps tariff names to schedules; see the README for the format. A
+    missing file simply means no tariffs. Each Tariff keeps its cost table, so
+    tables are only rebuilt when the file changes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_tariffs_path()
+        self._signature = None
+        self._tariffs = {}
+
+    def tariffs(self):
+        """Every tariff by name; raises ValueError if the file is not valid"""
+        try:
+            stat = os.stat(self.path)
+            signature = stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            signature = None
+        if signature != self._signature:
+            tariffs = {}
+            if signature is not None:
+                with open(self.path, "r") as tariffs_file:
+                    try:
+                        specs = json.load(tariffs_file)
+                    except ValueError as e:
+                        raise ValueError(f"{self.path} is not valid JSON: {e}") from None
+                if not isinstance(specs, dict):
+                    raise ValueError(f"{self.path} must map tariff names to schedules")
+                tariffs = {name: Tariff(name, spec) for name, spec in specs.items()}
+            self._tariffs, self._signature = tariffs, signature
+        return self._tariffs
+
+    def names(self):
+        return list(self.tariffs())
+
+    def get(self, name):
+        """The named tariff, None for a blank name; raises ValueError for an unknown one"""
+        if not name:
+            return None
+        tariffs = self.tariffs()
+        if name not in tariffs:
+            raise ValueError(f"no tariff named {name!r} in {self.path}")
+        return tariffs[name]
+
+
+_stores = {}
+
+
+def get_tariff_store(settings_path=None):
+    """Return the shared TariffStore for a settings file's tariffs.json (the app's own by default)"""
+    store = _stores.get(settings_path)
+    if store is None:
+        store = _stores[settings_path] = TariffStore(get_tariffs_path(settings_path))
+    return store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cost prints on a time-of-use electricity tariff.")
+    parser.add_argument("--settings", help="settings.csv whose tariffs.json to use (default: the app's own)")
+    parser.add_argument("--tariff", help="tariff to use (default: the one chosen in settings)")
+    parser.add_argument("--hours", type=float, help="print time in hours")
+    parser.add_argument("--power", type=float, help="printer power in watts (default: from settings)")
+    parser.add_argument("--start", type=parse_start_time, help="print start, YYYY-MM-DDTHH:MM (default: now)")
+    parser.add_argument("--cheapest-within", type=float, metavar="HOURS",
+                        help="find the cheapest start that finishes within this many hours of --start")
+    args = parser.parse_args(argv)
+
+    from settings import get_settings_store
+
+    store = get_tariff_store(args.settings)
+    if args.hours is None:
+        for name in store.names():
+            print(name)
+        return 0
+
+    settings = get_settings_store(args.settings)
+    tariff = store.get(args.tariff or settings.get("electricity_tariff"))
+    if tariff is None:
+        print("No tariff given and none chosen in settings", file=sys.stderr)
+        return 1
+    power = args.power if args.power is not None else settings.get("default_printer_power", 300.0)
+    start = time.time() if args.start is None else args.start
+
+    def describe(when, cost):
+        return f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(when))}: ${cost:.4f}"
+
+    print(f"start {describe(start, float(tariff.energy_cost(start, args.hours, power)))}")
+    if args.cheapest_within is not None:
+        best, cost = tariff.cheapest_start(args.hours, power, start, start + args.cheapest_within * 3600)
+        print(f"cheapest {describe(best, cost)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,522 @@
+# headless watch-folder mode: quote every G-code file the slicers drop into a shared folder
+import argparse
+import csv
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import queue
+import select
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from batch_quote import INPUT_FIELDS, MATERIAL_FIELD, OUTPUT_FIELDS, PRINTER_FIELD, SOURCE_FILE_FIELD, detect_format, load_defaults
+from gcode import GCODE_EXTENSIONS
+from settings import get_default_settings_path, get_material_density, get_settings_store
+
+# a file is only quoted once it has gone this many seconds without changing
+DEFAULT_DEBOUNCE_SECONDS = 2.0
+# how often the polling fallback rescans the folder
+POLL_SECONDS = 1.0
+# files waiting for a worker; once full, further files stay pending until there is room
+DEFAULT_QUEUE_SIZE = 256
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# seconds between status lines (queue depth and lag) while there is activity
+DEFAULT_STATUS_SECONDS = 10.0
+
+# written next to the G-code unless --report says otherwise; not a G-code extension, so never quoted itself
+DEFAULT_REPORT_NAME = "plastictax_quotes.csv"
+REPORT_FIELDS = ("processed_at", SOURCE_FILE_FIELD, PRINTER_FIELD, MATERIAL_FIELD) + INPUT_FIELDS + OUTPUT_FIELDS
+
+# inotify(7) event bits and the fixed part of struct inotify_event
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")
+EVENT_BUFFER_BYTES = 64 << 10
+
+_LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    processed_at REAL NOT NULL,
+    total_cost REAL,
+    result TEXT
+);
+"""
+
+
+def get_ledger_path(settings_path=None):
+    """watch_ledger.sqlite3, kept next to the settings file it goes with"""
+    return os.path.join(os.path.dirname(settings_path or get_default_settings_path()), "watch_ledger.sqlite3")
+
+
+def is_watched(name):
+    return os.path.splitext(name)[1].lower() in GCODE_EXTENSIONS
+
+
+class InotifySource:
+    """Names of files written or moved into a directory, from Linux inotify through ctypes"""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        try:
+            init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available") from None
+        self._fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        if add_watch(self._fd, os.fsencode(directory), WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"{directory}: {os.strerror(error)}")
+
+    def changes(self, timeout):
+        """Names that changed within timeout seconds; None means events were lost and the folder needs a rescan"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, EVENT_BUFFER_BYTES)
+        except BlockingIOError:
+            return []
+        names, offset = [], 0
+        while offset < len(data):
+            _, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                raise OSError(errno.ENOENT, "the watched folder was removed or moved")
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingSource:
+    """The same changes() as InotifySource, by comparing directory listings every POLL_SECONDS"""
+
+    def __init__(self, directory, interval=POLL_SECONDS):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + interval
+
+    def _scan(self):
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        snapshot[entry.name] = stat.st_mtime_ns, stat.st_size
+                except FileNotFoundError:
+                    continue
+        return snapshot
+
+    def changes(self, timeout):
+        wait = self._next_scan - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(wait, 0.0))
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        changed = [name for name, signature in snapshot.items() if self._snapshot.get(name) != signature]
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+class WatchLedger:
+    """Which files have been quoted, at which mtime and size, in a small SQLite database.
+
+    A file is only quoted again when its mtime or size moves, so restarting the
+    daemon picks up files that arrived while it was down without redoing the
+    rest. Failed files are recorded too and are only retried once they change.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or get_ledger_path()
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_LEDGER_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def signatures(self, directory):
+        """{path: (mtime_ns, size)} of every file already handled in a directory"""
+        prefix = os.path.join(directory, "")
+        rows = self._connection().execute(
+            "SELECT path, mtime_ns, size FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+        return {path: (mtime_ns, size) for path, mtime_ns, size in rows}
+
+    def record(self, path, signature, status, result):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, status, processed_at, total_cost, result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (path, signature[0], signature[1], status, time.time(), result.get("total_cost"), json.dumps(result)),
+        )
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class ReportWriter:
+    """Appends one CSV or JSONL row per quoted file, flushed as it is written"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = detect_format(path)
+        self._lock = threading.Lock()
+        self._file = open(path, "a", newline="")
+        self._writer = csv.writer(self._file) if self.format == "csv" else None
+        if self._writer is not None and self._file.tell() == 0:
+            self._writer.writerow(REPORT_FIELDS)
+
+    def write(self, job):
+        row = {field: job.get(field, "") for field in REPORT_FIELDS}
+        with self._lock:
+            if self._writer is not None:
+                self._writer.writerow(row.values())
+            else:
+                self._file.write(json.dumps(row) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def load_quote_settings(settings_path=None):
+    """(material, defaults, printer profile or None, tariff or None) from the current settings.
+
+    Raises OSError or ValueError if the settings name a printer or tariff that
+    can't be loaded.
+    """
+    from printers import get_printer_registry
+    from tariffs import get_tariff_store
+
+    settings = get_settings_store(settings_path)
+    printer = get_printer_registry(settings_path).get(settings.get("default_printer"))
+    tariff = get_tariff_store(settings_path).get(settings.get("electricity_tariff"))
+    return settings.get("default_material", "") or "", load_defaults(settings_path), printer, tariff
+
+
+def quote_file(path, quote_settings, cache=None, start=None):
+    """Weight and time from a G-code file, costed with load_quote_settings() values, as a job dict.
+
+    Like Calculate in the window, the default printer profile (if any) replaces
+    the power rating and the chosen tariff (if any) prices a print starting at
+    start (default now). Raises OSError or ValueError if the file or settings
+    can't be used.
+    """
+    from metrics_cache import extract_job_metrics
+    from printers import cost_job
+
+    material, defaults, printer, tariff = quote_settings
+    metrics = extract_job_metrics(path, density=get_material_density(material), cache=cache)
+    if metrics["weight_g"] is None or metrics["print_time_h"] is None:
+        raise ValueError("no print weight or time found in the file")
+
+    for field in INPUT_FIELDS[2:]:
+        if field not in defaults:
+            raise ValueError(f"settings have no default for {field}")
+    job = cost_job(defaults["filament_cost_per_kg"], metrics["weight_g"], metrics["print_time_h"],
+                   defaults["electricity_cost_per_kwh"], defaults["printer_power_rating"], printer, tariff,
+                   time.time() if start is None else start)
+    job.update({SOURCE_FILE_FIELD: path, PRINTER_FIELD: printer.name if printer is not None else "",
+                MATERIAL_FIELD: material})
+    return job
+
+
+class FolderWatcher:
+    """Quotes G-code files as they land in a folder.
+
+    Changes come from inotify, or from polling the folder where inotify isn't
+    available. Each changed file waits in a pending set until it has been quiet
+    for debounce seconds, so a slicer still writing it is never read half-way;
+    repeated events for the same file just push its deadline back. Settled files
+    go onto a bounded queue for a pool of worker threads, which extract the
+    weight and time (through the metrics cache), cost the job with the current
+    settings and write it to the ledger and report. When the queue is full,
+    files simply stay pending, so a burst of hundreds of files never loses any.
+    """
+
+    def __init__(self, directory, settings_path=None, ledger=None, report=None, history=None,
+                 workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE, debounce=DEFAULT_DEBOUNCE_SECONDS,
+                 polling=False, cache=None, status_seconds=DEFAULT_STATUS_SECONDS, status_stream=None):
+        self.directory = os.path.realpath(directory)
+        self.settings_path = settings_path
+        self.ledger = ledger or WatchLedger(get_ledger_path(settings_path))
+        self.report = report
+        self.history = history
+        self.workers = max(workers, 1)
+        self.debounce = debounce
+        self.polling = polling
+        self.cache = cache
+        self.status_seconds = status_seconds
+        self.status_stream = status_stream or sys.stderr
+
+        self.queue = queue.Queue(max(queue_size, 1))
+        # path -> (monotonic time of the last change, of the first one since it was last quoted)
+        self._pending = {}
+        # queued or being quoted
+        self._in_flight = set()
+        self._seen = {}
+        self._lock = threading.Lock()
+        # settings, printer and tariff stores refresh themselves on read; keep that to one worker at a time
+        self._settings_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counts = dict.fromkeys(("costed", "failed", "skipped"), 0)
+        self.max_queue_depth = 0
+        # seconds from a file's first change to its quote: the latest, running total and worst
+        self.lag_last = self.lag_total = self.lag_max = 0.0
+        self.source_name = None
+
+    def _open_source(self):
+        if not self.polling:
+            try:
+                source = InotifySource(self.directory)
+                self.source_name = "inotify"
+                return source
+            except OSError as e:
+                print(f"inotify unavailable ({e}), polling every {POLL_SECONDS:g} s instead", file=self.status_stream)
+        self.source_name = "polling"
+        return PollingSource(self.directory)
+
+    def _mark(self, names, now):
+        for name in names:
+            if is_watched(name):
+                path = os.path.join(self.directory, name)
+                self._pending[path] = (now, self._pending.get(path, (now, now))[1])
+
+    def _rescan(self, now):
+        with os.scandir(self.directory) as entries:
+            self._mark([entry.name for entry in entries], now)
+
+    def _dispatch(self, now):
+        """Queue every pending file that has settled; returns seconds until the next one will"""
+        next_ready = None
+        for path, (last_change, first_change) in list(self._pending.items()):
+            ready_at = last_change + self.debounce
+            if ready_at > now:
+                next_ready = ready_at if next_ready is None else min(next_ready, ready_at)
+                continue
+            with self._lock:
+                if path in self._in_flight:
+                    # changed again while being quoted; look again once that finishes
+                    continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self._pending[path]
+                continue
+            signature = stat.st_mtime_ns, stat.st_size
+            if self._seen.get(path) == signature:
+                del self._pending[path]
+                with self._lock:
+                    self.counts["skipped"] += 1
+                continue
+            try:
+                self.queue.put_nowait((path, signature, first_change))
+            except queue.Full:
+                break
+            del self._pending[path]
+            with self._lock:
+                self._in_flight.add(path)
+                self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return None if next_ready is None else next_ready - now
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, signature, first_change = item
+            if self._stop.is_set():
+                # shutting down; the ledger doesn't have it, so the next run quotes it
+                with self._lock:
+                    self._in_flight.discard(path)
+                continue
+            job, outcome = None, "failed"
+            try:
+                with self._settings_lock:
+                    quote_settings = load_quote_settings(self.settings_path)
+                job = quote_file(path, quote_settings, self.cache)
+                job["processed_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+                # the ledger entry goes last: if a write fails, the file is still owed and the next run retries it
+                if self.report is not None:
+                    self.report.write(job)
+                if self.history is not None:
+                    self.history.record_job(job, job[PRINTER_FIELD], job[MATERIAL_FIELD])
+                self.ledger.record(path, signature, "costed", job)
+                outcome = "costed"
+            except Exception as e:  # one unreadable file or failed write must not stop the daemon
+                error = str(e) if isinstance(e, (OSError, ValueError)) else f"{type(e).__name__}: {e}"
+                print(f"Could not quote {os.path.basename(path)}: {error}", file=self.status_stream)
+                if job is None:
+                    try:
+                        self.ledger.record(path, signature, "failed", {"error": error})
+                    except Exception as e:
+                        print(f"Could not record {os.path.basename(path)} in the ledger: {e}", file=self.status_stream)
+            finally:
+                with self._lock:
+                    self._seen[path] = signature
+                    self._in_flight.discard(path)
+                    self.counts[outcome] += 1
+                    self.lag_last = time.monotonic() - first_change
+                    self.lag_total += self.lag_last
+                    self.lag_max = max(self.lag_max, self.lag_last)
+
+    def status(self):
+        """Queue depth, progress counts and the lag from a file's first change to its quote"""
+        with self._lock:
+            counts = dict(self.counts)
+            in_flight = len(self._in_flight)
+            quoted = counts["costed"] + counts["failed"]
+            lag_mean = self.lag_total / quoted if quoted else 0.0
+            lags = {"lag_last": self.lag_last, "lag_mean": lag_mean, "lag_max": self.lag_max}
+        queued = self.queue.qsize()
+        return dict(counts, pending=len(self._pending), queued=queued, in_progress=max(in_flight - queued, 0),
+                    max_queue_depth=self.max_queue_depth, source=self.source_name, **lags)
+
+    def _report_status(self, status):
+        print(f"{self.directory}: {status['pending']} pending, {status['queued']} queued, "
+              f"{status['in_progress']} in progress, {status['costed']} quoted, {status['failed']} failed; "
+              f"lag {status['lag_last']:.1f} s (mean {status['lag_mean']:.1f} s, max {status['lag_max']:.1f} s)",
+              file=self.status_stream)
+
+    def run(self, ready=None):
+        """Watch until stop() is called; ready() is called once the initial scan is queued"""
+        self._seen = self.ledger.signatures(self.directory)
+        source = self._open_source()
+        threads = [threading.Thread(target=self._work, name=f"watch-worker-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        print(f"Watching {self.directory} ({self.source_name}, {self.workers} workers)", file=self.status_stream)
+        # files that arrived while the daemon was down
+        self._rescan(time.monotonic())
+        if ready is not None:
+            ready()
+
+        last_status, last_quoted = time.monotonic(), 0
+        try:
+            while not self._stop.is_set():
+                wait = self._dispatch(time.monotonic())
+                # with files waiting for queue room, come back soon; otherwise when the next one settles
+                timeout = 0.05 if self._pending and wait is None else min(POLL_SECONDS if wait is None else wait, POLL_SECONDS)
+                names = source.changes(max(timeout, 0.0))
+                now = time.monotonic()
+                if names is None:
+                    self._rescan(now)
+                else:
+                    self._mark(names, now)
+                if self.status_seconds and now - last_status >= self.status_seconds:
+                    status = self.status()
+                    quoted = status["costed"] + status["failed"]
+                    if quoted != last_quoted or status["pending"] or status["queued"]:
+                        self._report_status(status)
+                    last_status, last_quoted = now, quoted
+        finally:
+            source.close()
+            # queued files aren't in the ledger yet, so dropping them is safe; the next run picks them up
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                with self._lock:
+                    self._in_flight.discard(item[0])
+            for _ in threads:
+                self.queue.put(None)
+            for thread in threads:
+                thread.join()
+
+    def stop(self):
+        self._stop.set()
+
+    def idle(self):
+        """True once nothing is pending, queued or being quoted"""
+        with self._lock:
+            return not self._pending and not self._in_flight
+
+
+def watch(directory, settings_path=None, report_path=None, ledger_path=None, history=None, **options):
+    """Run the watch-folder daemon until interrupted or sent SIGTERM"""
+    if not os.path.isdir(directory):
+        print(f"{directory} is not a folder", file=sys.stderr)
+        return 2
+    report = ReportWriter(report_path or os.path.join(directory, DEFAULT_REPORT_NAME))
+    watcher = FolderWatcher(directory, settings_path, WatchLedger(ledger_path or get_ledger_path(settings_path)),
+                            report, history, **options)
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda _signum, _frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    finally:
+        report.close()
+    watcher._report_status(watcher.status())
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quote every G-code file dropped into a folder with PlasticTax.")
+    parser.add_argument("directory", help="folder the slicers write G-code to")
+    parser.add_argument("--settings", help="settings.csv to cost with (default: the app's settings file)")
+    parser.add_argument("--report", help=f"CSV or JSONL file to append quotes to (default: {DEFAULT_REPORT_NAME} in the folder)")
+    parser.add_argument("--ledger", help="database of already quoted files (default: next to the settings file)")
+    parser.add_argument("--history", nargs="?", const="", metavar="DATABASE",
+                        help="also record the quotes in the job history (default: the app's own)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE_SECONDS,
+                        help="seconds a file must go unchanged before it is quoted")
+    parser.add_argument("--poll", action="store_true", help="poll the folder instead of using inotify")
+    parser.add_argument("--status-seconds", type=float, default=DEFAULT_STATUS_SECONDS,
+                        help="seconds between queue depth and lag reports (0 for none)")
+    args = parser.parse_args(argv)
+
+    history = None
+    if args.history is not None:
+        from history import get_history_store
+
+        history = get_history_store(args.history or None)
+    return watch(args.directory, args.settings, args.report, args.ledger, history, workers=args.workers,
+                 queue_size=args.queue_size, debounce=args.debounce, polling=args.poll,
+                 status_seconds=args.status_seconds)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# background task runner: keeps exports and heavy jobs off the Tk main loop
+import itertools
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task when it notices it has been cancelled"""
+
+
+class Task:
+    """Handle for one submitted job, shared between the worker and the UI thread.
+
+    The worker calls report_progress() and check_cancelled() as it goes; the UI
+    thread reads progress/description and may call cancel() at any time.
+    """
+
+    def __init__(self, task_id, description):
+        self.id = task_id
+        self.description = description
+        self.progress = None  # None until the task reports, then 0.0-1.0
+        self.future = None
+        self.background = False
+        self._cancel_event = threading.Event()
+
+    def report_progress(self, fraction):
+        """Record how far along the task is (0.0-1.0); safe to call from the worker"""
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+
+    def cancel(self):
+        """Ask the task to stop; it is dropped at once if it has not started yet"""
+        self._cancel_event.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """Raise TaskCancelled if cancel() has been called; workers call this between steps"""
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+
+
+class TaskRunner:
+    """Runs functions on a thread pool and hands their results back on the Tk thread.
+
+    Tk widgets must only be touched from the thread running mainloop, so workers
+    never call back into the UI directly. Finished tasks are put on a queue that
+    the UI thread drains every poll_ms via root.after; each task's on_success or
+    on_error callback runs there exactly once. A cancelled task calls neither.
+
+    Background tasks are bookkeeping the user never waits on, like recording job
+    history. They run one at a time on their own thread, don't show in
+    active_tasks(), can't be cancelled, and shutdown() lets them finish.
+    """
+
+    def __init__(self, root, max_workers=None, poll_ms=50, on_activity=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_activity = on_activity  # called on the UI thread with the list of unfinished tasks
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plastictax-worker")
+        self._background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="plastictax-background")
+        self._finished = queue.Queue()
+        self._active = {}
+        self._ids = itertools.count(1)
+        self._polling = False
+
+    def submit(self, fn, *args, description="", on_success=None, on_error=None, background=False, **kwargs):
+        """Run fn(task, *args, **kwargs) on a worker thread and return its Task.
+
+        on_success(result) or on_error(exception) is called on the UI thread when
+        fn returns or raises. With background=True the task is bookkeeping: no
+        progress is shown for it and cancelling doesn't drop it.
+        """
+        task = Task(next(self._ids), description)
+        task.background = background
+        self._active[task.id] = (task, on_success, on_error)
+        executor = self._background if background else self._executor
+        task.future = executor.submit(fn, task, *args, **kwargs)
+        task.future.add_done_callback(lambda _future: self._finished.put(task))
+        self._schedule_poll()
+        return task
+
+    def active_tasks(self):
+        """Unfinished tasks the user is waiting on (background tasks are left out)"""
+        return [task for task, _, _ in self._active.values() if not task.background]
+
+    def cancel_all(self):
+        for task in self.active_tasks():
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel everything that is still pending, let background tasks finish and stop the worker threads"""
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._background.shutdown(wait=True)
+
+    def _schedule_poll(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+
+    def _poll(self):
+        self._polling = False
+        while True:
+            try:
+                task = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            _, on_success, on_error = self._active.pop(task.id)
+            self._deliver(task, on_success, on_error)
+
+        if self.on_activity is not None:
+            self.on_activity(self.active_tasks())
+        if self._active:
+            self._schedule_poll()
+
+    def _deliver(self, task, on_success, on_error):
+        future = task.future
+        if task.cancelled or future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, TaskCancelled):
+            return
+        if error is not None:
+            if on_error is not None:
+                on_error(error)
+            else:
+                print(f"Background task '{task.description}' failed: {error}")
+        elif on_success is not None:
+            on_success(future.result())